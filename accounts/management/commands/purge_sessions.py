@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from accounts.sessions.base import PURGE_BATCH_SIZE, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired database sessions in batches; sessions kept only '
+        'in the cache expire on their own'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help='Number of sessions to delete per statement'
+        )
+
+    def handle(self, *args, **options):
+        count = purge_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Purged {count} expired sessions')
+        )
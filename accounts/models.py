@@ -15,6 +15,13 @@ class UserProfile(models.Model):
         choices=[('light', 'Light'), ('dark', 'Dark')],
         default='light'
     )
+    # Denormalized task counters, maintained by tasks.counters
+    total_tasks = models.IntegerField(default=0, editable=False)
+    pending_tasks = models.IntegerField(default=0, editable=False)
+    completed_tasks = models.IntegerField(default=0, editable=False)
+    high_priority_tasks = models.IntegerField(default=0, editable=False)
+    medium_priority_tasks = models.IntegerField(default=0, editable=False)
+    low_priority_tasks = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
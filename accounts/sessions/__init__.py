@@ -0,0 +1,16 @@
+"""Session engines that skip writes of unchanged session data.
+
+``cached_db`` reads sessions from the cache and writes through to the
+database, so a request costs no session query unless the session
+changed. ``cache`` keeps sessions in the cache alone and lets the cache
+expire them; it needs a shared, persistent cache such as Redis.
+
+Django saves a session whenever it is marked modified, even when the
+data ends up as it was loaded (a key set to its current value, or a
+flash message added and shown within the same session state). Both
+engines compare the data with a digest taken at load time and skip
+those writes.
+
+Pick the engine with the ``SESSION_STORE`` setting. Expired database
+sessions are purged in batches by ``manage.py purge_sessions``.
+"""
@@ -0,0 +1,60 @@
+"""Write coalescing shared by the session engines, and batched purging"""
+import hashlib
+
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+PURGE_BATCH_SIZE = 1000
+
+
+class CoalescedWritesMixin:
+    """Skip saving a session whose data is unchanged since it was loaded"""
+
+    _loaded_digest = None
+
+    def _digest(self, data):
+        return hashlib.sha256(self.serializer().dumps(data)).digest()
+
+    def load(self):
+        data = super().load()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        digest = self._digest(data)
+        if not must_create and digest == self._loaded_digest:
+            return
+        super().save(must_create)
+        self._loaded_digest = digest
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    async def asave(self, must_create=False):
+        data = await self._aget_session(no_load=must_create)
+        digest = self._digest(data)
+        if not must_create and digest == self._loaded_digest:
+            return
+        await super().asave(must_create)
+        self._loaded_digest = digest
+
+
+def purge_expired_sessions(batch_size=PURGE_BATCH_SIZE):
+    """Delete expired database sessions in batches; return how many.
+
+    Each batch is read from the expire_date index and deleted by primary
+    key in its own statement, so no single delete holds locks for long.
+    """
+    now = timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now)
+    count = 0
+    while True:
+        keys = list(
+            expired.values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return count
+        count += Session.objects.filter(session_key__in=keys).delete()[0]
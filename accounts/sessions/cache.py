@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cache
+
+from .base import CoalescedWritesMixin
+
+
+class SessionStore(CoalescedWritesMixin, cache.SessionStore):
+    """Cache-only sessions that skip unchanged writes"""
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cached_db
+
+from .base import CoalescedWritesMixin
+
+
+class SessionStore(CoalescedWritesMixin, cached_db.SessionStore):
+    """Cached database sessions that skip unchanged writes"""
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import db
+
+from .base import CoalescedWritesMixin
+
+
+class SessionStore(CoalescedWritesMixin, db.SessionStore):
+    """Database sessions that skip unchanged writes"""
@@ -1,8 +1,24 @@
-from django.test import TestCase, Client
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm
 from django.urls import reverse
 from tasks.models import Category
+from accounts.sessions import db
+from accounts.sessions.base import purge_expired_sessions
+from accounts.sessions.cached_db import SessionStore
 
 
 class SignupViewTest(TestCase):
@@ -259,3 +275,105 @@ class UserAuthenticationIntegrationTest(TestCase):
         # 6. Access protected page again (should work)
         response = self.client.get(reverse('task-list'))
         self.assertEqual(response.status_code, 200)
+
+
+class SessionStoreTest(TestCase):
+    """Test cases for the coalescing session engine"""
+
+    def _session_queries(self, captured):
+        return [
+            query for query in captured.captured_queries
+            if 'django_session' in query['sql']
+        ]
+
+    @override_settings(SESSION_ENGINE='accounts.sessions.cached_db')
+    def test_signed_in_requests_skip_the_session_table(self):
+        """Test a signed-in page view reads its session from the cache"""
+        User.objects.create_user(username='testuser', password='testpass123')
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        client.get(reverse('task-list'))
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._session_queries(captured), [])
+
+    def test_unchanged_data_is_not_written(self):
+        """Test a session marked modified with the same data is not saved"""
+        for store_class in (db.SessionStore, SessionStore):
+            with self.subTest(store=store_class.__module__):
+                store = store_class()
+                store['theme'] = 'dark'
+                store.create()
+
+                store = store_class(store.session_key)
+                store['theme'] = 'dark'
+                self.assertTrue(store.modified)
+                with CaptureQueriesContext(connection) as captured:
+                    store.save()
+                self.assertEqual(self._session_queries(captured), [])
+
+                store['theme'] = 'light'
+                store.save()
+                stored = Session.objects.get(session_key=store.session_key)
+                self.assertEqual(stored.get_decoded(), {'theme': 'light'})
+
+    def test_session_store_setting_is_checked(self):
+        """Test unknown and unshared session stores are refused"""
+        for store, error in (
+            ('bogus', 'SESSION_STORE must be one of db, cached_db, cache'),
+            ('cached_db', 'needs a shared cache'),
+        ):
+            with self.subTest(store=store):
+                result = subprocess.run(
+                    [sys.executable, '-c', 'import planit.settings'],
+                    env={**os.environ, 'SESSION_STORE': store,
+                         'REDIS_URL': ''},
+                    capture_output=True, text=True
+                )
+                self.assertIn('ImproperlyConfigured', result.stderr)
+                self.assertIn(error, result.stderr)
+
+    async def test_unchanged_data_is_not_written_async(self):
+        """Test async loads and saves skip unchanged data too"""
+        store = SessionStore()
+        await store.aset('theme', 'dark')
+        await store.acreate()
+
+        store = SessionStore(store.session_key)
+        await store.aset('theme', 'dark')
+        self.assertTrue(store.modified)
+        # Queries can't be captured from async code, so watch the write
+        with mock.patch.object(cached_db.SessionStore, 'asave') as asave:
+            await store.asave()
+        asave.assert_not_awaited()
+
+        await store.aset('theme', 'light')
+        await store.asave()
+        stored = await Session.objects.aget(session_key=store.session_key)
+        self.assertEqual(stored.get_decoded(), {'theme': 'light'})
+
+    def test_purge_expired_sessions_in_batches(self):
+        """Test expired sessions are deleted and live ones kept"""
+        now = timezone.now()
+        for n in range(5):
+            Session.objects.create(
+                session_key=f'expired{n}', session_data='',
+                expire_date=now - timedelta(days=1)
+            )
+        Session.objects.create(
+            session_key='live', session_data='',
+            expire_date=now + timedelta(days=1)
+        )
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+        # Three batches plus the empty read that ends the loop
+        self.assertEqual(len(self._session_queries(captured)), 7)
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            ['live']
+        )
+
+        out = StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('Purged 0 expired sessions', out.getvalue())
@@ -3,6 +3,7 @@ from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from tasks.models import Category
+from .models import UserProfile
 
 
 def signup(request):
@@ -14,6 +15,7 @@ def signup(request):
         form = UserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
+            UserProfile.objects.create(user=user)
             
             # Create default categories for new user
             default_categories = ['Home', 'Work', 'Personal']
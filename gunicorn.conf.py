@@ -0,0 +1,15 @@
+"""Gunicorn settings, read automatically from the working directory"""
+import os
+import shutil
+
+
+def on_starting(server):
+    """Start the metrics of a new server from zero.
+
+    Workers keep their metrics in files that outlive them (see
+    planit/metrics.py), so the files of a previous server are removed
+    before any worker starts.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planit.settings')
+    from django.conf import settings
+    shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
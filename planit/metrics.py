@@ -0,0 +1,429 @@
+"""Prometheus metrics, shared between worker processes.
+
+``MetricsMiddleware`` records a latency histogram and a request counter
+per route (the resolved view name). Database connections and queries,
+task writes and task list cache hits and misses, are counted too.
+``/metrics`` serves them all in the Prometheus text format.
+
+Gunicorn runs several worker processes, so in-memory counters would
+only describe the worker that happened to serve the scrape. Instead
+each process keeps its values in its own file under ``METRICS_DIR``,
+memory-mapped, so recording a value is a write into shared memory with
+no system call and no lock between processes. The endpoint reads every
+file and adds the values up. Every process that records a value gets
+a file, management commands and test runs included, so when reading,
+the files of processes that have exited are added into ``merged.db``
+and removed. Counters never go backwards when a worker is replaced, and
+the number of files stays that of the live processes.
+``gunicorn.conf.py`` empties the directory when the server starts.
+
+Each file starts with the number of bytes in use, followed by entries
+of a key length, the key (a JSON list of the sample name and labels)
+padded to 8 bytes, and a float64 value. Entries are written in full
+before the used size is moved past them, so readers never see a
+partial one.
+"""
+import fcntl
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+INITIAL_FILE_SIZE = 64 * 1024
+HEADER_SIZE = 8
+MERGED_FILE = 'merged.db'
+LOCK_FILE = '.lock'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+_store = None
+_store_lock = threading.Lock()
+
+
+def _padding(key):
+    # The value after the length and the key must be 8-byte aligned
+    return -(4 + len(key)) % 8
+
+
+class MetricsFile:
+    """The memory-mapped values of one process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_FILE_SIZE:
+            self._file.truncate(INITIAL_FILE_SIZE)
+            size = INITIAL_FILE_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('i', self._map, 0)[0]
+        if not self._used:
+            self._used = HEADER_SIZE
+            struct.pack_into('i', self._map, 0, self._used)
+        self._positions = {
+            key: position for key, position, _value in _entries(self._map)
+        }
+
+    def _add_entry(self, key):
+        encoded = key.encode()
+        padded = encoded + b' ' * _padding(encoded)
+        entry = struct.pack(f'i{len(padded)}sd', len(encoded), padded, 0.0)
+        needed = self._used + len(entry)
+        if needed > len(self._map):
+            size = len(self._map)
+            while size < needed:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[self._used:needed] = entry
+        self._positions[key] = needed - 8
+        self._used = needed
+        struct.pack_into('i', self._map, 0, self._used)
+
+    def add(self, key, amount):
+        if key not in self._positions:
+            self._add_entry(key)
+        position = self._positions[key]
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(data):
+    """Yield (key, value position, value) for each entry in a file"""
+    used = struct.unpack_from('i', data, 0)[0]
+    position = HEADER_SIZE
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        position += 4 + length + -(4 + length) % 8
+        yield key, position, struct.unpack_from('d', data, position)[0]
+        position += 8
+
+
+def _current_store():
+    """Return this process's file, opening a new one after a fork"""
+    global _store
+    directory = settings.METRICS_DIR
+    store = _store
+    if (store is None or store.pid != os.getpid()
+            or store.directory != directory):
+        os.makedirs(directory, exist_ok=True)
+        store = MetricsFile(os.path.join(directory, f'{os.getpid()}.db'))
+        store.pid = os.getpid()
+        store.directory = directory
+        _store = store
+    return store
+
+
+def _add(key, amount):
+    with _store_lock:
+        _current_store().add(key, amount)
+
+
+@lru_cache(maxsize=4096)
+def _encoded_key(name, labels):
+    return json.dumps([name, labels])
+
+
+def _key(name, labels):
+    return _encoded_key(name, tuple(sorted(labels.items())))
+
+
+class Counter:
+    """A value that only goes up, per combination of labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if settings.METRICS_ENABLED:
+            _add(_key(self.name, labels), amount)
+
+    def total(self, **labels):
+        """Return the value added up over every process"""
+        return read_samples(settings.METRICS_DIR).get(
+            _key(self.name, labels), 0.0
+        )
+
+
+class Histogram:
+    """Observations counted into buckets, per combination of labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._bounds = [str(bound) for bound in buckets] + ['+Inf']
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        # Each observation goes into its own bucket only; the output
+        # adds them up into Prometheus' cumulative buckets
+        bound = self._bounds[bisect_left(self.buckets, value)]
+        with _store_lock:
+            store = _current_store()
+            store.add(
+                _key(f'{self.name}_bucket', {**labels, 'le': bound}), 1
+            )
+            store.add(_key(f'{self.name}_sum', labels), value)
+            store.add(_key(f'{self.name}_count', labels), 1)
+
+
+REQUEST_LATENCY = Histogram(
+    'planit_http_request_duration_seconds',
+    'Time taken to respond to a request, by route.',
+    LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    'planit_http_requests_total',
+    'Requests served, by route, method and status code.'
+)
+DB_CONNECTIONS = Counter(
+    'planit_db_connections_opened_total',
+    'Database connections opened, by database alias.'
+)
+DB_QUERIES = Counter(
+    'planit_db_queries_total',
+    'Database queries run, by database alias.'
+)
+DB_QUERY_TIME = Counter(
+    'planit_db_query_seconds_total',
+    'Time spent running database queries, by database alias.'
+)
+TASK_WRITES = Counter(
+    'planit_task_writes_total',
+    'Tasks created, updated or deleted, by action.'
+)
+LIST_CACHE_HITS = Counter(
+    'planit_task_list_cache_hits_total',
+    'Task list pages served from the cache.'
+)
+LIST_CACHE_MISSES = Counter(
+    'planit_task_list_cache_misses_total',
+    'Task list pages built because they were not cached.'
+)
+
+
+def _exited(name):
+    """Whether a file belongs to a process that no longer runs"""
+    pid = name[:-len('.db')]
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as metrics_file:
+            data = metrics_file.read()
+    except FileNotFoundError:
+        return []
+    if len(data) < HEADER_SIZE:
+        return []
+    return [(key, value) for key, _position, value in _entries(data)]
+
+
+def read_samples(directory):
+    """Return the values of every process's file, added up.
+
+    The files of processes that have exited are merged into one first.
+    Readers hold a lock, so none of them sees a value both in its old
+    file and in the merged one.
+    """
+    totals = {}
+    try:
+        lock = open(os.path.join(directory, LOCK_FILE), 'a')
+    except FileNotFoundError:
+        return totals
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        names = [name for name in os.listdir(directory)
+                 if name.endswith('.db')]
+        exited = [name for name in names if _exited(name)]
+        if exited:
+            merged = MetricsFile(os.path.join(directory, MERGED_FILE))
+            try:
+                for name in exited:
+                    path = os.path.join(directory, name)
+                    for key, value in _read_file(path):
+                        merged.add(key, value)
+                    os.remove(path)
+            finally:
+                merged.close()
+            names = [name for name in names if name not in exited]
+            if MERGED_FILE not in names:
+                names.append(MERGED_FILE)
+        for name in names:
+            for key, value in _read_file(os.path.join(directory, name)):
+                totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def _histogram_lines(histogram, samples):
+    series = {}
+    for (name, labels), value in samples.items():
+        if name == f'{histogram.name}_bucket':
+            labels = dict(labels)
+            bound = labels.pop('le')
+            key = tuple(sorted(labels.items()))
+            series.setdefault(key, {})[bound] = value
+    for labels, buckets in sorted(series.items()):
+        cumulative = 0.0
+        for bound in histogram._bounds:
+            cumulative += buckets.get(bound, 0.0)
+            yield (
+                f'{histogram.name}_bucket'
+                f'{_labels([*labels, ("le", bound)])} {cumulative}'
+            )
+        for suffix in ('sum', 'count'):
+            name = f'{histogram.name}_{suffix}'
+            value = samples.get((name, labels), 0.0)
+            yield f'{name}{_labels(labels)} {value}'
+
+
+def render_metrics(totals):
+    """Format summed samples in the Prometheus text format"""
+    samples = {}
+    for key, value in totals.items():
+        name, labels = json.loads(key)
+        samples[(name, tuple(tuple(pair) for pair in labels))] = value
+
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        if metric.kind == 'histogram':
+            lines.extend(_histogram_lines(metric, samples))
+            continue
+        for (name, labels), value in sorted(samples.items()):
+            if name == metric.name:
+                lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryCounter:
+    """A database execute wrapper that stays on the connection"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            DB_QUERIES.inc(alias=self.alias)
+            DB_QUERY_TIME.inc(time.perf_counter() - start, alias=self.alias)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    """Count a new database connection and start counting its queries"""
+    DB_CONNECTIONS.inc(alias=connection.alias)
+    if not any(isinstance(wrapper, _QueryCounter)
+               for wrapper in connection.execute_wrappers):
+        # A connection opened lazily inside someone's execute_wrapper()
+        # block has their wrapper at the end, and the block pops the last
+        # wrapper on exit; at the front the counter outlives it
+        connection.execute_wrappers.insert(0, _QueryCounter(connection.alias))
+
+
+class MetricsMiddleware:
+    """Record the latency and status of every request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    async def _acall(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, elapsed):
+        match = request.resolver_match
+        route = match.view_name if match else '<unresolved>'
+        REQUEST_LATENCY.observe(elapsed, route=route)
+        REQUESTS.inc(
+            route=route, method=request.method,
+            status=str(response.status_code)
+        )
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return request.user.is_active and request.user.is_staff
+    expected = f'Bearer {token}'
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode(), expected.encode())
+
+
+def metrics_view(request):
+    """Serve the metrics to a scraper with METRICS_TOKEN, or to staff"""
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(read_samples(settings.METRICS_DIR)),
+        content_type=CONTENT_TYPE
+    )
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +57,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that their timings cover the rest of the stack
+    'planit.metrics.MetricsMiddleware',
+    'tasks.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,13 +76,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process. The development
+            # server's autoreloader still picks up template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -96,6 +108,99 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+#
+# The local-memory cache is per process, so cache invalidation only
+# reaches the process that made the write. Set REDIS_URL (or any
+# Redis-compatible server) to share the cache between processes.
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'planit',
+            # The default of 300 entries can't hold a page of task cards
+            # for more than a few users
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+
+# The per-user task list cache (see tasks/cache.py) needs a shared
+# cache: with local memory, a page cached by one worker stays in use
+# after a write made through another.
+
+TASK_LIST_CACHE = bool(REDIS_URL)
+
+
+# Sessions
+# https://docs.djangoproject.com/en/6.0/topics/http/sessions/
+#
+# "db" keeps sessions in the database. With REDIS_URL set, "cached_db"
+# (then the default) serves them from the shared cache and writes
+# through to the database, and "cache" keeps them in the cache only.
+# Neither is allowed with the local-memory cache: each worker would keep
+# its own copy, so a logout in one worker would leave the session valid
+# in the others. All three skip unchanged writes.
+
+SESSION_ENGINES = {
+    'db': 'accounts.sessions.db',
+    'cached_db': 'accounts.sessions.cached_db',
+    'cache': 'accounts.sessions.cache',
+}
+SESSION_STORE = config(
+    'SESSION_STORE', default='cached_db' if REDIS_URL else 'db'
+)
+if SESSION_STORE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f'SESSION_STORE must be one of {", ".join(SESSION_ENGINES)}, '
+        f'not {SESSION_STORE!r}.'
+    )
+if SESSION_STORE != 'db' and not REDIS_URL:
+    raise ImproperlyConfigured(
+        f'SESSION_STORE={SESSION_STORE!r} needs a shared cache; set '
+        'REDIS_URL or use "db".'
+    )
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORE]
+
+
+# Profiling
+#
+# When enabled, PROFILING_SAMPLE_RATE of requests are profiled (see
+# tasks/profiling.py). Sampled responses carry a Server-Timing header,
+# which shows timings to anyone, so leave this off unless measuring.
+
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config(
+    'PROFILING_SAMPLE_RATE', default=0.1, cast=float
+)
+
+
+# Metrics
+#
+# Served at /metrics in the Prometheus text format (see planit/metrics.py).
+# Each process keeps its values in a memory-mapped file in METRICS_DIR,
+# which must be shared by all the workers of one server. Scrapers send
+# METRICS_TOKEN as a bearer token; without one, only staff can read it.
+
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'planit-metrics')
+)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
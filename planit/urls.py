@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
 from accounts.views import signup
+from .metrics import metrics_view
 
 urlpatterns = [
     path('', include('tasks.urls')),
@@ -45,4 +46,7 @@ urlpatterns = [
         name='logout'
     ),
     path('signup/', signup, name='signup'),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -49,7 +49,7 @@ class TaskNoteAdmin(admin.ModelAdmin):
 
 @admin.register(RecurringTask)
 class RecurringTaskAdmin(admin.ModelAdmin):
-    list_display = ('task', 'frequency', 'end_date')
+    list_display = ('task', 'frequency', 'end_date', 'materialized_until')
     list_filter = ('frequency',)
     search_fields = ('task__title',)
 
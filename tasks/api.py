@@ -0,0 +1,309 @@
+"""Read-only JSON API, versioned by URL prefix (``/api/v1/``).
+
+Each resource exposes a list and a detail endpoint scoped to what the
+signed-in user can see. Clients can pick fields with ``?fields=a,b``,
+page through lists with ``?cursor=`` and ``?limit=``, and revalidate
+with ``If-None-Match`` or ``If-Modified-Since``.
+
+Validators are computed from a narrow query over the version fields
+(``updated_at`` plus anything that changes without touching it, like
+denormalized counters), so a 304 is answered before the payload is
+fetched or serialized. Lists only send an ETag: removing a row changes
+the page without moving any ``updated_at``. For the same reason, detail
+responses only send Last-Modified when ``updated_at`` is the sole
+version field.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .models import Task, Category, TaskNote, RecurringTask, SharedTaskList
+from .pagination import KeysetPaginator, InvalidCursor
+from .sync import changes_since, InvalidSyncToken, SyncExpired
+
+API_VERSION = 'v1'
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Resource:
+    """How a model is exposed: who sees which rows, and which fields.
+
+    ``fields`` maps output names to model lookups. ``version_fields``
+    are the lookups that any visible change moves.
+    """
+
+    def __init__(self, name, scope, fields, version_fields=('updated_at',)):
+        self.name = name
+        self.scope = scope
+        self.fields = fields
+        self.version_fields = ('id', *version_fields)
+
+    def queryset(self, user):
+        return self.scope(user)
+
+    def select(self, params):
+        """Return the output field names requested by ?fields="""
+        requested = params.get('fields')
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',')]
+        names = [name for name in names if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # The id is always included so rows can be told apart
+        return ['id', *(name for name in names if name != 'id')]
+
+    def rows(self, queryset, names):
+        lookups = [self.fields[name] for name in names]
+        return [
+            dict(zip(names, values))
+            for values in queryset.values_list(*lookups)
+        ]
+
+
+def _shares_of(user):
+    return SharedTaskList.objects.filter(
+        Q(task__user=user) | Q(shared_with_user=user)
+    )
+
+
+RESOURCES = {
+    resource.name: resource for resource in (
+        Resource(
+            'tasks',
+            lambda user: Task.objects.visible_to(user),
+            {
+                'id': 'id',
+                'title': 'title',
+                'description': 'description',
+                'priority': 'priority',
+                'is_completed': 'is_completed',
+                'due_date': 'due_date',
+                'category': 'category_id',
+                'owner': 'user_id',
+                'access': 'access',
+                'series': 'series_id',
+                'occurrence_date': 'occurrence_date',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+            # Deleting a category clears it with update(), like counters
+            version_fields=('updated_at', 'access', 'category_id'),
+        ),
+        Resource(
+            'categories',
+            lambda user: Category.objects.filter(user=user),
+            {
+                'id': 'id',
+                'name': 'name',
+                'task_count': 'task_count',
+                'pending_count': 'pending_count',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+            # Counters are bumped with update(), which skips auto_now
+            version_fields=('updated_at', 'task_count', 'pending_count'),
+        ),
+        Resource(
+            'notes',
+            lambda user: TaskNote.objects.filter(task__visibility__user=user),
+            {
+                'id': 'id',
+                'task': 'task_id',
+                'content': 'content',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+        ),
+        Resource(
+            'recurring',
+            lambda user: RecurringTask.objects.filter(
+                task__visibility__user=user
+            ),
+            {
+                'id': 'id',
+                'task': 'task_id',
+                'frequency': 'frequency',
+                'end_date': 'end_date',
+                'materialized_until': 'materialized_until',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+            version_fields=('updated_at', 'materialized_until'),
+        ),
+        Resource(
+            'shares',
+            _shares_of,
+            {
+                'id': 'id',
+                'task': 'task_id',
+                'shared_with_user': 'shared_with_user_id',
+                'permission_level': 'permission_level',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+        ),
+    )
+}
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    """Answer anonymous API requests with 401 rather than a redirect"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required.', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def api_view(view):
+    """Resolve the resource, require a signed-in user and allow GET/HEAD"""
+    @require_safe
+    @api_login_required
+    @wraps(view)
+    def wrapper(request, resource, *args, **kwargs):
+        if resource not in RESOURCES:
+            return _error(f'Unknown resource "{resource}".', 404)
+        return view(request, RESOURCES[resource], *args, **kwargs)
+    return wrapper
+
+
+def make_etag(*parts):
+    """Return a strong ETag over the given parts"""
+    digest = hashlib.sha256(API_VERSION.encode())
+    for part in parts:
+        digest.update(repr(part).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the request's validators match, else None"""
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+
+
+def _with_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Per-user data: let clients keep it but always revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _page_size(params):
+    try:
+        limit = int(params.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+@api_view
+def api_list(request, resource):
+    """Return a page of a resource's rows as JSON"""
+    try:
+        names = resource.select(request.GET)
+        limit = _page_size(request.GET)
+    except ValueError as error:
+        return _error(str(error), 400)
+
+    # Page over the version fields only; they are all the ETag needs
+    versions = resource.queryset(request.user).values_list(
+        *resource.version_fields, named=True
+    )
+    paginator = KeysetPaginator(versions, keys=('id',), per_page=limit)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return _error('Invalid cursor.', 400)
+
+    etag = make_etag(
+        resource.name, names, page.next_cursor, page.prev_cursor,
+        [tuple(version) for version in page.object_list]
+    )
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag)
+
+    ids = [row.id for row in page.object_list]
+    rows = resource.rows(
+        resource.queryset(request.user).filter(pk__in=ids).order_by('id'),
+        names
+    )
+    response = JsonResponse({
+        'version': API_VERSION,
+        'results': rows,
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.prev_cursor),
+    })
+    return _with_validators(response, etag)
+
+
+@api_view
+def api_detail(request, resource, pk):
+    """Return a single row of a resource as JSON"""
+    try:
+        names = resource.select(request.GET)
+    except ValueError as error:
+        return _error(str(error), 400)
+
+    queryset = resource.queryset(request.user).filter(pk=pk)
+    version = queryset.values_list(
+        *resource.version_fields, named=True
+    ).first()
+    if version is None:
+        return _error('Not found.', 404)
+
+    etag = make_etag(resource.name, names, version)
+    last_modified = None
+    # Other version fields change without moving updated_at, and a date
+    # alone would then wrongly answer If-Modified-Since with a 304
+    if resource.version_fields == ('id', 'updated_at'):
+        # HTTP dates have whole-second resolution
+        last_modified = int(version.updated_at.timestamp())
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+
+    row = resource.rows(queryset, names)[0]
+    response = JsonResponse({'version': API_VERSION, **row})
+    return _with_validators(response, etag, last_modified)
+
+
+@require_safe
+@api_login_required
+def api_sync(request):
+    """Return the changes and deletions since the ?since= sync token"""
+    try:
+        data = changes_since(request.user, request.GET.get('since'))
+    except InvalidSyncToken:
+        return _error('Invalid sync token.', 400)
+    except SyncExpired:
+        return _error('Sync token expired; sync again without one.', 410)
+    response = JsonResponse({'version': API_VERSION, **data})
+    patch_cache_control(response, private=True, no_store=True)
+    return response
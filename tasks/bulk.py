@@ -0,0 +1,126 @@
+"""Bulk operations on many tasks at once.
+
+An operation is checked and applied to the whole selection: one query
+loads the selected tasks the user may change, and if any are missing the
+operation is refused without touching anything. Changes are then made
+with a single ``UPDATE ... WHERE id IN`` or ``DELETE`` inside one
+transaction. Bulk writes skip the per-row model signals, so counters,
+the search index and suggestions are brought up to date for the whole
+set afterwards, and tombstones are written for deleted tasks. Cached
+task lists of everyone who can see the selection are invalidated.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from planit.metrics import TASK_WRITES
+
+from .cache import invalidate_tasks
+from .counters import track_task_changes
+from .models import Task, Category
+from .search import get_search_backend
+from .signals import bulk_delete
+from .sync import record_deletions
+from .visibility import OWNER, EDIT_ACCESS
+from . import suggest
+
+MAX_BULK_TASKS = 1000
+
+# Action -> access levels allowed to apply it. Categories belong to the
+# owner, so only owners can re-categorize or delete.
+ACTIONS = {
+    'complete': EDIT_ACCESS,
+    'pending': EDIT_ACCESS,
+    'priority': EDIT_ACCESS,
+    'category': (OWNER,),
+    'delete': (OWNER,),
+}
+STATE_FIELDS = ('is_completed', 'priority', 'category_id')
+
+
+class InvalidBulkAction(ValueError):
+    """Raised for an unknown action, a bad value or a bad selection"""
+
+
+def _changed_fields(user, action, value):
+    if action == 'complete':
+        return {'is_completed': True}
+    if action == 'pending':
+        return {'is_completed': False}
+    if action == 'priority':
+        if value not in dict(Task.PRIORITY_CHOICES):
+            raise InvalidBulkAction('Choose a priority.')
+        return {'priority': value}
+    if action == 'category':
+        if not value:
+            return {'category_id': None}
+        try:
+            category = Category.objects.get(pk=int(value), user=user)
+        except (ValueError, Category.DoesNotExist):
+            raise InvalidBulkAction('Choose one of your categories.')
+        return {'category_id': category.pk}
+    return {}
+
+
+def apply_bulk_action(user, action, task_ids, value=None):
+    """Apply action to the tasks with task_ids; return how many changed.
+
+    Raises InvalidBulkAction for bad input, including a selection with any
+    task the user can't see or can't apply the action to.
+    """
+    if action not in ACTIONS:
+        raise InvalidBulkAction('Choose an action.')
+    task_ids = set(task_ids)
+    if not task_ids:
+        raise InvalidBulkAction('Select at least one task.')
+    if len(task_ids) > MAX_BULK_TASKS:
+        raise InvalidBulkAction(
+            f'Select at most {MAX_BULK_TASKS} tasks at a time.'
+        )
+    fields = _changed_fields(user, action, value)
+
+    with transaction.atomic():
+        # One set-wise permission check that also reads the state the
+        # counters need; rows are locked until the write below
+        rows = list(
+            Task.objects.visible_to(user)
+            .filter(pk__in=task_ids, access__in=ACTIONS[action])
+            .select_for_update(of=('self',))
+            .values_list('pk', 'user_id', *STATE_FIELDS)
+        )
+        if len(rows) != len(task_ids):
+            raise InvalidBulkAction(
+                'Some selected tasks are shared with you without the access '
+                'this action needs. No tasks were changed.'
+            )
+        selected = Task.objects.filter(pk__in=task_ids)
+        invalidate_tasks(task_ids)
+
+        if action == 'delete':
+            with bulk_delete():
+                selected.delete()
+            track_task_changes(
+                (user_id, tuple(state), None)
+                for _pk, user_id, *state in rows
+            )
+            record_deletions(
+                'task', ((user_id, pk) for pk, user_id, *_state in rows)
+            )
+            get_search_backend().remove_tasks(task_ids)
+            for user_id in {row[1] for row in rows}:
+                suggest.invalidate(user_id)
+            TASK_WRITES.inc(len(rows), action='deleted')
+            return len(rows)
+
+        # update() skips auto_now, so bump updated_at explicitly
+        selected.update(updated_at=timezone.now(), **fields)
+        changes = []
+        for _pk, user_id, *state in rows:
+            before = tuple(state)
+            after = tuple(
+                fields.get(field, current)
+                for field, current in zip(STATE_FIELDS, before)
+            )
+            changes.append((user_id, before, after))
+        track_task_changes(changes)
+    TASK_WRITES.inc(len(rows), action='updated')
+    return len(rows)
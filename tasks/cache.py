@@ -0,0 +1,156 @@
+"""Per-user cache of the task list page.
+
+The data behind a task list page (the page of tasks, its cursors, the
+categories and the sidebar stats) is cached per user and per filter
+combination. Rendering still happens per request, since the page embeds
+a per-request CSRF token and flash messages.
+
+Entries are never deleted. Each user has a generation counter that is
+part of every key, and any write that can change what the user sees
+bumps it, so invalidation is a single ``incr`` however many pages were
+cached. Stale entries simply age out. Writes bump the counter at once
+and again when the transaction commits, so a request that read the old
+rows mid-transaction can't cache them under the new generation.
+
+Bumps happen in the Task, Category and SharedTaskList signal handlers
+in ``tasks.signals``, which cover views and the admin alike, and in the
+bulk writers that skip signals.
+
+The cache is only used when ``TASK_LIST_CACHE`` is set, which it is
+when ``REDIS_URL`` gives the workers a shared cache. With the per-process
+local-memory backend a bump would only reach the worker that made the
+write, and the others would keep serving the old page. Hits and misses
+are counted with metrics counters, which are shared between processes.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from planit.metrics import LIST_CACHE_HITS, LIST_CACHE_MISSES
+
+from .models import TaskVisibility
+
+LIST_CACHE_TIMEOUT = 300
+GENERATION_KEY = 'tasks:generation:{}'
+PAGE_KEY = 'tasks:list:{}:{}:{}'
+
+
+def _fresh_generation():
+    # Start from the clock so that a counter that was evicted or reset
+    # never comes back to a generation that already has cached pages
+    return time.time_ns()
+
+
+def generation(user_id):
+    """Return the user's current cache generation"""
+    key = GENERATION_KEY.format(user_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh_generation(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        key = GENERATION_KEY.format(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _fresh_generation(), timeout=None)
+
+
+def invalidate_users(user_ids):
+    """Drop the cached list pages of the given users"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+def invalidate_tasks(task_ids):
+    """Drop the cached list pages of everyone who can see the tasks"""
+    invalidate_users(
+        TaskVisibility.objects.filter(task_id__in=task_ids)
+        .values_list('user_id', flat=True).distinct()
+    )
+
+
+def invalidate_category(category):
+    """Drop the pages of the owner and of everyone shown its tasks"""
+    invalidate_users({
+        category.user_id,
+        *TaskVisibility.objects.filter(task__category=category)
+        .values_list('user_id', flat=True).distinct(),
+    })
+
+
+def reset_user(user_id):
+    """Start a new user (or a reused id) from a fresh generation"""
+    cache.set(GENERATION_KEY.format(user_id), _fresh_generation(), None)
+
+
+def _page_key(user_id, params):
+    digest = hashlib.sha256(
+        repr((timezone.localdate(), params)).encode()
+    ).hexdigest()[:32]
+    return PAGE_KEY.format(user_id, generation(user_id), digest)
+
+
+def cached_list(user_id, params, build):
+    """Return the list data for params, calling build() on a miss.
+
+    params is a tuple of everything that selects the page. Today's date
+    is part of the key, as the overdue and due-today stats depend on it.
+    """
+    if not settings.TASK_LIST_CACHE:
+        return build()
+    key = _page_key(user_id, params)
+    data = cache.get(key)
+    if data is not None:
+        LIST_CACHE_HITS.inc()
+        return data
+    LIST_CACHE_MISSES.inc()
+    data = build()
+    cache.set(key, data, LIST_CACHE_TIMEOUT)
+    return data
+
+
+async def acached_list(user_id, params, build):
+    """Async version of cached_list(); build is a coroutine function"""
+    if not settings.TASK_LIST_CACHE:
+        return await build()
+    key = await sync_to_async(_page_key)(user_id, params)
+    data = await cache.aget(key)
+    if data is not None:
+        LIST_CACHE_HITS.inc()
+        return data
+    LIST_CACHE_MISSES.inc()
+    data = await build()
+    await cache.aset(key, data, LIST_CACHE_TIMEOUT)
+    return data
+
+
+def cache_stats():
+    """Return the hit and miss counts and the hit ratio"""
+    hits = int(LIST_CACHE_HITS.total())
+    misses = int(LIST_CACHE_MISSES.total())
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    """Set the hit and miss counts back to zero"""
+    # Prometheus reads the drop as a counter reset
+    for counter in (LIST_CACHE_HITS, LIST_CACHE_MISSES):
+        counter.inc(-counter.total())
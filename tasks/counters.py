@@ -0,0 +1,207 @@
+"""Denormalized per-user and per-category task counters.
+
+Counters live on ``accounts.models.UserProfile`` (per user) and on
+``Category`` (per category). They are adjusted with F-expressions from
+the Task signal handlers in ``tasks.signals`` and can be rebuilt in bulk
+with ``manage.py reconcile_task_counters``.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from accounts.models import UserProfile
+from .cache import invalidate_users
+from .models import Task, Category
+
+# Priority value -> UserProfile counter field
+PRIORITY_COUNTER_FIELDS = {
+    value: f'{value}_priority_tasks' for value, _label in Task.PRIORITY_CHOICES
+}
+
+PROFILE_COUNTER_FIELDS = (
+    'total_tasks',
+    'pending_tasks',
+    'completed_tasks',
+    *PRIORITY_COUNTER_FIELDS.values(),
+)
+
+CATEGORY_COUNTER_FIELDS = ('task_count', 'pending_count')
+
+
+def task_state(task):
+    """Return the parts of a task that the counters depend on"""
+    category_id = task.category_id
+    if category_id is not None:
+        category_id = int(category_id)
+    return (task.is_completed, task.priority, category_id)
+
+
+def _add_state(profile, categories, state, sign):
+    is_completed, priority, category_id = state
+    profile['total_tasks'] += sign
+    profile['completed_tasks' if is_completed else 'pending_tasks'] += sign
+    if priority in PRIORITY_COUNTER_FIELDS:
+        profile[PRIORITY_COUNTER_FIELDS[priority]] += sign
+    if category_id is not None:
+        categories[category_id]['task_count'] += sign
+        if not is_completed:
+            categories[category_id]['pending_count'] += sign
+
+
+def _increments(deltas):
+    return {
+        field: F(field) + delta for field, delta in deltas.items() if delta
+    }
+
+
+def track_task_change(user_id, before, after):
+    """Apply the counter delta between two task states.
+
+    Either state may be None for a create or delete. Only rows whose
+    counters actually change are updated.
+    """
+    track_task_changes([(user_id, before, after)])
+
+
+def track_task_changes(changes):
+    """Apply the deltas of many (user id, before, after) changes at once.
+
+    Deltas are summed first, so each affected profile and category is
+    updated once however many of its tasks changed.
+    """
+    profiles = defaultdict(lambda: defaultdict(int))
+    categories = defaultdict(lambda: defaultdict(int))
+    for user_id, before, after in changes:
+        if before is not None:
+            _add_state(profiles[user_id], categories, before, -1)
+        if after is not None:
+            _add_state(profiles[user_id], categories, after, 1)
+
+    with transaction.atomic():
+        for user_id, deltas in profiles.items():
+            changes = _increments(deltas)
+            if changes:
+                UserProfile.objects.filter(user_id=user_id).update(**changes)
+        for category_id, deltas in categories.items():
+            changes = _increments(deltas)
+            if changes:
+                Category.objects.filter(pk=category_id).update(**changes)
+
+
+def _profile_aggregates():
+    aggregates = {
+        'total_tasks': Count('pk'),
+        'pending_tasks': Count('pk', filter=Q(is_completed=False)),
+        'completed_tasks': Count('pk', filter=Q(is_completed=True)),
+    }
+    for value, field in PRIORITY_COUNTER_FIELDS.items():
+        aggregates[field] = Count('pk', filter=Q(priority=value))
+    return aggregates
+
+
+def _actual_profile_counts(user_ids):
+    rows = (
+        Task.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .values('user_id')
+        .annotate(**_profile_aggregates())
+    )
+    zero = dict.fromkeys(PROFILE_COUNTER_FIELDS, 0)
+    actual = {user_id: dict(zero) for user_id in user_ids}
+    for row in rows:
+        actual[row.pop('user_id')].update(row)
+    return actual
+
+
+def _reconcile_profiles(user_ids, dry_run, drift):
+    actual = _actual_profile_counts(user_ids)
+    profiles = UserProfile.objects.in_bulk(user_ids, field_name='user_id')
+
+    to_create, to_update = [], []
+    for user_id, counts in actual.items():
+        profile = profiles.get(user_id)
+        if profile is None:
+            to_create.append(UserProfile(user_id=user_id, **counts))
+            drift.append(('profile', user_id, 'missing', None, None))
+            continue
+        changed = False
+        for field, value in counts.items():
+            stored = getattr(profile, field)
+            if stored != value:
+                drift.append(('profile', user_id, field, stored, value))
+                setattr(profile, field, value)
+                changed = True
+        if changed:
+            to_update.append(profile)
+
+    if not dry_run:
+        UserProfile.objects.bulk_create(to_create)
+        UserProfile.objects.bulk_update(to_update, PROFILE_COUNTER_FIELDS)
+
+
+def _reconcile_categories(user_ids, dry_run, drift):
+    categories = Category.objects.filter(user_id__in=user_ids).annotate(
+        actual_task_count=Count('tasks'),
+        actual_pending_count=Count(
+            'tasks', filter=Q(tasks__is_completed=False)
+        ),
+    )
+    to_update = []
+    for category in categories:
+        changed = False
+        for field in CATEGORY_COUNTER_FIELDS:
+            stored = getattr(category, field)
+            value = getattr(category, f'actual_{field}')
+            if stored != value:
+                drift.append(('category', category.pk, field, stored, value))
+                setattr(category, field, value)
+                changed = True
+        if changed:
+            to_update.append(category)
+
+    if not dry_run:
+        Category.objects.bulk_update(to_update, CATEGORY_COUNTER_FIELDS)
+
+
+def _reconcile_batch(user_ids, dry_run, drift):
+    found = len(drift)
+    with transaction.atomic():
+        _reconcile_profiles(user_ids, dry_run, drift)
+        _reconcile_categories(user_ids, dry_run, drift)
+        if len(drift) > found and not dry_run:
+            # Repaired counters change the stats on cached task lists
+            invalidate_users(user_ids)
+
+
+def reconcile_counters(user_ids=None, batch_size=1000, dry_run=False):
+    """Rebuild counters from the Task table in batches of users.
+
+    Returns a list of drift records as
+    ``(kind, object_id, field, stored, actual)`` tuples. Missing profiles
+    are created unless dry_run is set.
+    """
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        user_ids = user_ids.iterator(chunk_size=batch_size)
+
+    drift = []
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            _reconcile_batch(batch, dry_run, drift)
+            batch = []
+    if batch:
+        _reconcile_batch(batch, dry_run, drift)
+    return drift
+
+
+def ensure_counters(user):
+    """Return the user's profile, building its counters if it is missing"""
+    try:
+        return UserProfile.objects.get(user=user)
+    except UserProfile.DoesNotExist:
+        reconcile_counters([user.pk])
+        return UserProfile.objects.get(user=user)
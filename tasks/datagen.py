@@ -0,0 +1,229 @@
+"""Synthetic datasets for load testing.
+
+Users, categories, tasks, notes, recurrences and shares are drawn from a
+seeded random generator, so the same options always produce the same
+data. Rows are written in batches with ``bulk_create``, or streamed with
+``COPY`` on PostgreSQL. Model signals don't fire for bulk writes, so the
+counters, visibility rows and search index are rebuilt once at the end.
+
+Used by ``manage.py generate_dataset``.
+"""
+import csv
+import io
+import random
+from datetime import timedelta
+from itertools import batched
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+from .counters import reconcile_counters
+from .models import Task, Category, TaskNote, RecurringTask, SharedTaskList
+from .search import get_search_backend
+from .visibility import rebuild_visibility
+
+CATEGORY_NAMES = [
+    'Work', 'Personal', 'Shopping', 'Health', 'Finance', 'Home', 'Travel',
+    'Learning',
+]
+VERBS = [
+    'Review', 'Write', 'Plan', 'Call', 'Email', 'Fix', 'Prepare', 'Book',
+    'Buy', 'Clean', 'Update', 'Organise', 'Schedule', 'Pay', 'Read',
+]
+NOUNS = [
+    'report', 'budget', 'meeting', 'invoice', 'presentation', 'groceries',
+    'dentist', 'flights', 'garden', 'newsletter', 'taxes', 'backlog',
+    'proposal', 'car service', 'birthday gift', 'slides', 'contract',
+]
+
+# Share of tasks per priority
+PRIORITY_WEIGHTS = {'high': 0.2, 'medium': 0.5, 'low': 0.3}
+
+
+class BulkWriter:
+    """Insert model instances in batches and set their primary keys"""
+
+    def __init__(self, batch_size=1000, connection=None):
+        self.batch_size = batch_size
+        self.connection = connection or default_connection
+        self.use_copy = self.connection.vendor == 'postgresql'
+
+    def write(self, model, objs):
+        objs = list(objs)
+        if not objs:
+            return objs
+        if self.use_copy:
+            for chunk in batched(objs, self.batch_size):
+                self._copy(model, chunk)
+        else:
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+        return objs
+
+    def _reserve_pks(self, model, count):
+        # COPY can't return ids, so draw them from the sequence up front
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [model._meta.db_table, model._meta.pk.column, count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _copy(self, model, objs):
+        for obj, pk in zip(objs, self._reserve_pks(model, len(objs))):
+            obj.pk = pk
+
+        fields = model._meta.concrete_fields
+        buffer = io.StringIO()
+        # Unquoted empty fields are NULL in COPY's csv format
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NOTNULL)
+        for obj in objs:
+            writer.writerow([
+                field.get_db_prep_save(
+                    field.pre_save(obj, add=True), self.connection
+                )
+                for field in fields
+            ])
+
+        quote_name = self.connection.ops.quote_name
+        columns = ', '.join(quote_name(field.column) for field in fields)
+        sql = (
+            f'COPY {quote_name(model._meta.db_table)} ({columns}) '
+            'FROM STDIN WITH (FORMAT csv)'
+        )
+        with self.connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                buffer.seek(0)
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def _category_names(count):
+    names = []
+    for i in range(count):
+        name = CATEGORY_NAMES[i % len(CATEGORY_NAMES)]
+        if i >= len(CATEGORY_NAMES):
+            name = f'{name} {i // len(CATEGORY_NAMES) + 1}'
+        names.append(name)
+    return names
+
+
+def generate_dataset(users=10, categories=5, tasks=100, notes=0.3,
+                     recurring=0.05, shared=0.05, completed=0.4,
+                     undated=0.2, due_spread=30, seed=0, batch_size=1000,
+                     prefix='loadtest', password='password',
+                     connection=None):
+    """Create a seeded synthetic dataset and return the row counts.
+
+    ``categories`` and ``tasks`` are per user. ``notes``, ``recurring``,
+    ``shared``, ``completed`` and ``undated`` are the chance of a task
+    having a note, a recurrence, a share, being completed and having no
+    due date. Due dates are normally distributed around today with a
+    standard deviation of ``due_spread`` days.
+    """
+    rng = random.Random(seed)
+    writer = BulkWriter(batch_size, connection)
+    today = timezone.localdate()
+    counts = dict.fromkeys(
+        ('users', 'categories', 'tasks', 'notes', 'recurrences', 'shares'), 0
+    )
+
+    # Hashing is deliberately slow, so every user shares one hash
+    password_hash = make_password(password)
+    start = User.objects.filter(username__startswith=prefix).count()
+    user_ids = []
+    for chunk in batched(range(start, start + users), batch_size):
+        created = writer.write(User, (
+            User(username=f'{prefix}{n + 1}', password=password_hash)
+            for n in chunk
+        ))
+        user_ids += [user.pk for user in created]
+    counts['users'] = len(user_ids)
+
+    names = _category_names(categories)
+    category_ids = {user_id: [] for user_id in user_ids}
+    rows = ((user_id, name) for user_id in user_ids for name in names)
+    for chunk in batched(rows, batch_size):
+        created = writer.write(Category, (
+            Category(user_id=user_id, name=name) for user_id, name in chunk
+        ))
+        for category in created:
+            category_ids[category.user_id].append(category.pk)
+        counts['categories'] += len(created)
+
+    priorities = list(PRIORITY_WEIGHTS)
+    weights = list(PRIORITY_WEIGHTS.values())
+    frequencies = [value for value, _label in RecurringTask.FREQUENCY_CHOICES]
+    permissions = [
+        value for value, _label in SharedTaskList.PERMISSION_CHOICES
+    ]
+
+    def task_rows():
+        for user_id in user_ids:
+            for _ in range(tasks):
+                due_date = None
+                if rng.random() >= undated:
+                    offset = round(rng.gauss(0, due_spread))
+                    due_date = today + timedelta(days=offset)
+                own_categories = category_ids[user_id]
+                yield Task(
+                    user_id=user_id,
+                    title=f'{rng.choice(VERBS)} {rng.choice(NOUNS)}',
+                    description=(
+                        f'{rng.choice(VERBS)} the {rng.choice(NOUNS)} '
+                        f'and {rng.choice(NOUNS)}'
+                        if rng.random() < 0.5 else ''
+                    ),
+                    priority=rng.choices(priorities, weights)[0],
+                    is_completed=rng.random() < completed,
+                    due_date=due_date,
+                    category_id=(
+                        rng.choice(own_categories)
+                        if own_categories and rng.random() < 0.8 else None
+                    ),
+                )
+
+    for chunk in batched(task_rows(), batch_size):
+        with transaction.atomic():
+            created = writer.write(Task, chunk)
+            task_notes, recurrences, shares = [], [], []
+            for task in created:
+                if rng.random() < notes:
+                    task_notes.append(TaskNote(
+                        task_id=task.pk,
+                        content=f'Remember the {rng.choice(NOUNS)}'
+                    ))
+                if task.due_date and rng.random() < recurring:
+                    recurrences.append(RecurringTask(
+                        task_id=task.pk,
+                        frequency=rng.choice(frequencies),
+                        end_date=(
+                            task.due_date + timedelta(days=365)
+                            if rng.random() < 0.5 else None
+                        ),
+                    ))
+                if len(user_ids) > 1 and rng.random() < shared:
+                    others = [u for u in rng.sample(user_ids, 2)
+                              if u != task.user_id]
+                    shares.append(SharedTaskList(
+                        task_id=task.pk,
+                        shared_with_user_id=others[0],
+                        permission_level=rng.choice(permissions),
+                    ))
+            writer.write(TaskNote, task_notes)
+            writer.write(RecurringTask, recurrences)
+            writer.write(SharedTaskList, shares)
+        counts['tasks'] += len(created)
+        counts['notes'] += len(task_notes)
+        counts['recurrences'] += len(recurrences)
+        counts['shares'] += len(shares)
+
+    reconcile_counters(user_ids, batch_size=batch_size)
+    rebuild_visibility(writer.connection)
+    get_search_backend(writer.connection).rebuild()
+    return counts
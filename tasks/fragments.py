@@ -0,0 +1,56 @@
+"""Cached HTML fragments for task cards.
+
+Each card on the task list is rendered once from
+``tasks/_task_card.html`` and cached under a key built from what it
+shows: the task's id and ``updated_at``, the viewer's access level
+(which buttons appear) and the category name (renames don't touch the
+task). A page of cards is fetched with one ``get_many``, and only the
+missing cards are rendered.
+
+Cards contain forms, but a CSRF token must never be cached. Cards are
+rendered with a placeholder token instead, and the request's real token
+is swapped in after the lookup. The placeholder is a safe string that
+contains ``<``, which autoescaped task data can never produce, so only
+the slots the template emitted are replaced.
+"""
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'tasks/_task_card.html'
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+# Bump when the card template changes, so older fragments are not served
+CARD_VERSION = 2
+CSRF_SLOT = mark_safe('<csrf-token>')
+
+
+def card_key(task):
+    """Return the cache key of a task's card"""
+    category = task.category.name if task.category_id else None
+    return make_template_fragment_key(
+        'task_card',
+        [CARD_VERSION, task.pk, task.updated_at.isoformat(), task.access,
+         category]
+    )
+
+
+def render_task_cards(request, tasks):
+    """Return the HTML of each task's card, in order"""
+    keys = [card_key(task) for task in tasks]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    template = get_template(CARD_TEMPLATE)
+    for key, task in zip(keys, tasks):
+        if key not in cached and key not in missing:
+            missing[key] = template.render(
+                {'task': task, 'csrf_token': CSRF_SLOT}
+            )
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+
+    token = get_token(request)
+    return [mark_safe(cached[key].replace(CSRF_SLOT, token)) for key in keys]
@@ -0,0 +1,389 @@
+"""Bulk import of tasks from CSV or JSON uploads.
+
+Uploads are parsed incrementally: CSV row by row, and JSON (an array of
+objects, or one object per line) object by object, so a file is never
+loaded into Python objects all at once. Records are validated and
+written in batches. For each batch, the categories it names are looked
+up with one query and any missing ones are created in one insert. Tasks,
+notes and recurrences then go in with ``bulk_create``. Invalid rows are
+skipped and reported by row number, and the rest of the file is still
+imported.
+
+The columns match ``tasks.export``, so an export can be imported again.
+Unknown columns are ignored.
+
+Small uploads are imported during the request. Larger ones are queued
+as an ``ImportJob`` and picked up by ``manage.py process_imports``,
+which records progress after every batch.
+"""
+import csv
+import io
+import json
+import logging
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.utils import timezone
+
+from planit.metrics import TASK_WRITES
+
+from .cache import invalidate_users
+from .counters import task_state, track_task_changes
+from .models import Task, Category, TaskNote, RecurringTask, ImportJob
+from .recurrence import default_horizon, materialize_rules
+from .search import get_search_backend
+from .visibility import grant_owners
+from . import suggest
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+# Uploads up to this size are imported during the request
+INLINE_IMPORT_BYTES = 256 * 1024
+MAX_IMPORT_BYTES = 20 * 1024 * 1024
+# Row errors kept on the job; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+JSON_READ_SIZE = 64 * 1024
+
+PRIORITIES = dict(Task.PRIORITY_CHOICES)
+FREQUENCIES = dict(RecurringTask.FREQUENCY_CHOICES)
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+
+class ImportFormatError(ValueError):
+    """Raised when an upload can't be parsed any further"""
+
+
+class InvalidRow(ValueError):
+    """Raised for a record that fails validation"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class ImportRow:
+    """A validated record, ready to be written"""
+
+    def __init__(self, task, category, notes, recurrence):
+        self.task = task
+        self.category = category
+        self.notes = notes
+        self.recurrence = recurrence
+
+
+def import_format(file_name):
+    """Return the import format for a file name, or None"""
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('json', 'ndjson', 'jsonl'):
+        return 'json'
+    return None
+
+
+def _csv_records(text):
+    yield from csv.DictReader(text)
+
+
+def _json_records(text):
+    """Yield the top-level values of a JSON array or NDJSON stream"""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        # Brackets, commas and whitespace only separate records
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position < len(buffer):
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise ImportFormatError(f'Invalid JSON: {error.msg}')
+            else:
+                yield record
+                continue
+        elif eof:
+            return
+        chunk = text.read(JSON_READ_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def parse_records(stream, file_format):
+    """Yield the raw records of a binary stream one at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            yield from _csv_records(text)
+        else:
+            yield from _json_records(text)
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file is not UTF-8 encoded.')
+    except csv.Error as error:
+        raise ImportFormatError(f'Invalid CSV: {error}')
+    finally:
+        # Leave the stream open so callers can still report its position
+        text.detach()
+
+
+def _text(record, key):
+    value = record.get(key)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{key} must be text')
+    return value.strip()
+
+
+def _date(record, key):
+    value = _text(record, key)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{key} must be a date like 2025-01-31')
+
+
+def _boolean(record, key):
+    value = record.get(key)
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'{key} must be true or false')
+
+
+def _notes(record):
+    notes = record.get('notes') or []
+    if isinstance(notes, str):
+        # CSV exports put one note per line
+        notes = notes.split('\n')
+    if not isinstance(notes, list):
+        raise ValueError('notes must be text or a list of text')
+    return [str(note).strip() for note in notes if str(note).strip()]
+
+
+def clean_record(user, record):
+    """Return an ImportRow for a raw record.
+
+    Raises InvalidRow listing every problem with the record.
+    """
+    if not isinstance(record, dict):
+        raise InvalidRow(['expected an object of task fields'])
+    errors = []
+
+    def check(parse, *args):
+        try:
+            return parse(*args)
+        except ValueError as error:
+            errors.append(str(error))
+
+    title = check(_text, record, 'title')
+    if title == '':
+        errors.append('title is required')
+    elif title and len(title) > Task._meta.get_field('title').max_length:
+        errors.append('title is too long')
+    description = check(_text, record, 'description')
+    priority = check(_text, record, 'priority')
+    priority = (priority or 'medium').lower()
+    if priority not in PRIORITIES:
+        errors.append(f'priority must be one of {", ".join(PRIORITIES)}')
+    category = check(_text, record, 'category')
+    if category and len(category) > Category._meta.get_field(
+        'name'
+    ).max_length:
+        errors.append('category is too long')
+    frequency = (check(_text, record, 'recurrence') or '').lower()
+    if frequency and frequency not in FREQUENCIES:
+        errors.append(
+            f'recurrence must be one of {", ".join(FREQUENCIES)}'
+        )
+    task = Task(
+        user=user,
+        title=title,
+        description=description or '',
+        priority=priority,
+        is_completed=check(_boolean, record, 'is_completed'),
+        due_date=check(_date, record, 'due_date'),
+    )
+    notes = check(_notes, record)
+    end_date = check(_date, record, 'recurrence_end_date')
+    if errors:
+        raise InvalidRow(errors)
+    recurrence = (frequency, end_date) if frequency else None
+    return ImportRow(task, category, notes, recurrence)
+
+
+def _resolve_categories(user, rows):
+    """Set each row's category id, creating the missing categories.
+
+    Return the ids of the categories created, which already hold the
+    counts for this batch's tasks.
+    """
+    names = {row.category for row in rows if row.category}
+    if not names:
+        return set()
+    found = dict(
+        Category.objects.filter(user=user, name__in=names)
+        .values_list('name', 'pk')
+    )
+    counts = defaultdict(lambda: {'task_count': 0, 'pending_count': 0})
+    for row in rows:
+        if row.category and row.category not in found:
+            counts[row.category]['task_count'] += 1
+            counts[row.category]['pending_count'] += not row.task.is_completed
+    created = [
+        Category(user=user, name=name, **counts[name])
+        for name in sorted(counts)
+    ]
+    Category.objects.bulk_create(created)
+    found.update((category.name, category.pk) for category in created)
+    for row in rows:
+        row.task.category_id = found.get(row.category)
+    return {category.pk for category in created}
+
+
+def _uncounted_state(task, counted_categories):
+    is_completed, priority, category_id = task_state(task)
+    if category_id in counted_categories:
+        category_id = None
+    return (is_completed, priority, category_id)
+
+
+def import_batch(user, rows):
+    """Write a batch of ImportRows in one transaction"""
+    with transaction.atomic():
+        created = _resolve_categories(user, rows)
+        tasks = [row.task for row in rows]
+        Task.objects.bulk_create(tasks)
+
+        TaskNote.objects.bulk_create(
+            TaskNote(task=row.task, content=content)
+            for row in rows for content in row.notes
+        )
+        rules = [
+            RecurringTask(task=row.task, frequency=frequency, end_date=end)
+            for row in rows if row.recurrence
+            for frequency, end in [row.recurrence]
+        ]
+        RecurringTask.objects.bulk_create(rules)
+
+        # bulk_create skips the model signals, so sync the denormalized
+        # data for the whole batch here. New categories were created with
+        # their counts, so only existing ones are counted again.
+        track_task_changes(
+            (user.pk, None, _uncounted_state(task, created))
+            for task in tasks
+        )
+        grant_owners((task.pk, user.pk) for task in tasks)
+        get_search_backend().update_tasks(task.pk for task in tasks)
+        if rules:
+            materialize_rules(rules, default_horizon())
+        invalidate_users([user.pk])
+    suggest.invalidate(user.pk)
+    TASK_WRITES.inc(len(tasks), action='created')
+
+
+def _save_progress(job, stream, **fields):
+    job.processed_bytes = stream.tell()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[
+        'processed_bytes', 'row_count', 'imported_count', 'error_count',
+        'errors', 'updated_at', *fields,
+    ])
+
+
+def run_import(job, batch_size=IMPORT_BATCH_SIZE):
+    """Import a job's upload, saving progress after every batch"""
+    stream = io.BytesIO(bytes(job.data))
+    batch = []
+
+    def flush():
+        import_batch(job.user, batch)
+        job.imported_count += len(batch)
+        batch.clear()
+        _save_progress(job, stream)
+
+    status, message = ImportJob.DONE, ''
+    try:
+        try:
+            for number, record in enumerate(
+                parse_records(stream, job.format), start=1
+            ):
+                job.row_count = number
+                try:
+                    batch.append(clean_record(job.user, record))
+                except InvalidRow as error:
+                    job.error_count += 1
+                    if len(job.errors) < MAX_REPORTED_ERRORS:
+                        job.errors.append(
+                            {'row': number, 'errors': error.errors}
+                        )
+                if len(batch) >= batch_size:
+                    flush()
+        except ImportFormatError as error:
+            # The rows read before the error are still imported
+            status, message = ImportJob.FAILED, str(error)
+        if batch:
+            flush()
+    except Exception:
+        # Batches are atomic, so earlier ones stay imported and the
+        # failed one is rolled back; the job must still end, or it
+        # would be left running with its upload kept forever
+        logger.exception('Import job %s failed', job.pk)
+        status = ImportJob.FAILED
+        message = 'The import stopped because of an unexpected error.'
+
+    _save_progress(
+        job, stream, status=status, message=message,
+        finished_at=timezone.now(), data=b''
+    )
+    return job
+
+
+def create_import_job(user, upload, inline=False):
+    """Store an upload as an ImportJob.
+
+    Jobs to be run inline are created as running, so the process_imports
+    worker never claims them too; others are left pending for it.
+    """
+    return ImportJob.objects.create(
+        user=user,
+        file_name=upload.name[:255],
+        format=import_format(upload.name),
+        data=b''.join(upload.chunks()),
+        size=upload.size,
+        status=ImportJob.RUNNING if inline else ImportJob.PENDING,
+    )
+
+
+def claim_import_job():
+    """Mark the oldest pending job as running and return it, or None"""
+    with transaction.atomic():
+        job = ImportJob.objects.filter(
+            status=ImportJob.PENDING
+        ).order_by('pk').select_for_update(skip_locked=True).first()
+        if job is not None:
+            job.status = ImportJob.RUNNING
+            job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def process_pending_imports(limit=None):
+    """Run pending import jobs in order; return how many were run"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_import_job()
+        if job is None:
+            break
+        run_import(job)
+        count += 1
+    return count
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+from tasks.profiling import METRICS, clear_buffer, read_buffer, summarize
+
+
+class Command(BaseCommand):
+    help = 'Print the profiled views from the profiling ring buffer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the summary rows as JSON'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Empty the buffer after printing it'
+        )
+
+    def handle(self, *args, **options):
+        snapshots = read_buffer()
+        rows = summarize(snapshots)
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+        else:
+            for row in rows:
+                averages = ', '.join(
+                    f'{metric} {row[f"avg_{metric}"]:.1f}'
+                    for metric in METRICS
+                    if row[f'avg_{metric}'] is not None
+                )
+                self.stdout.write(
+                    f"{row['view']}: {row['count']} requests, "
+                    f"{row['total_wall_ms']:.0f} ms total ({averages})"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(rows)} views from {len(snapshots)} snapshots'
+            ))
+        if options['clear']:
+            clear_buffer()
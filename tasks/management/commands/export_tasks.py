@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tasks.export import FORMATS, EXPORT_CHUNK_SIZE, export_lines
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Stream tasks as CSV or NDJSON to a file or standard output'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only export tasks owned by this username'
+        )
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='csv',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to; standard output if omitted'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Rows fetched per database round trip'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        tasks = Task.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'No user named "{options["user"]}"')
+            tasks = tasks.filter(user=user)
+
+        lines = export_lines(tasks, options['format'], options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        # newline='' keeps the csv module's line endings intact
+        with open(options['output'], 'w', newline='',
+                  encoding='utf-8') as output:
+            count = 0
+            for line in lines:
+                output.write(line)
+                count += 1
+        if options['format'] == 'csv':
+            count -= 1  # header
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {count} tasks to {options["output"]}'
+        ))
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tasks.datagen import generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Generate a seeded synthetic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Number of users to create'
+        )
+        parser.add_argument(
+            '--categories', type=int, default=5,
+            help='Categories per user'
+        )
+        parser.add_argument(
+            '--tasks', type=int, default=100,
+            help='Tasks per user'
+        )
+        parser.add_argument(
+            '--notes', type=float, default=0.3,
+            help='Chance of a task having a note'
+        )
+        parser.add_argument(
+            '--recurring', type=float, default=0.05,
+            help='Chance of a dated task recurring'
+        )
+        parser.add_argument(
+            '--shared', type=float, default=0.05,
+            help='Chance of a task being shared with another user'
+        )
+        parser.add_argument(
+            '--completed', type=float, default=0.4,
+            help='Chance of a task being completed'
+        )
+        parser.add_argument(
+            '--undated', type=float, default=0.2,
+            help='Chance of a task having no due date'
+        )
+        parser.add_argument(
+            '--due-spread', type=int, default=30,
+            help='Standard deviation of due dates around today, in days'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed; the same seed reproduces the same data'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per bulk insert'
+        )
+        parser.add_argument(
+            '--prefix', default='loadtest',
+            help='Username prefix for generated users'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Password for every generated user'
+        )
+
+    def handle(self, *args, **options):
+        for name in ('notes', 'recurring', 'shared', 'completed', 'undated'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f'--{name} must be between 0 and 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.monotonic()
+        counts = generate_dataset(
+            users=options['users'],
+            categories=options['categories'],
+            tasks=options['tasks'],
+            notes=options['notes'],
+            recurring=options['recurring'],
+            shared=options['shared'],
+            completed=options['completed'],
+            undated=options['undated'],
+            due_spread=options['due_spread'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            prefix=options['prefix'],
+            password=options['password'],
+        )
+        elapsed = time.monotonic() - started
+
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {summary} in {elapsed:.1f}s')
+        )
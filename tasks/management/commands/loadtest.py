@@ -0,0 +1,119 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent requests to a running server as generated users '
+        'and report throughput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url',
+            help='Base URL of the server, e.g. http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request; repeat to cycle through several '
+                 '(default: the task list, a task and the categories)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Total number of requests'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Requests in flight at once'
+        )
+        parser.add_argument(
+            '--prefix', default='loadtest',
+            help='Sign in as the users with this username prefix, as '
+                 'created by generate_dataset'
+        )
+
+    def _sessions(self, prefix):
+        # Sessions are created here and sent as cookies, so the server
+        # must share this database
+        sessions = []
+        for user in User.objects.filter(username__startswith=prefix):
+            client = Client()
+            client.force_login(user)
+            cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+            task = user.tasks.order_by('pk').values_list('pk', flat=True)
+            sessions.append((cookie, task.first()))
+        if not sessions:
+            raise CommandError(
+                f'No users named "{prefix}..."; run generate_dataset first'
+            )
+        return sessions
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Give an http:// URL')
+        paths = options['paths'] or ['/', '/tasks/{task}/', '/categories/']
+        sessions = self._sessions(options['prefix'])
+        local = threading.local()
+
+        def fetch(n):
+            if not hasattr(local, 'connection'):
+                local.connection = http.client.HTTPConnection(
+                    url.hostname, url.port or 80, timeout=60
+                )
+            cookie, task = sessions[n % len(sessions)]
+            path = paths[n % len(paths)].format(task=task)
+            start = time.perf_counter()
+            try:
+                local.connection.request('GET', path, headers={
+                    'Cookie': f'{settings.SESSION_COOKIE_NAME}={cookie}',
+                })
+                response = local.connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                local.connection.close()
+                del local.connection
+                status = None
+            return status, time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _status, latency in results)
+        failed = sum(status != 200 for status, _latency in results)
+        self.stdout.write(
+            f'{len(results)} requests in {elapsed:.2f}s '
+            f'with {options["concurrency"]} in flight'
+        )
+        self.stdout.write(
+            'latency ms: '
+            f'mean {statistics.mean(latencies) * 1000:.1f}, '
+            f'p50 {_percentile(latencies, 0.5) * 1000:.1f}, '
+            f'p95 {_percentile(latencies, 0.95) * 1000:.1f}, '
+            f'p99 {_percentile(latencies, 0.99) * 1000:.1f}'
+        )
+        message = f'{len(results) / elapsed:.1f} requests/s'
+        if failed:
+            self.stdout.write(self.style.ERROR(
+                f'{message}, {failed} failed'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
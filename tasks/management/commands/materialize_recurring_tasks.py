@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks.recurrence import HORIZON_DAYS, materialize_occurrences
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming occurrences of recurring tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=HORIZON_DAYS,
+            help='How many days ahead to materialize occurrences'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recurrence rules to process per batch'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running as a worker, repeating every N seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            until = timezone.localdate() + timedelta(days=options['days'])
+            created = materialize_occurrences(
+                until=until, batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Materialized {created} occurrences up to {until}'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from tasks.importer import process_pending_imports
+
+
+class Command(BaseCommand):
+    help = 'Run pending task imports that were too large to run inline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running as a worker, checking every N seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_pending_imports()
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} imports'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from tasks.sync import prune_tombstones, TOMBSTONE_DAYS
+
+
+class Command(BaseCommand):
+    help = (
+        f'Delete delta-sync tombstones older than {TOMBSTONE_DAYS} days; '
+        'clients with older sync tokens are asked to resync in full'
+    )
+
+    def handle(self, *args, **options):
+        count = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {count} tombstones'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from tasks.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all tasks'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.install()
+        backend.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt search index ({type(backend).__name__})'
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from tasks.models import TaskVisibility
+from tasks.visibility import rebuild_visibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the task visibility index from tasks and shares'
+
+    def handle(self, *args, **options):
+        rebuild_visibility()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt task visibility ({TaskVisibility.objects.count()} rows)'
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from tasks.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized task counters and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users to reconcile per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing any changes'
+        )
+        parser.add_argument(
+            '--verbose-drift',
+            action='store_true',
+            help='List every drifted counter'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+
+        if options['verbose_drift']:
+            for kind, object_id, field, stored, actual in drift:
+                self.stdout.write(
+                    f'{kind} {object_id}: {field} {stored} -> {actual}'
+                )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('No counter drift found'))
+            return
+
+        action = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            self.style.WARNING(f'{action} {len(drift)} drifted counters')
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from tasks.cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Report hits and misses of the task list cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Set the counts back to zero after reporting them'
+        )
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_ratio']:.1%} hit ratio)"
+        ))
+        if options['reset']:
+            reset_cache_stats()
@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-17 07:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_by):
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        Value(0),
+    )
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Category = apps.get_model('tasks', 'Category')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+
+    by_category = Task.objects.filter(category=OuterRef('pk'))
+    Category.objects.update(
+        task_count=_count(by_category, 'category'),
+        pending_count=_count(
+            by_category.filter(is_completed=False), 'category'
+        ),
+    )
+
+    by_user = Task.objects.filter(user=OuterRef('user'))
+    UserProfile.objects.update(
+        total_tasks=_count(by_user, 'user'),
+        pending_tasks=_count(by_user.filter(is_completed=False), 'user'),
+        completed_tasks=_count(by_user.filter(is_completed=True), 'user'),
+        high_priority_tasks=_count(by_user.filter(priority='high'), 'user'),
+        medium_priority_tasks=_count(
+            by_user.filter(priority='medium'), 'user'
+        ),
+        low_priority_tasks=_count(by_user.filter(priority='low'), 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userprofile_task_counters'),
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='pending_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='task_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
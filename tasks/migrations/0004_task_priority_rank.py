@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-17 07:20
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+import tasks.models
+
+RANKS = {'high': 1, 'medium': 2, 'low': 3}
+
+
+def priority_to_rank(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.update(priority_rank=Case(
+        *[When(priority=name, then=Value(rank))
+          for name, rank in RANKS.items()],
+        default=Value(RANKS['medium']),
+    ))
+
+
+def rank_to_priority(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.update(priority=Case(
+        *[When(priority_rank=rank, then=Value(name))
+          for name, rank in RANKS.items()],
+        default=Value('medium'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_user_priority_due_idx',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.RunPython(priority_to_rank, rank_to_priority),
+        migrations.RemoveField(
+            model_name='task',
+            name='priority',
+        ),
+        migrations.RenameField(
+            model_name='task',
+            old_name='priority_rank',
+            new_name='priority',
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='priority',
+            field=tasks.models.PriorityField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'priority', 'due_date'], name='task_user_priority_due_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-17 07:45
+
+from django.db import migrations
+
+# The index as it was when this migration was written. Inlined rather than
+# taken from tasks.search, so later changes there don't change what this
+# migration does.
+
+SQLITE_INSTALL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5('
+    "user_key, title, description, notes, tokenize='porter unicode61')",
+    'DELETE FROM tasks_task_fts',
+    'INSERT INTO tasks_task_fts (rowid, user_key, title, description, notes) '
+    "SELECT t.id, 'u' || t.user_id, t.title, COALESCE(t.description, ''), "
+    "COALESCE((SELECT group_concat(n.content, ' ') "
+    "FROM tasks_tasknote n WHERE n.task_id = t.id), '') "
+    'FROM tasks_task t',
+]
+SQLITE_UNINSTALL = ['DROP TABLE IF EXISTS tasks_task_fts']
+
+POSTGRES_INSTALL = [
+    'CREATE TABLE IF NOT EXISTS tasks_task_search ('
+    'task_id bigint PRIMARY KEY REFERENCES tasks_task (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'user_id integer NOT NULL, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS tasks_task_search_document_idx '
+    'ON tasks_task_search USING GIN (document)',
+    'CREATE INDEX IF NOT EXISTS tasks_task_search_user_idx '
+    'ON tasks_task_search (user_id)',
+    'TRUNCATE tasks_task_search',
+    'INSERT INTO tasks_task_search (task_id, user_id, document) '
+    'SELECT t.id, t.user_id, '
+    "setweight(to_tsvector('english', t.title), 'A') || "
+    "setweight(to_tsvector('english', COALESCE(t.description, '')), 'B') || "
+    "setweight(to_tsvector('english', "
+    "COALESCE((SELECT string_agg(n.content, ' ') "
+    "FROM tasks_tasknote n WHERE n.task_id = t.id), '')), 'C') "
+    'FROM tasks_task t',
+]
+POSTGRES_UNINSTALL = ['DROP TABLE IF EXISTS tasks_task_search']
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_UNINSTALL),
+}
+
+
+def _run(schema_editor, install):
+    # Other databases search without an index
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[0 if install else 1]:
+        schema_editor.execute(sql)
+
+
+def install_search_index(apps, schema_editor):
+    _run(schema_editor, install=True)
+
+
+def uninstall_search_index(apps, schema_editor):
+    _run(schema_editor, install=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_task_priority_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
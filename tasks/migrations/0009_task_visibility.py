@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-17 07:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# The rows as tasks.visibility built them when this migration was
+# written. Inlined rather than imported, so later changes there don't
+# change what this migration does.
+
+POPULATE = [
+    'DELETE FROM tasks_taskvisibility',
+    'INSERT INTO tasks_taskvisibility (user_id, task_id, access) '
+    "SELECT user_id, id, 'owner' FROM tasks_task",
+    'INSERT INTO tasks_taskvisibility (user_id, task_id, access) '
+    'SELECT s.shared_with_user_id, s.task_id, s.permission_level '
+    'FROM tasks_sharedtasklist s '
+    'INNER JOIN tasks_task t ON t.id = s.task_id '
+    'WHERE s.shared_with_user_id <> t.user_id',
+]
+
+
+def populate_visibility(apps, schema_editor):
+    for sql in POPULATE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_user_due_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('access', models.CharField(choices=[('owner', 'Owner'), ('view_only', 'View Only'), ('editable', 'Editable')], max_length=10)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='tasks.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visible_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'task visibility',
+                'constraints': [models.UniqueConstraint(fields=('user', 'task'), name='task_visibility_user_task_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_visibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_task_visibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedtasklist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
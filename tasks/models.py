@@ -1,7 +1,46 @@
-from django.db import models
+from django.core import exceptions
+from django.db import models, transaction
+from django.db.models.functions import Left
 from django.contrib.auth.models import User
 
 
+class PriorityField(models.Field):
+    """Priority stored as a sortable small integer.
+
+    The Python value stays the choice name ('high', 'medium', 'low') so
+    forms, templates and filters are unchanged, while the column holds
+    its rank (high=1 ... low=3) and sorts with a plain ORDER BY.
+    """
+    RANKS = {'high': 1, 'medium': 2, 'low': 3}
+    NAMES = {rank: name for name, rank in RANKS.items()}
+
+    def get_internal_type(self):
+        return 'SmallIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or value in self.RANKS:
+            return value
+        try:
+            return self.NAMES[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                f'"{value}" is not a valid priority.', code='invalid'
+            )
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        if value in self.RANKS:
+            return self.RANKS[value]
+        if isinstance(value, int) and value in self.NAMES:
+            return value
+        raise ValueError(f'Field "{self.name}" got invalid priority {value!r}')
+
+
 class Category(models.Model):
     """Model for task categories"""
     user = models.ForeignKey(
@@ -10,17 +49,83 @@ class Category(models.Model):
         related_name='categories'
     )
     name = models.CharField(max_length=100)
+    # Denormalized counters, maintained by tasks.counters
+    task_count = models.IntegerField(default=0, editable=False)
+    pending_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'categories'
+        indexes = [
+            # Delta sync scans, see tasks.sync
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='category_user_updated_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class TaskQuerySet(models.QuerySet):
+    """Query shapes for the task views"""
+    # Enough text for the list's 15-word description excerpt
+    DESCRIPTION_PREVIEW_LENGTH = 300
+
+    def for_user(self, user):
+        return self.filter(user=user)
+
+    def visible_to(self, user):
+        """Tasks the user owns plus tasks shared with them.
+
+        Read through the TaskVisibility index and annotated with the
+        user's ``access`` ('owner', 'editable' or 'view_only').
+        """
+        return self.filter(visibility__user=user).annotate(
+            access=models.F('visibility__access')
+        )
+
+    def for_list(self):
+        """Cards: category joined in, only a prefix of the description"""
+        return self.select_related('category').defer('description').annotate(
+            description_preview=Left(
+                'description', self.DESCRIPTION_PREVIEW_LENGTH
+            )
+        )
+
+    def for_detail(self):
+        """Detail page: the full row plus its category"""
+        return self.select_related('category')
+
+    def for_agenda(self, user, start, end):
+        """Agenda: visible tasks due in [start, end] as rows in day order.
+
+        Owned tasks come from a range scan on (user, due_date), which
+        beats going through the visibility index for a date window, and
+        shares are added from SharedTaskList. Plain rows rather than
+        instances, since long ranges can hold tens of thousands of tasks.
+        """
+        in_range = models.Q(due_date__range=(start, end))
+        shared = SharedTaskList.objects.filter(
+            shared_with_user=user
+        ).values('task_id')
+        return self.filter(
+            models.Q(in_range, user=user) | models.Q(in_range, pk__in=shared)
+        ).order_by(
+            'due_date', 'priority', 'id'
+        ).values(
+            'id', 'title', 'priority', 'is_completed', 'due_date', 'user_id',
+            category_name=models.F('category__name')
+        )
+
+    def with_notes(self):
+        """Prefetch notes for callers that render them"""
+        return self.prefetch_related('notes')
+
+
 class Task(models.Model):
     """Model for tasks/todos"""
     PRIORITY_CHOICES = [
@@ -37,8 +142,7 @@ class Task(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     is_completed = models.BooleanField(default=False)
-    priority = models.CharField(
-        max_length=10,
+    priority = PriorityField(
         choices=PRIORITY_CHOICES,
         default='medium'
     )
@@ -50,15 +154,94 @@ class Task(models.Model):
         null=True,
         related_name='tasks'
     )
+    # Set on occurrences materialized from a RecurringTask, see
+    # tasks.recurrence. The pair is the idempotency key of an occurrence.
+    series = models.ForeignKey(
+        'RecurringTask',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name='occurrences'
+    )
+    occurrence_date = models.DateField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Shaped after the task_list filters: every query is scoped to a
+        # user, optionally narrowed by status, priority or category, and
+        # sorted by due date within a priority.
+        indexes = [
+            models.Index(
+                fields=['user', 'is_completed', 'due_date'],
+                name='task_user_status_due_idx'
+            ),
+            models.Index(
+                fields=['user', 'priority', 'due_date'],
+                name='task_user_priority_due_idx'
+            ),
+            models.Index(
+                fields=['user', 'category', 'due_date'],
+                name='task_user_category_due_idx'
+            ),
+            models.Index(
+                fields=['user', 'due_date'],
+                name='task_user_pending_due_idx',
+                condition=models.Q(is_completed=False)
+            ),
+            # Date range scans for the agenda
+            models.Index(
+                fields=['user', 'due_date'],
+                name='task_user_due_idx'
+            ),
+            # Delta sync scans, see tasks.sync
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='task_user_updated_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['series', 'occurrence_date'],
+                name='task_series_occurrence_uniq'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The pre_save handler locks the stored row and post_save applies
+        # the counter delta from it, so both must share one transaction.
+        # Like Django's own save_base, no savepoint inside an outer block.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class TaskSearchDocument(models.Model):
+    """A row of the SQLite FTS5 search table, joined to tasks by rowid.
+
+    Unmanaged: the table is created by tasks.search and only exists on
+    SQLite, where it lets search rank with bm25() inside a plain join.
+    """
+    task = models.OneToOneField(
+        Task,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_document'
+    )
+    user_key = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'tasks_task_fts'
+
 
 class TaskNote(models.Model):
     """Model for detailed notes on tasks"""
@@ -73,6 +256,10 @@ class TaskNote(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Delta sync scans, see tasks.sync
+            models.Index(fields=['updated_at'], name='tasknote_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Note for {self.task.title}"
@@ -94,6 +281,10 @@ class RecurringTask(models.Model):
     )
     frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
     end_date = models.DateField(blank=True, null=True)
+    # Occurrences up to this date exist as Task rows
+    materialized_until = models.DateField(
+        blank=True, null=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -124,6 +315,7 @@ class SharedTaskList(models.Model):
         default='view_only'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('task', 'shared_with_user')
@@ -133,3 +325,145 @@ class SharedTaskList(models.Model):
             f"{self.task.title} shared with "
             f"{self.shared_with_user.username}"
         )
+
+
+class TaskVisibility(models.Model):
+    """Who can see a task: one row for its owner and one per share.
+
+    Denormalized from Task.user and SharedTaskList by tasks.visibility,
+    so "my tasks plus tasks shared with me" is one indexed lookup.
+    """
+    OWNER = 'owner'
+    ACCESS_CHOICES = [
+        (OWNER, 'Owner'),
+        *SharedTaskList.PERMISSION_CHOICES,
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='visible_tasks'
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name='visibility'
+    )
+    access = models.CharField(max_length=10, choices=ACCESS_CHOICES)
+
+    class Meta:
+        verbose_name_plural = 'task visibility'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'task'],
+                name='task_visibility_user_task_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.task.title} visible to "
+            f"{self.user.username} ({self.access})"
+        )
+
+
+class Tombstone(models.Model):
+    """Record of a deleted task, category or note, for delta sync.
+
+    Rows are hard-deleted, so clients syncing changes since a point in
+    time learn about deletions from these records instead. Written by
+    the delete signal handlers in tasks.signals and pruned with
+    ``manage.py prune_tombstones``.
+    """
+    KIND_CHOICES = [
+        ('task', 'Task'),
+        ('category', 'Category'),
+        ('note', 'Note'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='tombstones'
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at'],
+                name='tombstone_user_deleted_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id}"
+
+
+class ImportJob(models.Model):
+    """An uploaded CSV or JSON file of tasks and its import progress.
+
+    The upload is kept in the row until it is processed, so any worker
+    can pick it up; see tasks.importer.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='import_jobs'
+    )
+    file_name = models.CharField(max_length=255)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    data = models.BinaryField(editable=False)
+    size = models.PositiveIntegerField(default=0)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    # Progress, updated after every batch
+    processed_bytes = models.PositiveIntegerField(default=0)
+    row_count = models.PositiveIntegerField(default=0)
+    imported_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # The first few row errors as {"row": n, "errors": [...]} objects
+    errors = models.JSONField(default=list, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import of {self.file_name} ({self.status})"
+
+    @property
+    def progress(self):
+        """Share of the upload processed so far, as a whole percentage"""
+        if self.status == self.DONE:
+            return 100
+        if not self.size:
+            return 0
+        return min(100, self.processed_bytes * 100 // self.size)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
@@ -0,0 +1,187 @@
+"""Keyset (cursor) pagination for task querysets.
+
+Pages are located by the sort key of the last row seen rather than by an
+OFFSET, so fetching page N costs the same as fetching page 1. Cursors are
+opaque, URL-safe tokens that can be carried through the query string.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(direction, values):
+    """Encode a direction ('next'/'prev') and sort key into a token"""
+    payload = json.dumps(
+        [direction, [_to_json(v) for v in values]],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+class KeysetPage:
+    """A single page of results plus the cursors around it"""
+
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a queryset by a unique, ordered tuple of keys.
+
+    Nullable model fields are sorted NULLS LAST on every backend so the
+    seek predicate is the same for SQLite and PostgreSQL. The last key
+    must be unique (normally ``id``) to make the ordering total.
+    """
+
+    def __init__(self, queryset, keys, per_page=25):
+        self.queryset = queryset
+        self.keys = tuple(keys)
+        self.per_page = per_page
+        self.nullable = {key: self._is_nullable(key) for key in self.keys}
+
+    def _is_nullable(self, key):
+        try:
+            return self.queryset.model._meta.get_field(key).null
+        except FieldDoesNotExist:
+            # Annotations are expected to be non-null sort keys
+            return False
+
+    def _to_python(self, key, value):
+        if value is None:
+            return None
+        try:
+            field = self.queryset.model._meta.get_field(key)
+        except FieldDoesNotExist:
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor(value)
+
+    def _ordering(self, reverse=False):
+        ordering = []
+        for key in self.keys:
+            nulls = True if self.nullable[key] else None
+            if reverse:
+                ordering.append(F(key).desc(nulls_first=nulls))
+            else:
+                ordering.append(F(key).asc(nulls_last=nulls))
+        return ordering
+
+    def _beyond(self, key, value, forward):
+        """Q for rows strictly after (or before) value on a single key.
+
+        Returns None when no row can satisfy the condition.
+        """
+        if forward:
+            if value is None:
+                return None
+            condition = Q(**{f'{key}__gt': value})
+            if self.nullable[key]:
+                condition |= Q(**{f'{key}__isnull': True})
+            return condition
+        if value is None:
+            return Q(**{f'{key}__isnull': False})
+        return Q(**{f'{key}__lt': value})
+
+    def _equal(self, key, value):
+        if value is None:
+            return Q(**{f'{key}__isnull': True})
+        return Q(**{key: value})
+
+    def _seek(self, values, forward):
+        condition = None
+        prefix = Q()
+        for key, value in zip(self.keys, values):
+            beyond = self._beyond(key, value, forward)
+            if beyond is not None:
+                term = prefix & beyond
+                condition = term if condition is None else condition | term
+            prefix &= self._equal(key, value)
+        return condition
+
+    def _key_of(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def _query(self, cursor):
+        direction, values = 'next', None
+        if cursor:
+            direction, raw = decode_cursor(cursor)
+            if len(raw) != len(self.keys):
+                raise InvalidCursor(cursor)
+            values = [self._to_python(k, v) for k, v in zip(self.keys, raw)]
+
+        forward = direction == 'next'
+        queryset = self.queryset.order_by(*self._ordering(not forward))
+        if values is not None:
+            condition = self._seek(values, forward)
+            if condition is None:
+                queryset = queryset.none()
+            else:
+                queryset = queryset.filter(condition)
+        return queryset[:self.per_page + 1], values, forward
+
+    def _page(self, rows, values, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if has_more or not forward:
+                next_cursor = encode_cursor('next', self._key_of(rows[-1]))
+            if values is not None and (has_more or forward):
+                prev_cursor = encode_cursor('prev', self._key_of(rows[0]))
+        return KeysetPage(rows, next_cursor, prev_cursor)
+
+    def page(self, cursor=None):
+        """Return the KeysetPage identified by cursor (first page if None)"""
+        queryset, values, forward = self._query(cursor)
+        return self._page(list(queryset), values, forward)
+
+    async def apage(self, cursor=None):
+        """Async version of page()"""
+        queryset, values, forward = self._query(cursor)
+        return self._page([row async for row in queryset], values, forward)
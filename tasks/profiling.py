@@ -0,0 +1,278 @@
+"""Opt-in request profiling.
+
+``ProfilingMiddleware`` samples a share of requests (``PROFILING_SAMPLE_RATE``)
+when ``PROFILING_ENABLED`` is set. It records, per view name, the wall
+time, the number and total time of SQL queries, the time spent
+rendering templates, and the peak Python memory allocated. Sampled
+responses carry a ``Server-Timing`` header with the same breakdown.
+Streamed bodies are produced after the view returns, so they are not
+included.
+
+Samples are aggregated per process and flushed every
+``FLUSH_INTERVAL`` seconds as a snapshot into a ring buffer of
+``BUFFER_SIZE`` slots in the cache. With a shared cache (``REDIS_URL``)
+the buffer collects every process, and the staff page at
+``/profiling/`` and ``manage.py dump_profile`` read the whole of it.
+With the local-memory cache each process only sees its own snapshots.
+
+Allocations are measured with tracemalloc, which traces every thread,
+so only one request at a time has its allocations measured. The
+middleware is sync-only, so while it is enabled Django runs the async
+views in a thread.
+"""
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.shortcuts import redirect, render
+from django.template.backends.django import Template
+
+BUFFER_SIZE = 256
+FLUSH_INTERVAL = 10
+HEAD_KEY = 'profiling:head'
+SLOT_KEY = 'profiling:slot:{}'
+METRICS = ('wall_ms', 'sql_count', 'sql_ms', 'template_ms', 'alloc_kb')
+
+_template_timer = ContextVar('profiling_template_timer', default=None)
+_allocations = threading.Lock()
+_pending_lock = threading.Lock()
+_pending = {}
+_last_flush = time.monotonic()
+
+
+class _Timer:
+    def __init__(self):
+        self.elapsed = 0.0
+        self.depth = 0
+
+
+def _timed_render(render_template):
+    @wraps(render_template)
+    def wrapper(self, *args, **kwargs):
+        timer = _template_timer.get()
+        if timer is None:
+            return render_template(self, *args, **kwargs)
+        # Only the outermost render counts, so nested renders are not
+        # added twice
+        timer.depth += 1
+        start = time.perf_counter()
+        try:
+            return render_template(self, *args, **kwargs)
+        finally:
+            timer.depth -= 1
+            if not timer.depth:
+                timer.elapsed += time.perf_counter() - start
+    wrapper.profiled = True
+    return wrapper
+
+
+def _install_template_timing():
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _timed_render(Template.render)
+
+
+class _QueryTimer:
+    """A database execute wrapper counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - start
+
+
+def _empty_aggregate():
+    return {
+        'count': 0,
+        **{metric: 0.0 for metric in METRICS},
+        **{f'max_{metric}': 0.0 for metric in METRICS},
+        # Requests whose allocations were measured
+        'alloc_count': 0,
+    }
+
+
+def _add(aggregate, sample):
+    aggregate['count'] += 1
+    for metric, value in sample.items():
+        if value is None:
+            continue
+        aggregate[metric] += value
+        aggregate[f'max_{metric}'] = max(aggregate[f'max_{metric}'], value)
+    if sample.get('alloc_kb') is not None:
+        aggregate['alloc_count'] += 1
+
+
+def _merge(into, aggregate):
+    for field, value in aggregate.items():
+        if field.startswith('max_'):
+            into[field] = max(into[field], value)
+        else:
+            into[field] += value
+
+
+def record(view_name, sample):
+    """Add a sample to this process's aggregates, flushing when due"""
+    with _pending_lock:
+        _add(_pending.setdefault(view_name, _empty_aggregate()), sample)
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """Write this process's aggregates to the next ring buffer slot"""
+    global _pending, _last_flush
+    with _pending_lock:
+        snapshot, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not snapshot:
+        return
+    try:
+        head = cache.incr(HEAD_KEY)
+    except ValueError:
+        cache.add(HEAD_KEY, 0, timeout=None)
+        head = cache.incr(HEAD_KEY)
+    cache.set(
+        SLOT_KEY.format(head % BUFFER_SIZE),
+        {'flushed_at': time.time(), 'views': snapshot},
+        timeout=None
+    )
+
+
+def read_buffer():
+    """Return the snapshots in the ring buffer, oldest first"""
+    slots = cache.get_many([SLOT_KEY.format(n) for n in range(BUFFER_SIZE)])
+    return sorted(slots.values(), key=lambda snapshot: snapshot['flushed_at'])
+
+
+def clear_buffer():
+    """Empty the ring buffer"""
+    cache.delete_many(
+        [HEAD_KEY, *(SLOT_KEY.format(n) for n in range(BUFFER_SIZE))]
+    )
+
+
+def summarize(snapshots):
+    """Merge snapshots into one row per view, slowest in total first"""
+    merged = defaultdict(_empty_aggregate)
+    for snapshot in snapshots:
+        for view_name, aggregate in snapshot['views'].items():
+            _merge(merged[view_name], aggregate)
+
+    rows = []
+    for view_name, aggregate in merged.items():
+        count = aggregate['count']
+        row = {'view': view_name, 'count': count}
+        for metric in METRICS:
+            # Allocations are only measured on some requests
+            measured = count
+            if metric == 'alloc_kb':
+                measured = aggregate['alloc_count']
+            row[f'avg_{metric}'] = (
+                aggregate[metric] / measured if measured else None
+            )
+            row[f'max_{metric}'] = aggregate[f'max_{metric}']
+        row['total_wall_ms'] = aggregate['wall_ms']
+        rows.append(row)
+    return sorted(rows, key=lambda row: row['total_wall_ms'], reverse=True)
+
+
+def server_timing(sample):
+    """Format a sample as a Server-Timing header value"""
+    parts = [
+        f"total;dur={sample['wall_ms']:.1f}",
+        f"sql;desc=\"{sample['sql_count']} queries\";"
+        f"dur={sample['sql_ms']:.1f}",
+        f"template;dur={sample['template_ms']:.1f}",
+    ]
+    if sample['alloc_kb'] is not None:
+        parts.append(f"alloc;desc=\"{sample['alloc_kb']:.0f} KB\"")
+    return ', '.join(parts)
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests; see the module docstring"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1)
+        _install_template_timing()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        queries = _QueryTimer()
+        timer = _Timer()
+        token = _template_timer.set(timer)
+        tracing = _allocations.acquire(blocking=False)
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                response = self.get_response(request)
+        finally:
+            wall = time.perf_counter() - start
+            _template_timer.reset(token)
+            alloc_kb = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                alloc_kb = max(peak - baseline, 0) / 1024
+                if started_tracing:
+                    tracemalloc.stop()
+                _allocations.release()
+
+        sample = {
+            'wall_ms': wall * 1000,
+            'sql_count': queries.count,
+            'sql_ms': queries.elapsed * 1000,
+            'template_ms': timer.elapsed * 1000,
+            'alloc_kb': alloc_kb,
+        }
+        match = request.resolver_match
+        record(match.view_name if match else '<unresolved>', sample)
+        response['Server-Timing'] = server_timing(sample)
+        return response
+
+
+@staff_member_required
+def profiling_report(request):
+    """Show the profiled views, slowest in total first"""
+    if request.method == 'POST' and 'clear' in request.POST:
+        clear_buffer()
+        return redirect('profiling')
+    flush()
+    snapshots = read_buffer()
+    context = {
+        'rows': summarize(snapshots),
+        'snapshots': len(snapshots),
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1),
+    }
+    return render(request, 'tasks/profiling.html', context)
@@ -0,0 +1,188 @@
+"""Materialization of recurring tasks.
+
+A RecurringTask makes its task the first occurrence of a series. The
+task's due date (or creation date) anchors the series, and later
+occurrences fall every day, week, month or year after it until the
+rule's end_date. Monthly and yearly series keep the anchor's day of the
+month, clamped to the end of shorter months.
+
+Series aren't expanded on page views. Instead, upcoming occurrences are
+written ahead of time as ordinary Task rows, so the list views only
+read them. Each rule records how far it has been materialized, so a run
+only creates the occurrences between that date and the horizon.
+Occurrences are keyed by (series, occurrence_date), which makes reruns
+and concurrent workers safe. Run it with
+``manage.py materialize_recurring_tasks``.
+"""
+import calendar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import invalidate_users
+from .counters import track_task_changes
+from .models import Task, RecurringTask
+from .search import get_search_backend
+from .visibility import grant_owners
+from . import suggest
+
+HORIZON_DAYS = 60
+STEP_DAYS = {'daily': 1, 'weekly': 7}
+STEP_MONTHS = {'monthly': 1, 'yearly': 12}
+
+
+def default_horizon():
+    return timezone.localdate() + timedelta(days=HORIZON_DAYS)
+
+
+def add_months(day, months):
+    """Shift a date by whole months, clamping to the end of short months"""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    return day.replace(year=year, month=month, day=min(day.day, last_day))
+
+
+def nth_occurrence(anchor, frequency, n):
+    """Return the date of the nth occurrence (the anchor is the 0th)"""
+    if frequency in STEP_DAYS:
+        return anchor + timedelta(days=n * STEP_DAYS[frequency])
+    return add_months(anchor, n * STEP_MONTHS[frequency])
+
+
+def occurrence_dates(anchor, frequency, after, until):
+    """Return the series dates falling in the window (after, until]"""
+    after = max(after, anchor)
+    # Jump straight to the first occurrence after the window start
+    if frequency in STEP_DAYS:
+        n = (after - anchor).days // STEP_DAYS[frequency] + 1
+    else:
+        months = (after.year - anchor.year) * 12 + after.month - anchor.month
+        n = max(months // STEP_MONTHS[frequency], 1)
+        while nth_occurrence(anchor, frequency, n) <= after:
+            n += 1
+
+    dates = []
+    day = nth_occurrence(anchor, frequency, n)
+    while day <= until:
+        dates.append(day)
+        n += 1
+        day = nth_occurrence(anchor, frequency, n)
+    return dates
+
+
+def series_anchor(rule):
+    task = rule.task
+    return task.due_date or timezone.localdate(task.created_at)
+
+
+def _occurrence(rule, day):
+    template = rule.task
+    return Task(
+        user_id=template.user_id,
+        title=template.title,
+        description=template.description,
+        priority=template.priority,
+        category_id=template.category_id,
+        due_date=day,
+        series=rule,
+        occurrence_date=day,
+    )
+
+
+def materialize_rules(rules, until, today=None):
+    """Create the occurrences of rules up to until; return how many.
+
+    Occurrences before today that were never materialized are skipped
+    rather than backfilled as overdue tasks. Counters, search documents
+    and visibility are updated for the rows actually inserted, since
+    bulk_create skips model signals.
+    """
+    yesterday = (today or timezone.localdate()) - timedelta(days=1)
+    occurrences = []
+    for rule in rules:
+        anchor = series_anchor(rule)
+        after = max(rule.materialized_until or anchor, yesterday)
+        last = min(until, rule.end_date) if rule.end_date else until
+        dates = occurrence_dates(anchor, rule.frequency, after, last)
+        occurrences += [_occurrence(rule, day) for day in dates]
+        rule.materialized_until = until
+
+    with transaction.atomic():
+        RecurringTask.objects.bulk_update(rules, ['materialized_until'])
+        if not occurrences:
+            return 0
+        series = Task.objects.filter(
+            series__in={task.series_id for task in occurrences},
+            occurrence_date__gte=min(task.due_date for task in occurrences),
+        )
+        existing = set(series.values_list('pk', flat=True))
+        Task.objects.bulk_create(occurrences, ignore_conflicts=True)
+        # ignore_conflicts leaves primary keys unset and skips occurrences
+        # that already exist, so look up the rows that were inserted
+        new_tasks = [
+            row for row in series.values_list(
+                'pk', 'user_id', 'is_completed', 'priority', 'category_id'
+            )
+            if row[0] not in existing
+        ]
+        if not new_tasks:
+            return 0
+
+        track_task_changes(
+            (user_id, None, tuple(state))
+            for _pk, user_id, *state in new_tasks
+        )
+        grant_owners((pk, user_id) for pk, user_id, *_state in new_tasks)
+        get_search_backend().update_tasks(pk for pk, *_rest in new_tasks)
+        user_ids = {user_id for _pk, user_id, *_state in new_tasks}
+        invalidate_users(user_ids)
+    for user_id in user_ids:
+        suggest.invalidate(user_id)
+    return len(new_tasks)
+
+
+def materialize_occurrences(until=None, batch_size=500):
+    """Materialize every rule that is behind until; return the count.
+
+    Rules are claimed in primary key batches. On databases that support
+    it, rows locked by another worker are skipped rather than waited on.
+    """
+    until = until or default_horizon()
+    pending = RecurringTask.objects.filter(
+        Q(materialized_until__isnull=True)
+        | Q(materialized_until__lt=until)
+        & (Q(end_date__isnull=True) | Q(end_date__gt=F('materialized_until')))
+    ).select_related('task').order_by('pk')
+
+    created = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rules = list(
+                pending.filter(pk__gt=last_pk).select_for_update(
+                    skip_locked=True, of=('self',)
+                )[:batch_size]
+            )
+            if not rules:
+                break
+            created += materialize_rules(rules, until)
+        last_pk = rules[-1].pk
+    return created
+
+
+def reschedule(rule, today=None):
+    """Replace a rule's future pending occurrences after it changes"""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        # Deleted one by one so signals keep counters and search in sync
+        for task in rule.occurrences.filter(
+            is_completed=False, occurrence_date__gt=today
+        ):
+            task.delete()
+        if rule.materialized_until and rule.materialized_until > today:
+            rule.materialized_until = today
+        return materialize_rules([rule], default_horizon(), today)
@@ -0,0 +1,322 @@
+"""Full-text search over task titles, descriptions and notes.
+
+Each database gets its own backend behind the same interface:
+
+* PostgreSQL keeps a weighted ``tsvector`` per task in a side table with
+  a GIN index and ranks matches with ``ts_rank``.
+* SQLite keeps an FTS5 virtual table and ranks matches with ``bm25``.
+* Anything else falls back to ``icontains`` lookups.
+
+Documents are refreshed from the Task and TaskNote signal handlers in
+``tasks.signals`` and can be rebuilt with ``manage.py rebuild_search_index``.
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import (
+    BooleanField, Exists, F, FloatField, Func, OuterRef, Q, Value
+)
+from django.db.models.expressions import RawSQL
+
+from .models import TaskNote
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split a raw search string into plain word tokens"""
+    return WORD_RE.findall(query or '')
+
+
+class SearchBackend:
+    """Base interface shared by all search backends.
+
+    ``filter()`` narrows a Task queryset to matches and annotates it with
+    ``search_rank`` where lower values are better matches, so it can be
+    used directly as an ascending sort (and keyset pagination) key.
+    """
+    vendor = None
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    def install(self):
+        """Create the index structures"""
+
+    def uninstall(self):
+        """Drop the index structures"""
+
+    def update_task(self, task_id):
+        """Refresh the indexed document for a task"""
+
+    def update_tasks(self, task_ids):
+        """Refresh the indexed documents for many tasks"""
+        for task_id in task_ids:
+            self.update_task(task_id)
+
+    def remove_task(self, task_id):
+        """Remove a task from the index"""
+
+    def remove_tasks(self, task_ids):
+        """Remove many tasks from the index"""
+        for task_id in task_ids:
+            self.remove_task(task_id)
+
+    def rebuild(self):
+        """Re-index every task in bulk"""
+
+    def filter(self, queryset, user, query):
+        raise NotImplementedError
+
+    def _execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class BasicSearchBackend(SearchBackend):
+    """Unindexed fallback using case-insensitive substring matches"""
+
+    def filter(self, queryset, user, query):
+        for term in search_terms(query):
+            notes = TaskNote.objects.filter(
+                task=OuterRef('pk'), content__icontains=term
+            )
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Exists(notes)
+            )
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class FTS5Function(Func):
+    """An FTS5 expression rendered against the joined search table.
+
+    FTS5 auxiliary functions and MATCH take the table itself as their
+    operand, so the join alias is taken from a column of the joined
+    TaskSearchDocument.
+    """
+    function_template = None
+
+    def __init__(self, *params, **extra):
+        self.params = list(params)
+        super().__init__(F('search_document__user_key'), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column = self.get_source_expressions()[0]
+        table = compiler.quote_name_unless_alias(column.alias)
+        return self.function_template.format(table=table), self.params
+
+
+class FTS5Match(FTS5Function):
+    function_template = '{table} MATCH %s'
+    output_field = BooleanField()
+
+    def resolve_expression(self, query=None, *args, **kwargs):
+        resolved = super().resolve_expression(query, *args, **kwargs)
+        # SQLite can only use MATCH on the inner side of a join
+        query.demote_joins({resolved.get_source_expressions()[0].alias})
+        return resolved
+
+
+class BM25(FTS5Function):
+    output_field = FloatField()
+
+    def __init__(self, weights, **extra):
+        self.function_template = 'bm25({table}, %s)' % ', '.join(
+            str(float(weight)) for weight in weights
+        )
+        super().__init__(**extra)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 virtual table keyed by task id"""
+    vendor = 'sqlite'
+    table = 'tasks_task_fts'
+    # Column weights for bm25: user_key, title, description, notes
+    weights = (0.0, 10.0, 4.0, 1.0)
+
+    def install(self):
+        self._execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+            'user_key, title, description, notes, '
+            "tokenize='porter unicode61')"
+        )
+
+    def uninstall(self):
+        self._execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def _insert_sql(self, where=''):
+        return (
+            f'INSERT INTO {self.table} '
+            '(rowid, user_key, title, description, notes) '
+            "SELECT t.id, 'u' || t.user_id, t.title, "
+            "COALESCE(t.description, ''), "
+            "COALESCE((SELECT group_concat(n.content, ' ') "
+            'FROM tasks_tasknote n WHERE n.task_id = t.id), \'\') '
+            f'FROM tasks_task t {where}'
+        )
+
+    def update_task(self, task_id):
+        self.remove_task(task_id)
+        self._execute(self._insert_sql('WHERE t.id = %s'), [task_id])
+
+    def _chunks(self, task_ids):
+        task_ids = list(task_ids)
+        # Stay well under SQLite's bound parameter limit
+        for start in range(0, len(task_ids), 1000):
+            chunk = task_ids[start:start + 1000]
+            yield ', '.join(['%s'] * len(chunk)), chunk
+
+    def update_tasks(self, task_ids):
+        for placeholders, chunk in self._chunks(task_ids):
+            self._execute(
+                f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})',
+                chunk
+            )
+            self._execute(
+                self._insert_sql(f'WHERE t.id IN ({placeholders})'), chunk
+            )
+
+    def remove_task(self, task_id):
+        self._execute(f'DELETE FROM {self.table} WHERE rowid = %s', [task_id])
+
+    def remove_tasks(self, task_ids):
+        for placeholders, chunk in self._chunks(task_ids):
+            self._execute(
+                f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})',
+                chunk
+            )
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {self.table}')
+        self._execute(self._insert_sql())
+
+    def match_expression(self, user, query):
+        terms = search_terms(query)
+        if not terms:
+            return None
+        # Scoping by the per-user token lets FTS5 intersect posting
+        # lists instead of matching every user's tasks
+        phrases = ' AND '.join(f'"{term}"*' for term in terms)
+        return f'{{user_key}} : u{user.pk} AND ({phrases})'
+
+    def filter(self, queryset, user, query):
+        match = self.match_expression(user, query)
+        if match is None:
+            return queryset.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        # A join (rather than a correlated subquery per row) lets FTS5
+        # drive the query and compute bm25 once per match
+        return queryset.filter(FTS5Match(match)).annotate(
+            search_rank=BM25(self.weights)
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Weighted tsvector side table with a GIN index"""
+    vendor = 'postgresql'
+    table = 'tasks_task_search'
+    config = 'english'
+
+    def install(self):
+        self._execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'task_id bigint PRIMARY KEY REFERENCES tasks_task (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'user_id integer NOT NULL, '
+            'document tsvector NOT NULL)'
+        )
+        self._execute(
+            f'CREATE INDEX IF NOT EXISTS {self.table}_document_idx '
+            f'ON {self.table} USING GIN (document)'
+        )
+        self._execute(
+            f'CREATE INDEX IF NOT EXISTS {self.table}_user_idx '
+            f'ON {self.table} (user_id)'
+        )
+
+    def uninstall(self):
+        self._execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def _upsert_sql(self, where=''):
+        vector = "setweight(to_tsvector(%s::regconfig, {}), '{}')"
+        document = ' || '.join([
+            vector.format('t.title', 'A'),
+            vector.format("COALESCE(t.description, '')", 'B'),
+            vector.format(
+                "COALESCE((SELECT string_agg(n.content, ' ') "
+                "FROM tasks_tasknote n WHERE n.task_id = t.id), '')",
+                'C'
+            ),
+        ])
+        return (
+            f'INSERT INTO {self.table} (task_id, user_id, document) '
+            f'SELECT t.id, t.user_id, {document} FROM tasks_task t {where} '
+            'ON CONFLICT (task_id) DO UPDATE SET '
+            'user_id = EXCLUDED.user_id, document = EXCLUDED.document'
+        )
+
+    def update_task(self, task_id):
+        self._execute(
+            self._upsert_sql('WHERE t.id = %s'),
+            [self.config] * 3 + [task_id]
+        )
+
+    def update_tasks(self, task_ids):
+        self._execute(
+            self._upsert_sql('WHERE t.id = ANY(%s)'),
+            [self.config] * 3 + [list(task_ids)]
+        )
+
+    def remove_task(self, task_id):
+        self._execute(
+            f'DELETE FROM {self.table} WHERE task_id = %s', [task_id]
+        )
+
+    def remove_tasks(self, task_ids):
+        self._execute(
+            f'DELETE FROM {self.table} WHERE task_id = ANY(%s)',
+            [list(task_ids)]
+        )
+
+    def rebuild(self):
+        self._execute(f'TRUNCATE {self.table}')
+        self._execute(self._upsert_sql(), [self.config] * 3)
+
+    def filter(self, queryset, user, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        ids = RawSQL(
+            f'SELECT task_id FROM {self.table} WHERE user_id = %s '
+            'AND document @@ to_tsquery(%s::regconfig, %s)',
+            [user.pk, self.config, tsquery]
+        )
+        # Negated so that better matches sort first in ascending order
+        rank = RawSQL(
+            f'SELECT -ts_rank(document, to_tsquery(%s::regconfig, %s)) '
+            f'FROM {self.table} WHERE task_id = "tasks_task"."id"',
+            [self.config, tsquery],
+            output_field=FloatField()
+        )
+        return queryset.filter(id__in=ids).annotate(search_rank=rank)
+
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (SQLiteSearchBackend, PostgresSearchBackend)
+}
+
+
+def get_search_backend(connection=None):
+    """Return the search backend for a database connection"""
+    connection = connection or default_connection
+    backend_class = BACKENDS.get(connection.vendor, BasicSearchBackend)
+    return backend_class(connection)
@@ -0,0 +1,291 @@
+"""Signal handlers that keep denormalized task data in sync"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth.models import User
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete
+)
+from django.dispatch import receiver
+
+from planit.metrics import TASK_WRITES
+
+from .cache import (
+    invalidate_users, invalidate_tasks, invalidate_category, reset_user
+)
+from .counters import task_state, track_task_change, track_task_changes
+from .models import (
+    Task, TaskNote, Category, RecurringTask, SharedTaskList, TaskVisibility
+)
+from .recurrence import default_horizon, materialize_rules, reschedule
+from .search import get_search_backend
+from .sync import record_deletions
+from .visibility import OWNER, grant, revoke
+from . import suggest
+
+SEARCH_FIELDS = ('title', 'description')
+
+_bulk_delete = ContextVar('tasks_bulk_delete', default=False)
+
+
+@contextmanager
+def bulk_delete():
+    """Skip the per-row delete handlers inside the block.
+
+    For bulk deletes that bring counters and the search index up to date
+    for the whole set afterwards, see tasks.bulk.
+    """
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_state(sender, instance, raw=False, **kwargs):
+    """Record the stored state of a task before it is overwritten"""
+    instance._counter_state = None
+    instance._search_state = None
+    instance._owner_id = None
+    if raw or instance.pk is None:
+        return
+    # Locked until Task.save() commits, so a concurrent save of the same
+    # task waits and then sees this one's state instead of applying the
+    # same transition to the counters twice
+    stored = Task.objects.select_for_update().filter(
+        pk=instance.pk
+    ).values_list(
+        'is_completed', 'priority', 'category_id', 'user_id', *SEARCH_FIELDS
+    ).first()
+    if stored is not None:
+        instance._counter_state = stored[:3]
+        instance._owner_id = stored[3]
+        instance._search_state = stored[4:]
+
+
+@receiver(post_save, sender=Task)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Adjust counters for a created or updated task"""
+    if raw:
+        return
+    before = None if created else getattr(instance, '_counter_state', None)
+    after = task_state(instance)
+    previous_owner = getattr(instance, '_owner_id', None)
+    if previous_owner is not None and previous_owner != instance.user_id:
+        # A reassigned task leaves one owner's counters for the other's
+        track_task_changes([
+            (previous_owner, before, None), (instance.user_id, None, after)
+        ])
+    elif before != after:
+        track_task_change(instance.user_id, before, after)
+
+
+@receiver(post_delete, sender=Task)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Remove a deleted task from the counters"""
+    if _bulk_delete.get():
+        return
+    track_task_change(instance.user_id, task_state(instance), None)
+
+
+@receiver(post_save, sender=Task)
+def count_task_save(sender, instance, created, raw=False, **kwargs):
+    """Count a task write for the metrics endpoint"""
+    if not raw:
+        TASK_WRITES.inc(action='created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Task)
+def count_task_delete(sender, instance, **kwargs):
+    """Count a task delete; bulk deletes count their own"""
+    if not _bulk_delete.get():
+        TASK_WRITES.inc(action='deleted')
+
+
+@receiver(post_save, sender=Task)
+def grant_owner_visibility(sender, instance, created, raw=False, **kwargs):
+    """Make a new or reassigned task visible to its owner"""
+    if raw:
+        return
+    if created:
+        TaskVisibility.objects.create(
+            task_id=instance.pk, user_id=instance.user_id, access=OWNER
+        )
+        return
+    previous_owner = getattr(instance, '_owner_id', None)
+    if previous_owner is not None and previous_owner != instance.user_id:
+        revoke(instance.pk, previous_owner)
+        grant(instance.pk, instance.user_id, OWNER)
+
+
+@receiver(post_save, sender=Task)
+def index_task_on_save(sender, instance, created, raw=False, **kwargs):
+    """Refresh the search document when searchable text changes"""
+    if raw:
+        return
+    current = tuple(getattr(instance, field) for field in SEARCH_FIELDS)
+    before = getattr(instance, '_search_state', None)
+    if created or before != current:
+        get_search_backend().update_task(instance.pk)
+    if created or before is None or before[0] != instance.title:
+        suggest.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Task)
+def unindex_task_on_delete(sender, instance, **kwargs):
+    """Drop a deleted task from the search index"""
+    if _bulk_delete.get():
+        return
+    get_search_backend().remove_task(instance.pk)
+    suggest.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Task)
+def invalidate_lists_on_task_save(sender, instance, created, raw=False,
+                                  **kwargs):
+    """Drop the cached lists of everyone who sees a saved task"""
+    if raw:
+        return
+    if created:
+        invalidate_users([instance.user_id])
+        return
+    invalidate_tasks([instance.pk])
+    # A reassigned task has already left its previous owner's visibility
+    previous_owner = getattr(instance, '_owner_id', None)
+    if previous_owner is not None:
+        invalidate_users([previous_owner])
+
+
+@receiver(pre_delete, sender=Task)
+def invalidate_lists_on_task_delete(sender, instance, **kwargs):
+    """Drop the cached lists of everyone who sees a task being deleted"""
+    if _bulk_delete.get():
+        return
+    # Visibility rows go with the task, so read them before the delete
+    invalidate_tasks([instance.pk])
+
+
+@receiver(post_save, sender=TaskNote)
+@receiver(post_delete, sender=TaskNote)
+def index_task_on_note_change(sender, instance, raw=False, **kwargs):
+    """Re-index the parent task when one of its notes changes"""
+    if raw or _bulk_delete.get():
+        return
+    get_search_backend().update_task(instance.task_id)
+
+
+@receiver(post_save, sender=TaskNote)
+@receiver(post_delete, sender=TaskNote)
+def invalidate_lists_on_note_change(sender, instance, raw=False, **kwargs):
+    """Drop cached lists whose search results may include the note"""
+    if raw or _bulk_delete.get():
+        return
+    invalidate_tasks([instance.task_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def forget_suggestions_on_category_change(sender, instance, **kwargs):
+    """Drop cached suggestions when a category is added, renamed or removed"""
+    suggest.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_lists_on_category_change(sender, instance, raw=False,
+                                        **kwargs):
+    """Drop the cached lists that show a category or its counts"""
+    if not raw:
+        invalidate_category(instance)
+
+
+@receiver(pre_save, sender=RecurringTask)
+def remember_schedule(sender, instance, raw=False, **kwargs):
+    """Record the stored schedule of a rule before it is overwritten"""
+    instance._schedule_state = None
+    if raw or instance.pk is None:
+        return
+    instance._schedule_state = RecurringTask.objects.filter(
+        pk=instance.pk
+    ).values_list('frequency', 'end_date').first()
+
+
+@receiver(post_save, sender=RecurringTask)
+def materialize_on_schedule_change(sender, instance, created, raw=False,
+                                   **kwargs):
+    """Materialize a new rule at once and redo a rescheduled one"""
+    if raw:
+        return
+    if created:
+        materialize_rules([instance], default_horizon())
+    elif instance._schedule_state != (instance.frequency, instance.end_date):
+        reschedule(instance)
+
+
+@receiver(post_save, sender=SharedTaskList)
+def grant_shared_visibility(sender, instance, raw=False, **kwargs):
+    """Make a shared task visible to the user it is shared with"""
+    if raw or instance.shared_with_user_id == instance.task.user_id:
+        return
+    grant(
+        instance.task_id,
+        instance.shared_with_user_id,
+        instance.permission_level
+    )
+
+
+@receiver(post_save, sender=SharedTaskList)
+@receiver(post_delete, sender=SharedTaskList)
+def invalidate_lists_on_share_change(sender, instance, raw=False, **kwargs):
+    """Drop the cached lists of the user a task is (un)shared with"""
+    if not raw:
+        invalidate_users([instance.shared_with_user_id])
+
+
+@receiver(post_save, sender=User)
+def reset_list_cache_for_new_user(sender, instance, created, raw=False,
+                                  **kwargs):
+    """Give a new user a fresh generation, in case their id is reused"""
+    if created and not raw:
+        reset_user(instance.pk)
+
+
+@receiver(post_delete, sender=SharedTaskList)
+def revoke_shared_visibility(sender, instance, **kwargs):
+    """Hide an unshared task from the user it was shared with"""
+    if _bulk_delete.get():
+        return
+    owner_id = Task.objects.filter(pk=instance.task_id).values_list(
+        'user_id', flat=True
+    ).first()
+    if owner_id != instance.shared_with_user_id:
+        revoke(instance.task_id, instance.shared_with_user_id)
+
+
+def _deleted_with(origin, model):
+    """Whether a delete was started by deleting model rows"""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Category)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """Record a deleted task or category for delta sync"""
+    if _bulk_delete.get() or _deleted_with(origin, User):
+        return
+    kind = 'task' if sender is Task else 'category'
+    record_deletions(kind, [(instance.user_id, instance.pk)])
+
+
+@receiver(post_delete, sender=TaskNote)
+def record_note_tombstone(sender, instance, origin=None, **kwargs):
+    """Record a deleted note, unless its task's tombstone covers it"""
+    if (_bulk_delete.get() or _deleted_with(origin, User)
+            or _deleted_with(origin, Task)):
+        return
+    owner_id = Task.objects.filter(pk=instance.task_id).values_list(
+        'user_id', flat=True
+    ).first()
+    if owner_id is not None:
+        record_deletions('note', [(owner_id, instance.pk)])
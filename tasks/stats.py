@@ -0,0 +1,58 @@
+"""Per-user task statistics.
+
+Total, pending, completed and per-priority counts are read from the
+denormalized counters on the user's profile (see ``tasks.counters``).
+The date-dependent counters can't be stored, so they are computed as
+correlated subqueries over the user's pending tasks in the same SELECT.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from .counters import PROFILE_COUNTER_FIELDS, ensure_counters
+from .models import Task, Category
+
+
+def _count(queryset):
+    counted = (
+        queryset.order_by()
+        .values('user_id')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counted), Value(0))
+
+
+def _stats_query(user, today):
+    today = today or timezone.localdate()
+    pending = Task.objects.filter(user=OuterRef('user'), is_completed=False)
+    fields = (*PROFILE_COUNTER_FIELDS, 'overdue_tasks', 'due_today_tasks')
+    return UserProfile.objects.filter(user=user).annotate(
+        overdue_tasks=_count(pending.filter(due_date__lt=today)),
+        due_today_tasks=_count(pending.filter(due_date=today)),
+    ).values(*fields)
+
+
+def task_stats(user, today=None):
+    """Return all sidebar counters for user in a single query"""
+    stats = _stats_query(user, today).first()
+    if stats is None:
+        ensure_counters(user)
+        stats = _stats_query(user, today).first()
+    return stats
+
+
+async def atask_stats(user, today=None):
+    """Async version of task_stats()"""
+    stats = await _stats_query(user, today).afirst()
+    if stats is None:
+        await sync_to_async(ensure_counters)(user)
+        stats = await _stats_query(user, today).afirst()
+    return stats
+
+
+def categories_with_counts(user):
+    """Return the user's categories with their stored task counts"""
+    return Category.objects.filter(user=user)
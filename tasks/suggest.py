@@ -0,0 +1,159 @@
+"""In-process prefix index for search-as-you-type suggestions.
+
+Each user's task titles and category names are loaded once into a
+sorted word list and answered with binary search, so a keystroke never
+touches the database while the index is warm. Indexes and recent prefix
+results are held in bounded LRU caches. Writes in this process drop the
+user's entries immediately (see ``tasks.signals``); other worker
+processes pick changes up when ``INDEX_TTL`` expires.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .models import Task, Category
+
+INDEX_TTL = 30
+MAX_INDEXES = 256
+MAX_PREFIXES = 2048
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping with a fixed capacity"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PrefixIndex:
+    """Sorted (word, rank, kind, id, label) entries for one user.
+
+    Every word of a label is indexed, so "rep" finds "Quarterly report".
+    Rank 0 marks a match on the label's first word, which sorts ahead of
+    matches further into the label. Lookups scan a bounded window after
+    the binary search, so latency doesn't grow with the index size.
+    """
+    CANDIDATES_PER_RESULT = 4
+    MAX_SCAN = 5000
+
+    def __init__(self, items):
+        entries = []
+        for kind, object_id, label in items:
+            for position, word in enumerate(label.lower().split()):
+                entries.append(
+                    (word, min(position, 1), kind, object_id, label)
+                )
+        entries.sort()
+        self.entries = entries
+        self.words = [entry[0] for entry in entries]
+        self.built_at = time.monotonic()
+
+    def search(self, prefix, limit):
+        terms = prefix.lower().split()
+        if not terms:
+            return []
+        *leading, last = terms
+        wanted = limit * self.CANDIDATES_PER_RESULT
+        matches = {}
+        position = bisect_left(self.words, last)
+        end = min(len(self.entries), position + self.MAX_SCAN)
+        while position < end and len(matches) < wanted:
+            word, rank, kind, object_id, label = self.entries[position]
+            position += 1
+            if not word.startswith(last):
+                break
+            if leading and not all(t in label.lower() for t in leading):
+                continue
+            key = (kind, object_id)
+            if key not in matches:
+                matches[key] = (rank, len(matches), label)
+            elif rank < matches[key][0]:
+                matches[key] = (rank, matches[key][1], label)
+        # First-word matches first, then in word order
+        ranked = sorted(matches.items(), key=lambda item: item[1][:2])
+        return [
+            {'type': kind, 'id': object_id, 'label': label}
+            for (kind, object_id), (_rank, _order, label) in ranked[:limit]
+        ]
+
+
+_indexes = LRUCache(MAX_INDEXES)
+_prefixes = LRUCache(MAX_PREFIXES)
+
+
+def build_index(user_id):
+    """Load a user's titles and category names into a PrefixIndex"""
+    tasks = Task.objects.filter(user_id=user_id).values_list('id', 'title')
+    categories = Category.objects.filter(user_id=user_id).values_list(
+        'id', 'name'
+    )
+    items = [('task', pk, title) for pk, title in tasks]
+    items += [('category', pk, name) for pk, name in categories]
+    return PrefixIndex(items)
+
+
+def get_index(user_id):
+    index = _indexes.get(user_id)
+    if index is None or time.monotonic() - index.built_at > INDEX_TTL:
+        index = build_index(user_id)
+        _indexes.set(user_id, index)
+        _prefixes.discard_where(lambda key: key[0] == user_id)
+    return index
+
+
+def suggest(user_id, prefix, limit=8):
+    """Return up to limit suggestions for prefix"""
+    prefix = ' '.join(prefix.lower().split())
+    index = get_index(user_id)
+    key = (user_id, prefix, limit)
+    results = _prefixes.get(key)
+    if results is None:
+        results = index.search(prefix, limit)
+        _prefixes.set(key, results)
+    return results
+
+
+def invalidate(user_id):
+    """Forget a user's index and cached prefixes"""
+    _indexes.discard_where(lambda key: key == user_id)
+    _prefixes.discard_where(lambda key: key[0] == user_id)
+
+
+def clear_caches():
+    """Empty every cached index and prefix"""
+    _indexes.clear()
+    _prefixes.clear()
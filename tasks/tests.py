@@ -1,8 +1,52 @@
-from django.test import TestCase, Client
+import base64
+import csv
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+import json
+from unittest import mock
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.test import TestCase, Client, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from django.utils import timezone
 from datetime import date, timedelta
-from .models import Task, Category, TaskNote, RecurringTask, SharedTaskList
+from .models import (
+    Task, Category, TaskNote, RecurringTask, SharedTaskList, TaskVisibility,
+    Tombstone, ImportJob
+)
+from .pagination import KeysetPaginator, InvalidCursor, decode_cursor
+from .stats import task_stats, categories_with_counts
+from .counters import reconcile_counters
+from .search import get_search_backend
+from .datagen import generate_dataset
+from .recurrence import materialize_occurrences, occurrence_dates
+from .expansion import expand, expand_rules
+from .visibility import rebuild_visibility
+from .bulk import apply_bulk_action, InvalidBulkAction
+from .sync import (
+    changes_since, _since, SyncExpired, encode_token, decode_token,
+    TOMBSTONE_DAYS
+)
+from .export import export_lines
+from .importer import (
+    run_import, import_batch, clean_record, claim_import_job,
+    process_pending_imports
+)
+from .cache import cache_stats, reset_cache_stats, generation
+from .fragments import CSRF_SLOT, card_key, render_task_cards
+from .profiling import clear_buffer, flush, read_buffer, summarize
+from . import suggest
+from accounts.models import UserProfile
+from planit.metrics import MetricsFile, _key
 
 
 class TaskModelTest(TestCase):
@@ -58,6 +102,26 @@ class TaskModelTest(TestCase):
         )
         self.assertEqual(str(task), 'Test Task')
 
+    def test_priority_stored_as_sortable_rank(self):
+        """Test priority is stored as a small integer rank"""
+        for priority in ['low', 'high', 'medium']:
+            Task.objects.create(
+                user=self.user,
+                title=f'{priority} task',
+                priority=priority
+            )
+
+        ranks = Task.objects.order_by('priority').values_list(
+            'priority', flat=True
+        )
+        self.assertEqual(list(ranks), ['high', 'medium', 'low'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT priority FROM tasks_task ORDER BY priority'
+            )
+            self.assertEqual([row[0] for row in cursor.fetchall()],
+                             [1, 2, 3])
+
     def test_task_priority_choices(self):
         """Test all priority levels"""
         priorities = ['low', 'medium', 'high']
@@ -213,6 +277,14 @@ class TaskViewTest(TestCase):
         self.assertEqual(len(tasks), 1)
         self.assertEqual(tasks[0].priority, 'high')
 
+    def test_task_list_invalid_priority_filter(self):
+        """Test an unknown priority filter matches no tasks"""
+        Task.objects.create(user=self.user, title='Task', priority='high')
+
+        response = self.client.get(reverse('task-list') + '?priority=urgent')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['tasks']), 0)
+
     def test_task_list_search(self):
         """Test searching tasks by title"""
         Task.objects.create(user=self.user, title='Buy groceries')
@@ -328,6 +400,758 @@ class TaskViewTest(TestCase):
         self.assertFalse(task.is_completed)
 
 
+class TaskPaginationTest(TestCase):
+    """Test cases for keyset pagination of the task list"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        today = date.today()
+        # Mix of priorities, duplicate and missing due dates
+        for i in range(12):
+            Task.objects.create(
+                user=self.user,
+                title=f'Task {i}',
+                priority=['high', 'medium', 'low'][i % 3],
+                due_date=None if i % 4 == 0 else today + timedelta(days=i % 3)
+            )
+
+    def _walk(self, url, params=None, per_page=5):
+        params = dict(params or {})
+        titles = []
+        with mock.patch('tasks.views.TASKS_PER_PAGE', per_page):
+            while True:
+                page = self.client.get(url, params).context['page']
+                titles.extend(task.title for task in page)
+                if not page.has_next:
+                    return titles
+                params['cursor'] = page.next_cursor
+
+    def test_pages_cover_all_tasks_once(self):
+        """Test walking next cursors visits every task exactly once"""
+        titles = self._walk(reverse('task-list'))
+        self.assertEqual(len(titles), 12)
+        self.assertEqual(len(set(titles)), 12)
+
+    def test_page_order_matches_priority_then_due_date(self):
+        """Test pages follow priority, then due date with blanks last"""
+        titles = self._walk(reverse('task-list'), per_page=4)
+        tasks = [Task.objects.get(title=title) for title in titles]
+        rank = {'high': 1, 'medium': 2, 'low': 3}
+        keys = [
+            (rank[t.priority], t.due_date is None, t.due_date or date.min,
+             t.pk)
+            for t in tasks
+        ]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_previous_cursor_returns_prior_page(self):
+        """Test following prev from page two returns page one"""
+        with mock.patch('tasks.views.TASKS_PER_PAGE', 5):
+            first = self.client.get(reverse('task-list')).context['page']
+            second = self.client.get(
+                reverse('task-list'), {'cursor': first.next_cursor}
+            ).context['page']
+            back = self.client.get(
+                reverse('task-list'), {'cursor': second.prev_cursor}
+            ).context['page']
+        self.assertFalse(first.has_previous)
+        self.assertTrue(second.has_previous)
+        self.assertEqual(
+            [t.pk for t in back], [t.pk for t in first]
+        )
+
+    def test_cursor_preserves_filters(self):
+        """Test pagination links keep the active filters"""
+        url = reverse('task-list')
+        with mock.patch('tasks.views.TASKS_PER_PAGE', 2):
+            response = self.client.get(url, {'priority': 'high'})
+        self.assertContains(response, 'priority=high&amp;cursor=')
+        titles = self._walk(url, {'priority': 'high'}, per_page=2)
+        self.assertEqual(len(titles), 4)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Test a garbage cursor shows the first page"""
+        response = self.client.get(reverse('task-list'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['tasks']), 12)
+
+    def test_paginator_does_not_use_offset(self):
+        """Test later pages seek by key instead of OFFSET"""
+        paginator = KeysetPaginator(
+            Task.objects.filter(user=self.user), ('due_date', 'id'), 3
+        )
+        first = paginator.page()
+        with self.assertNumQueries(1) as ctx:
+            paginator.page(first.next_cursor)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+
+    def test_decode_cursor_rejects_garbage(self):
+        """Test malformed cursor tokens raise InvalidCursor"""
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+
+class TaskStatsTest(TestCase):
+    """Test cases for the aggregate statistics service"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.category = Category.objects.create(user=self.user, name='Work')
+        today = date.today()
+        Task.objects.create(
+            user=self.user, title='Overdue', priority='high',
+            due_date=today - timedelta(days=1), category=self.category
+        )
+        Task.objects.create(
+            user=self.user, title='Today', priority='low', due_date=today
+        )
+        Task.objects.create(
+            user=self.user, title='Done', is_completed=True,
+            due_date=today - timedelta(days=3), category=self.category
+        )
+
+    def test_task_stats_counts(self):
+        """Test every counter is computed in one query"""
+        with self.assertNumQueries(1):
+            stats = task_stats(self.user)
+
+        self.assertEqual(stats['total_tasks'], 3)
+        self.assertEqual(stats['pending_tasks'], 2)
+        self.assertEqual(stats['completed_tasks'], 1)
+        self.assertEqual(stats['overdue_tasks'], 1)
+        self.assertEqual(stats['due_today_tasks'], 1)
+        self.assertEqual(stats['high_priority_tasks'], 1)
+        self.assertEqual(stats['medium_priority_tasks'], 1)
+        self.assertEqual(stats['low_priority_tasks'], 1)
+
+    def test_categories_with_counts(self):
+        """Test category task and pending counts"""
+        category = categories_with_counts(self.user).get()
+        self.assertEqual(category.task_count, 2)
+        self.assertEqual(category.pending_count, 1)
+
+    def test_task_stats_builds_missing_profile(self):
+        """Test stats for a user without a profile rebuild the counters"""
+        other = User.objects.create_user(username='other', password='x')
+        Task.objects.create(user=other, title='Orphan')
+
+        stats = task_stats(other)
+        self.assertEqual(stats['total_tasks'], 1)
+        self.assertTrue(UserProfile.objects.filter(user=other).exists())
+
+
+class TaskCounterTest(TestCase):
+    """Test cases for denormalized task counters"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.work = Category.objects.create(user=self.user, name='Work')
+        self.home = Category.objects.create(user=self.user, name='Home')
+        self.client.login(username='testuser', password='testpass123')
+
+    def assertCounters(self, total, pending, completed):
+        self.profile.refresh_from_db()
+        self.assertEqual(
+            (self.profile.total_tasks, self.profile.pending_tasks,
+             self.profile.completed_tasks),
+            (total, pending, completed)
+        )
+
+    def test_counters_follow_task_lifecycle(self):
+        """Test create, update, toggle and delete adjust the counters"""
+        self.client.post(reverse('task-create'), {
+            'title': 'Report', 'priority': 'high', 'category': self.work.pk
+        })
+        task = Task.objects.get(title='Report')
+        self.assertCounters(1, 1, 0)
+        self.work.refresh_from_db()
+        self.assertEqual((self.work.task_count, self.work.pending_count),
+                         (1, 1))
+
+        self.client.post(reverse('task-update', args=[task.pk]), {
+            'title': 'Report', 'priority': 'low', 'category': self.home.pk
+        })
+        self.work.refresh_from_db()
+        self.home.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.work.task_count, 0)
+        self.assertEqual(self.home.task_count, 1)
+        self.assertEqual(self.profile.high_priority_tasks, 0)
+        self.assertEqual(self.profile.low_priority_tasks, 1)
+
+        self.client.post(reverse('task-toggle', args=[task.pk]))
+        self.assertCounters(1, 0, 1)
+        self.home.refresh_from_db()
+        self.assertEqual((self.home.task_count, self.home.pending_count),
+                         (1, 0))
+
+        self.client.post(reverse('task-delete', args=[task.pk]))
+        self.assertCounters(0, 0, 0)
+        self.home.refresh_from_db()
+        self.assertEqual(self.home.task_count, 0)
+
+    def test_reassigning_a_task_moves_its_counts(self):
+        """Test changing a task's owner updates both users' counters"""
+        other = User.objects.create_user(username='other', password='x')
+        other_profile = UserProfile.objects.create(user=other)
+        task = Task.objects.create(
+            user=self.user, title='Report', priority='high',
+            category=self.work
+        )
+        task.user = other
+        task.save()
+
+        self.assertCounters(0, 0, 0)
+        other_profile.refresh_from_db()
+        self.assertEqual(
+            (other_profile.total_tasks, other_profile.pending_tasks,
+             other_profile.high_priority_tasks),
+            (1, 1, 1)
+        )
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+
+    def test_stored_state_is_read_under_lock(self):
+        """Test a save locks the stored row inside its own transaction"""
+        task = Task.objects.create(user=self.user, title='A')
+        depth = len(connection.atomic_blocks)
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def spy(queryset, *args, **kwargs):
+            locked.append(len(connection.atomic_blocks))
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', spy):
+            task.is_completed = True
+            task.save()
+        self.assertEqual(len(locked), 1)
+        self.assertGreater(locked[0], depth)
+        self.assertCounters(1, 0, 1)
+
+    def test_category_rename_keeps_counters(self):
+        """Test renaming a category doesn't overwrite its counters"""
+        Task.objects.create(user=self.user, title='A', category=self.work)
+        self.client.post(
+            reverse('category-update', args=[self.work.pk]),
+            {'name': 'Office'}
+        )
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.name, 'Office')
+        self.assertEqual(self.work.task_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        """Test reconciliation reports and repairs drifted counters"""
+        Task.objects.create(user=self.user, title='A', category=self.work)
+        UserProfile.objects.filter(pk=self.profile.pk).update(total_tasks=7)
+        Category.objects.filter(pk=self.work.pk).update(task_count=0)
+
+        drift = reconcile_counters(dry_run=True)
+        self.assertEqual(len(drift), 2)
+        self.assertCounters(7, 1, 0)
+
+        out = StringIO()
+        call_command('reconcile_task_counters', stdout=out)
+        self.assertIn('Fixed 2 drifted counters', out.getvalue())
+        self.assertCounters(1, 1, 0)
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.task_count, 1)
+        self.assertEqual(reconcile_counters(), [])
+
+
+class DatasetGeneratorTest(TestCase):
+    """Test cases for the synthetic dataset generator"""
+
+    def snapshot(self):
+        return list(
+            Task.objects.order_by('pk').values_list(
+                'user__username', 'title', 'priority', 'is_completed',
+                'due_date', 'category__name'
+            )
+        )
+
+    def test_generates_requested_rows(self):
+        """Test every model is populated with consistent counters"""
+        counts = generate_dataset(
+            users=3, categories=2, tasks=40, notes=0.5, recurring=0.5,
+            shared=0.5, batch_size=16
+        )
+        self.assertEqual(counts['users'], 3)
+        self.assertEqual(Category.objects.count(), 6)
+        self.assertEqual(Task.objects.count(), 120)
+        self.assertEqual(TaskNote.objects.count(), counts['notes'])
+        self.assertEqual(RecurringTask.objects.count(), counts['recurrences'])
+        self.assertEqual(SharedTaskList.objects.count(), counts['shares'])
+        self.assertGreater(counts['shares'], 0)
+        self.assertFalse(
+            SharedTaskList.objects.filter(
+                shared_with_user=F('task__user')
+            ).exists()
+        )
+        self.assertEqual(UserProfile.objects.count(), 3)
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_same_seed_reproduces_data(self):
+        """Test a seed always produces the same tasks"""
+        generate_dataset(users=2, tasks=30, seed=7, prefix='first')
+        first = self.snapshot()
+        Task.objects.all().delete()
+        User.objects.all().delete()
+        generate_dataset(users=2, tasks=30, seed=7, prefix='first')
+        self.assertEqual(self.snapshot(), first)
+
+    def test_generated_users_can_log_in(self):
+        """Test generated users share the given password"""
+        out = StringIO()
+        call_command(
+            'generate_dataset', '--users', '2', '--tasks', '5',
+            '--password', 'secret123', stdout=out
+        )
+        self.assertIn('Created 2 users', out.getvalue())
+        self.assertTrue(
+            self.client.login(username='loadtest1', password='secret123')
+        )
+
+
+class TaskIndexTest(TestCase):
+    """Test that task_list queries are served by an index"""
+
+    FILTERS = [
+        {},
+        {'status': 'pending'},
+        {'status': 'completed'},
+        {'priority': 'high'},
+        {'status': 'pending', 'priority': 'low'},
+        {'category': None},
+        {'status': 'pending', 'category': None},
+        {'search': 'report'},
+    ]
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(user=self.user, name='Work')
+        for i in range(20):
+            Task.objects.create(
+                user=self.user,
+                title=f'Task {i}',
+                priority=['high', 'medium', 'low'][i % 3],
+                is_completed=i % 2 == 0,
+                category=self.category if i % 4 else None,
+                due_date=date.today() + timedelta(days=i)
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _list_query(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('task-list'), params)
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT "tasks_task"') and 'ORDER BY' in sql:
+                return sql
+        self.fail(f'No task list query captured for {params}')
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            if connection.vendor == 'postgresql':
+                # Tiny test tables always favour a seq scan; disabling it
+                # shows whether a usable index exists at all
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return '\n'.join(row[0] for row in cursor.fetchall())
+        self.skipTest(f'No EXPLAIN check for {connection.vendor}')
+
+    def test_task_list_filters_use_index(self):
+        """Test every filter combination avoids a full table scan"""
+        for params in self.FILTERS:
+            params = {
+                key: self.category.pk if value is None else value
+                for key, value in params.items()
+            }
+            with self.subTest(params=params):
+                plan = self._plan(self._list_query(params))
+                if connection.vendor == 'sqlite':
+                    self.assertNotRegex(plan, r'SCAN (tasks_task|T)\b')
+                    self.assertIn('USING', plan)
+                else:
+                    self.assertNotIn('Seq Scan on tasks_task', plan)
+
+
+class TaskAgendaTest(TestCase):
+    """Test cases for the agenda endpoint"""
+
+    # The session and the user are looked up before every view
+    AUTH_QUERIES = 2
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.today = date.today()
+        self.work = Category.objects.create(user=self.user, name='Work')
+        self.mine = Task.objects.create(
+            user=self.user, title='Report', due_date=self.today,
+            priority='low', category=self.work
+        )
+        self.urgent = Task.objects.create(
+            user=self.user, title='Call bank', due_date=self.today,
+            priority='high'
+        )
+        self.later = Task.objects.create(
+            user=self.user, title='Dentist',
+            due_date=self.today + timedelta(days=3)
+        )
+        self.shared = Task.objects.create(
+            user=self.other, title='Team lunch',
+            due_date=self.today + timedelta(days=1)
+        )
+        SharedTaskList.objects.create(
+            task=self.shared, shared_with_user=self.user
+        )
+        Task.objects.create(
+            user=self.other, title='Private', due_date=self.today
+        )
+        Task.objects.create(user=self.user, title='Someday')
+        self.client.login(username='testuser', password='testpass123')
+
+    def agenda(self, **params):
+        response = self.client.get(reverse('task-agenda'), params)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return response, json.loads(content)
+
+    def test_tasks_grouped_by_day(self):
+        """Test owned and shared tasks are grouped by due date"""
+        response, data = self.agenda()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(data['start'], self.today.isoformat())
+        days = {day['date']: day['tasks'] for day in data['days']}
+        self.assertEqual(
+            [task['title'] for task in days[self.today.isoformat()]],
+            ['Call bank', 'Report']
+        )
+        self.assertEqual(days[self.today.isoformat()][1]['category'], 'Work')
+        shared_day = days[(self.today + timedelta(days=1)).isoformat()]
+        self.assertEqual(shared_day[0]['title'], 'Team lunch')
+        self.assertTrue(shared_day[0]['shared'])
+        self.assertEqual(len(days), 3)
+
+    def test_range_bounds(self):
+        """Test tasks outside the range are left out"""
+        _response, data = self.agenda(
+            start=(self.today + timedelta(days=1)).isoformat(),
+            end=(self.today + timedelta(days=2)).isoformat()
+        )
+        self.assertEqual(
+            [day['date'] for day in data['days']],
+            [(self.today + timedelta(days=1)).isoformat()]
+        )
+
+    def test_invalid_range(self):
+        """Test malformed or reversed ranges are rejected"""
+        for params in [{'start': 'soon'},
+                       {'start': '2025-02-01', 'end': '2025-01-01'},
+                       {'start': '2000-01-01', 'end': '2030-01-01'}]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse('task-agenda'), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_long_range_streams_in_one_query(self):
+        """Test a year-long agenda streams from a single query"""
+        end = self.today + timedelta(days=365)
+        for i in range(50):
+            Task.objects.create(
+                user=self.user, title=f'Task {i}',
+                due_date=self.today + timedelta(days=i * 7)
+            )
+        with self.assertNumQueries(self.AUTH_QUERIES + 1):
+            response, data = self.agenda(end=end.isoformat())
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            sum(len(day['tasks']) for day in data['days']), 54
+        )
+
+    def test_range_uses_due_date_index(self):
+        """Test owned tasks are read with a range scan on the index"""
+        tasks = Task.objects.for_agenda(
+            self.user, self.today, self.today + timedelta(days=30)
+        )
+        plan = tasks.explain()
+        if connection.vendor != 'sqlite':
+            self.skipTest(f'No EXPLAIN check for {connection.vendor}')
+        self.assertIn('task_user_due_idx', plan)
+        self.assertNotRegex(plan, r'SCAN tasks_task\b')
+
+
+class TaskSearchTest(TestCase):
+    """Test cases for full-text task search"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='otherpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _search(self, query):
+        response = self.client.get(reverse('task-list'), {'search': query})
+        return [task.title for task in response.context['tasks']]
+
+    def test_search_matches_title_description_and_notes(self):
+        """Test search covers titles, descriptions and note content"""
+        Task.objects.create(user=self.user, title='Quarterly report')
+        Task.objects.create(
+            user=self.user, title='Call bank', description='Ask about loans'
+        )
+        noted = Task.objects.create(user=self.user, title='Plan trip')
+        TaskNote.objects.create(task=noted, content='Book the ferry')
+
+        self.assertEqual(self._search('report'), ['Quarterly report'])
+        self.assertEqual(self._search('loans'), ['Call bank'])
+        self.assertEqual(self._search('ferry'), ['Plan trip'])
+
+    def test_search_matches_word_prefixes(self):
+        """Test partial words match as prefixes"""
+        Task.objects.create(user=self.user, title='Buy groceries')
+        self.assertEqual(self._search('groc'), ['Buy groceries'])
+
+    def test_search_is_scoped_to_user(self):
+        """Test other users' tasks never match"""
+        Task.objects.create(user=self.other_user, title='Secret report')
+        self.assertEqual(self._search('report'), [])
+
+    def test_search_ranks_title_matches_first(self):
+        """Test title matches rank above note matches"""
+        in_note = Task.objects.create(user=self.user, title='Errands')
+        TaskNote.objects.create(task=in_note, content='pick up the invoice')
+        Task.objects.create(user=self.user, title='Send invoice')
+
+        self.assertEqual(self._search('invoice'), ['Send invoice', 'Errands'])
+
+    def test_index_follows_writes(self):
+        """Test updates and deletes keep the index in sync"""
+        task = Task.objects.create(user=self.user, title='Draft memo')
+        note = TaskNote.objects.create(task=task, content='budget figures')
+
+        task.title = 'Final memo'
+        task.save()
+        self.assertEqual(self._search('draft'), [])
+        self.assertEqual(self._search('final'), ['Final memo'])
+
+        note.delete()
+        self.assertEqual(self._search('budget'), [])
+
+        task.delete()
+        self.assertEqual(self._search('memo'), [])
+
+    def test_rebuild_search_index_command(self):
+        """Test the rebuild command re-indexes bulk-inserted tasks"""
+        Task.objects.bulk_create([Task(user=self.user, title='Bulk import')])
+        self.assertEqual(self._search('bulk'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('bulk'), ['Bulk import'])
+
+    def test_backend_matches_database(self):
+        """Test the backend is chosen from the connection vendor"""
+        backend = get_search_backend()
+        self.assertIn(backend.vendor, (connection.vendor, None))
+
+
+class TaskSuggestTest(TestCase):
+    """Test cases for search-as-you-type suggestions"""
+
+    def setUp(self):
+        suggest.clear_caches()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.category = Category.objects.create(user=self.user, name='Reading')
+        self.task = Task.objects.create(
+            user=self.user, title='Quarterly report'
+        )
+        Task.objects.create(user=self.user, title='Renew passport')
+
+    def _labels(self, query, **params):
+        response = self.client.get(
+            reverse('task-suggest'), {'q': query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['label'] for item in response.json()['results']]
+
+    def test_suggest_requires_login(self):
+        """Test the suggestions endpoint requires authentication"""
+        self.client.logout()
+        response = self.client.get(reverse('task-suggest'), {'q': 're'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_suggest_matches_titles_and_categories(self):
+        """Test prefixes match task titles and category names"""
+        self.assertEqual(
+            self._labels('re'),
+            ['Reading', 'Renew passport', 'Quarterly report']
+        )
+        self.assertEqual(self._labels('rep'), ['Quarterly report'])
+        self.assertEqual(self._labels('quarterly re'), ['Quarterly report'])
+        self.assertEqual(self._labels('re', limit=1), ['Reading'])
+
+    def test_suggest_includes_urls(self):
+        """Test suggestions link to the task or filtered list"""
+        response = self.client.get(reverse('task-suggest'), {'q': 'quart'})
+        item = response.json()['results'][0]
+        self.assertEqual(item['type'], 'task')
+        self.assertEqual(
+            item['url'], reverse('task-detail', args=[self.task.pk])
+        )
+
+    def test_suggest_is_scoped_to_user(self):
+        """Test other users' titles are never suggested"""
+        other = User.objects.create_user(username='other', password='x')
+        Task.objects.create(user=other, title='Research grant')
+        self.assertNotIn('Research grant', self._labels('res'))
+
+    def test_suggest_reflects_writes(self):
+        """Test renames and new tasks show up immediately"""
+        self.assertEqual(self._labels('rep'), ['Quarterly report'])
+        self.task.title = 'Annual summary'
+        self.task.save()
+        Task.objects.create(user=self.user, title='Repaint fence')
+        self.assertEqual(self._labels('rep'), ['Repaint fence'])
+
+    def test_suggest_avoids_queries_when_warm(self):
+        """Test repeated keystrokes are answered from memory"""
+        self._labels('re')
+        with self.assertNumQueries(2):
+            # The session and user lookups only
+            self._labels('ren')
+
+    def test_prefix_cache_is_bounded(self):
+        """Test the LRU cache evicts the oldest entries"""
+        cache = suggest.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_prefix_index_latency(self):
+        """Test lookups in a large index stay well under 10 ms"""
+        index = suggest.PrefixIndex(
+            ('task', i, f'Task {i} about topic{i % 997}')
+            for i in range(100000)
+        )
+        timings = []
+        for i in range(200):
+            start = time.perf_counter()
+            index.search(f'topic{i % 50}', 8)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        self.assertLess(timings[int(len(timings) * 0.99)], 0.01)
+
+
+class ViewQueryCountTest(TestCase):
+    """Test that view query counts don't grow with the number of rows"""
+
+    # Session and authenticated user lookups made before every view
+    AUTH_QUERIES = 2
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.client.login(username='testuser', password='testpass123')
+
+    def _seed(self, count):
+        for i in range(count):
+            category = Category.objects.create(
+                user=self.user, name=f'Category {i}'
+            )
+            task = Task.objects.create(
+                user=self.user,
+                title=f'Task {i}',
+                description='word ' * 50,
+                category=category
+            )
+            TaskNote.objects.create(task=task, content='note')
+        return task
+
+    def assertViewQueries(self, count, url, data=None):
+        with self.assertNumQueries(self.AUTH_QUERIES + count):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_task_list_query_count(self):
+        """Test task_list: stats, category filter options and one page"""
+        for rows in (1, 10):
+            self._seed(rows)
+            response = self.assertViewQueries(3, reverse('task-list'))
+        self.assertContains(response, 'Category 0')
+        self.assertContains(response, 'word word')
+
+    def test_task_list_search_query_count(self):
+        """Test searching doesn't add per-row queries"""
+        self._seed(10)
+        self.assertViewQueries(
+            3, reverse('task-list'), {'search': 'task', 'status': 'pending'}
+        )
+
+    def test_task_detail_query_count(self):
+        """Test task_detail loads the task and its category together"""
+        task = self._seed(3)
+        response = self.assertViewQueries(
+            1, reverse('task-detail', args=[task.pk])
+        )
+        self.assertContains(response, task.category.name)
+
+    def test_category_list_query_count(self):
+        """Test category_list reads stored counts in one query"""
+        for rows in (1, 10):
+            self._seed(rows)
+            self.assertViewQueries(1, reverse('category-list'))
+
+
 class CategoryViewTest(TestCase):
     """Test cases for category views"""
 
@@ -477,6 +1301,188 @@ class RecurringTaskModelTest(TestCase):
             self.assertEqual(recurring.frequency, freq)
 
 
+class RecurrenceMaterializationTest(TestCase):
+    """Test cases for materializing recurring task occurrences"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.today = date.today()
+        self.task = Task.objects.create(
+            user=self.user,
+            title='Water plants',
+            priority='high',
+            due_date=self.today
+        )
+
+    def test_occurrence_dates(self):
+        """Test stepping, clamping to short months and the window bounds"""
+        jan31 = date(2024, 1, 31)
+        self.assertEqual(
+            occurrence_dates(jan31, 'monthly', jan31, date(2024, 5, 1)),
+            [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+        )
+        self.assertEqual(
+            occurrence_dates(date(2024, 2, 29), 'yearly', date(2025, 1, 1),
+                             date(2028, 3, 1)),
+            [date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28),
+             date(2028, 2, 29)]
+        )
+        self.assertEqual(
+            occurrence_dates(jan31, 'weekly', date(2024, 2, 7),
+                             date(2024, 2, 21)),
+            [date(2024, 2, 14), date(2024, 2, 21)]
+        )
+
+    def test_new_rule_materializes_until_end_date(self):
+        """Test creating a rule writes its occurrences as tasks"""
+        rule = RecurringTask.objects.create(
+            task=self.task,
+            frequency='weekly',
+            end_date=self.today + timedelta(days=21)
+        )
+        occurrences = rule.occurrences.order_by('due_date')
+        self.assertEqual(
+            [task.due_date for task in occurrences],
+            [self.today + timedelta(days=7 * n) for n in (1, 2, 3)]
+        )
+        self.assertTrue(all(task.priority == 'high' for task in occurrences))
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_tasks, 4)
+        self.assertEqual(reconcile_counters(), [])
+        results = get_search_backend().filter(
+            Task.objects.all(), self.user, 'plants'
+        )
+        self.assertEqual(results.count(), 4)
+
+    def test_materialization_is_incremental_and_idempotent(self):
+        """Test reruns only add occurrences past the previous horizon"""
+        rule = RecurringTask.objects.create(task=self.task, frequency='daily')
+        count = rule.occurrences.count()
+
+        self.assertEqual(materialize_occurrences(), 0)
+        later = self.today + timedelta(days=100)
+        with CaptureQueriesContext(connection) as ctx:
+            created = materialize_occurrences(until=later)
+        self.assertEqual(created, 100 - count)
+        self.assertEqual(rule.occurrences.count(), 100)
+        # A fixed number of queries per batch, not one per occurrence
+        self.assertLess(len(ctx.captured_queries), 25)
+
+        RecurringTask.objects.filter(pk=rule.pk).update(
+            materialized_until=None
+        )
+        materialize_occurrences(until=later)
+        self.assertEqual(rule.occurrences.count(), 100)
+
+    def test_counters_count_only_inserted_occurrences(self):
+        """Test reruns over existing occurrences don't count them again"""
+        category = Category.objects.create(user=self.user, name='Garden')
+        self.task.category = category
+        self.task.save()
+        rule = RecurringTask.objects.create(task=self.task, frequency='daily')
+        count = rule.occurrences.count()
+
+        RecurringTask.objects.filter(pk=rule.pk).update(
+            materialized_until=None
+        )
+        later = self.today + timedelta(days=100)
+        created = materialize_occurrences(until=later)
+        self.assertEqual(created, 100 - count)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_tasks, 101)
+        self.assertEqual(profile.high_priority_tasks, 101)
+        category.refresh_from_db()
+        self.assertEqual(category.pending_count, 101)
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_reschedule_replaces_pending_occurrences(self):
+        """Test changing the frequency rebuilds future pending occurrences"""
+        rule = RecurringTask.objects.create(task=self.task, frequency='daily')
+        done = rule.occurrences.get(due_date=self.today + timedelta(days=1))
+        done.is_completed = True
+        done.save()
+
+        rule.frequency = 'weekly'
+        rule.save()
+        self.assertTrue(rule.occurrences.filter(pk=done.pk).exists())
+        self.assertFalse(
+            rule.occurrences.filter(
+                is_completed=False, due_date=self.today + timedelta(days=2)
+            ).exists()
+        )
+        self.assertTrue(
+            rule.occurrences.filter(
+                due_date=self.today + timedelta(days=7)
+            ).exists()
+        )
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_command(self):
+        """Test the command materializes rules behind the horizon"""
+        rule = RecurringTask.objects.create(task=self.task, frequency='yearly')
+        out = StringIO()
+        call_command(
+            'materialize_recurring_tasks', '--days', '800', stdout=out
+        )
+        self.assertIn('Materialized 2 occurrences', out.getvalue())
+        self.assertEqual(rule.occurrences.count(), 2)
+
+
+class RecurrenceExpansionTest(TestCase):
+    """Test cases for batch expansion of recurrence rules"""
+
+    def test_matches_stepwise_expansion(self):
+        """Test closed-form windows agree with stepping one date at a time"""
+        start, end = date(2025, 1, 1), date(2025, 12, 31)
+        rules = []
+        for n, frequency in enumerate(['daily', 'weekly', 'monthly',
+                                       'yearly'] * 50):
+            anchor = date(2023, 1, 31) + timedelta(days=n * 7)
+            end_date = anchor + timedelta(days=400) if n % 3 == 0 else None
+            rules.append((n, anchor, frequency, end_date))
+
+        expansion = expand(rules, start, end)
+        self.assertEqual(len(expansion), len(rules))
+        for index, (_n, anchor, frequency, end_date) in enumerate(rules):
+            until = min(end, end_date) if end_date else end
+            expected = [
+                day for day in
+                [anchor] + occurrence_dates(anchor, frequency, anchor, until)
+                if start <= day <= until
+            ]
+            with self.subTest(rule=rules[index]):
+                self.assertEqual(expansion.dates(index), expected)
+                for day in expected[:2]:
+                    self.assertTrue(expansion.occurs_on(index, day))
+        self.assertEqual(
+            expansion.total, sum(len(dates) for _id, dates in expansion)
+        )
+
+    def test_expand_rules_from_queryset(self):
+        """Test rules are read from the database with their anchors"""
+        user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        task = Task.objects.create(
+            user=user, title='Pay rent', due_date=date(2025, 1, 31)
+        )
+        rule = RecurringTask.objects.create(task=task, frequency='monthly')
+        expansion = expand_rules(
+            RecurringTask.objects.all(), date(2025, 2, 1), date(2025, 4, 30)
+        )
+        self.assertEqual(
+            list(expansion),
+            [(rule.pk, [date(2025, 2, 28), date(2025, 3, 31),
+                        date(2025, 4, 30)])]
+        )
+
+
 class SharedTaskListModelTest(TestCase):
     """Test cases for SharedTaskList model"""
 
@@ -521,3 +1527,1335 @@ class SharedTaskListModelTest(TestCase):
                 permission_level=perm
             )
             self.assertEqual(shared.permission_level, perm)
+
+
+class SharedTaskAccessTest(TestCase):
+    """Test cases for shared tasks in the views and the visibility index"""
+
+    def setUp(self):
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='owner',
+            password='testpass123'
+        )
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.task = Task.objects.create(user=self.owner, title='Plan trip')
+        self.share = SharedTaskList.objects.create(
+            task=self.task,
+            shared_with_user=self.user,
+            permission_level='view_only'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _set_permission(self, permission):
+        self.share.permission_level = permission
+        self.share.save()
+
+    def test_visibility_rows_follow_shares(self):
+        """Test owner and share rows are kept in sync by signals"""
+        self.assertEqual(
+            dict(TaskVisibility.objects.filter(task=self.task).values_list(
+                'user__username', 'access'
+            )),
+            {'owner': 'owner', 'testuser': 'view_only'}
+        )
+        self._set_permission('editable')
+        self.assertEqual(
+            Task.objects.visible_to(self.user).get().access, 'editable'
+        )
+        self.share.delete()
+        self.assertFalse(Task.objects.visible_to(self.user).exists())
+        self.assertTrue(Task.objects.visible_to(self.owner).exists())
+
+    def test_owner_change_moves_visibility(self):
+        """Test reassigning a task moves the owner row"""
+        self.task.user = self.user
+        self.task.save()
+        self.assertEqual(
+            Task.objects.visible_to(self.user).get().access, 'owner'
+        )
+        self.assertFalse(Task.objects.visible_to(self.owner).exists())
+
+    def test_shared_task_in_list_and_detail(self):
+        """Test shared tasks appear in the list and detail views"""
+        Task.objects.create(user=self.user, title='Own task')
+        response = self.client.get(reverse('task-list'))
+        self.assertContains(response, 'Plan trip')
+        self.assertContains(response, 'Own task')
+        self.assertContains(response, 'Shared (view only)')
+
+        response = self.client.get(
+            reverse('task-detail', args=[self.task.pk])
+        )
+        self.assertContains(response, 'Shared by owner')
+        self.assertNotContains(
+            response, reverse('task-update', args=[self.task.pk])
+        )
+
+    def test_view_only_cannot_change_task(self):
+        """Test view-only shares can't update or toggle a task"""
+        response = self.client.post(
+            reverse('task-update', args=[self.task.pk]),
+            {'title': 'Changed', 'priority': 'low'}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            reverse('task-toggle', args=[self.task.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'Plan trip')
+        self.assertFalse(self.task.is_completed)
+
+    def test_editable_can_change_but_not_delete(self):
+        """Test editable shares can update and toggle but not delete"""
+        self._set_permission('editable')
+        category = Category.objects.create(user=self.owner, name='Travel')
+        self.task.category = category
+        self.task.save()
+
+        response = self.client.post(
+            reverse('task-update', args=[self.task.pk]),
+            {'title': 'Plan holiday', 'priority': 'high', 'category': ''}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.client.post(reverse('task-toggle', args=[self.task.pk]))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'Plan holiday')
+        self.assertTrue(self.task.is_completed)
+        # Only the owner can change the category
+        self.assertEqual(self.task.category, category)
+
+        response = self.client.post(
+            reverse('task-delete', args=[self.task.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Task.objects.filter(pk=self.task.pk).exists())
+
+    def test_unshared_task_is_hidden(self):
+        """Test tasks are hidden once the share is removed"""
+        self.share.delete()
+        response = self.client.get(
+            reverse('task-detail', args=[self.task.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('task-list'))
+        self.assertNotContains(response, 'Plan trip')
+
+    def test_visible_to_uses_visibility_index(self):
+        """Test visible tasks are read with one join and no OR"""
+        with CaptureQueriesContext(connection) as queries:
+            list(Task.objects.visible_to(self.user))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertIn('tasks_taskvisibility', sql)
+        self.assertNotIn(' OR ', sql)
+
+    def test_rebuild_visibility(self):
+        """Test rebuilding restores rows lost by bulk writes"""
+        TaskVisibility.objects.all().delete()
+        Task.objects.bulk_create([Task(user=self.user, title='Bulk task')])
+        rebuild_visibility()
+        self.assertEqual(
+            set(Task.objects.visible_to(self.user).values_list(
+                'title', 'access'
+            )),
+            {('Plan trip', 'view_only'), ('Bulk task', 'owner')}
+        )
+
+        out = StringIO()
+        call_command('rebuild_task_visibility', stdout=out)
+        self.assertIn('3 rows', out.getvalue())
+
+
+class BulkTaskActionTest(TestCase):
+    """Test cases for bulk task operations"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        UserProfile.objects.create(user=self.other)
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.tasks = [
+            Task.objects.create(
+                user=self.user, title=f'Task {n}', priority='low',
+                category=self.category
+            )
+            for n in range(5)
+        ]
+        self.ids = [task.pk for task in self.tasks]
+        self.client.login(username='testuser', password='testpass123')
+
+    def _post(self, action, task_ids, **data):
+        return self.client.post(
+            reverse('task-bulk'),
+            {'action': action, 'task_ids': task_ids, **data}
+        )
+
+    def test_bulk_complete_updates_counters(self):
+        """Test completing many tasks in one update keeps counters right"""
+        response = self._post('complete', self.ids[:3])
+        self.assertRedirects(response, reverse('task-list'))
+        self.assertEqual(
+            Task.objects.filter(is_completed=True).count(), 3
+        )
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.completed_tasks, 3)
+        self.assertEqual(profile.pending_tasks, 2)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.pending_count, 2)
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_bulk_priority_and_category(self):
+        """Test re-prioritizing and re-categorizing a selection"""
+        self._post('priority', self.ids, priority='high')
+        self._post('category', self.ids[:2], category='')
+        self.assertEqual(
+            Task.objects.filter(priority='high').count(), 5
+        )
+        self.assertEqual(
+            Task.objects.filter(category__isnull=True).count(), 2
+        )
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_bulk_delete(self):
+        """Test deleting a selection removes tasks, counters and index"""
+        response = self._post('delete', self.ids[:4])
+        self.assertRedirects(response, reverse('task-list'))
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).total_tasks, 1)
+        self.assertEqual(reconcile_counters(), [])
+        results = get_search_backend().filter(
+            Task.objects.all(), self.user, 'task'
+        )
+        self.assertEqual(results.count(), 1)
+
+    def test_writes_are_set_wise(self):
+        """Test the query count does not grow with the selection"""
+        tasks = Task.objects.bulk_create([
+            Task(user=self.user, title=f'Bulk {n}') for n in range(200)
+        ])
+        rebuild_visibility()
+        task_ids = [task.pk for task in tasks]
+        with CaptureQueriesContext(connection) as ctx:
+            apply_bulk_action(self.user, 'complete', task_ids)
+        updates = [
+            query for query in ctx.captured_queries
+            if query['sql'].startswith('UPDATE "tasks_task"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertLess(len(ctx.captured_queries), 10)
+
+        with CaptureQueriesContext(connection) as ctx:
+            apply_bulk_action(self.user, 'delete', task_ids)
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertFalse(Task.objects.filter(pk__in=task_ids).exists())
+
+    def test_foreign_task_rejects_whole_selection(self):
+        """Test one task the user can't change blocks the whole operation"""
+        foreign = Task.objects.create(user=self.other, title='Not mine')
+        response = self.client.post(
+            reverse('task-bulk'),
+            {'action': 'complete', 'task_ids': self.ids + [foreign.pk]},
+            follow=True
+        )
+        self.assertContains(response, 'No tasks were changed.')
+        self.assertFalse(Task.objects.filter(is_completed=True).exists())
+
+    def test_shared_access_levels(self):
+        """Test editable shares can complete but only owners can delete"""
+        shared = Task.objects.create(user=self.other, title='Shared')
+        share = SharedTaskList.objects.create(
+            task=shared, shared_with_user=self.user,
+            permission_level='view_only'
+        )
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(self.user, 'complete', [shared.pk])
+        share.permission_level = 'editable'
+        share.save()
+        self._post('complete', [shared.pk])
+        shared.refresh_from_db()
+        self.assertTrue(shared.is_completed)
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(self.user, 'delete', [shared.pk])
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(self.user, 'category', [shared.pk], '')
+        self.assertTrue(Task.objects.filter(pk=shared.pk).exists())
+
+        # Owner-only actions can tell shared tasks from owned ones
+        response = self.client.get(reverse('task-list'))
+        self.assertContains(response, 'data-access="owner"', count=5)
+        self.assertContains(response, 'data-access="editable"', count=1)
+        self.assertContains(response, 'value="delete" data-owner-only')
+
+    def test_invalid_input(self):
+        """Test bad actions and values are refused with a message"""
+        other_category = Category.objects.create(user=self.other, name='X')
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(self.user, 'archive', self.ids)
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(self.user, 'complete', [])
+        with self.assertRaises(InvalidBulkAction):
+            apply_bulk_action(
+                self.user, 'category', self.ids, str(other_category.pk)
+            )
+        response = self._post('priority', self.ids, priority='urgent')
+        self.assertRedirects(response, reverse('task-list'))
+        self.assertEqual(Task.objects.filter(priority='low').count(), 5)
+        response = self.client.post(
+            reverse('task-bulk'),
+            {'action': 'complete', 'task_ids': ['abc']},
+            follow=True
+        )
+        self.assertContains(response, 'Invalid task selection.')
+
+    def test_list_renders_bulk_form(self):
+        """Test the list offers selection checkboxes and the bulk form"""
+        response = self.client.get(reverse('task-list'))
+        self.assertContains(response, 'id="bulk-form"')
+        self.assertContains(response, 'name="task_ids"', count=5)
+
+
+class TaskApiTest(TestCase):
+    """Test cases for the versioned JSON API"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.tasks = [
+            Task.objects.create(
+                user=self.user, title=f'Task {n}', category=self.category
+            )
+            for n in range(5)
+        ]
+        self.task = self.tasks[0]
+        TaskNote.objects.create(task=self.task, content='Bring slides')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _list(self, resource='tasks', **params):
+        return self.client.get(
+            reverse('api-list', args=[resource]), params
+        )
+
+    def _detail(self, pk, resource='tasks', **headers):
+        return self.client.get(
+            reverse('api-detail', args=[resource, pk]), headers=headers
+        )
+
+    def test_requires_authentication(self):
+        """Test anonymous requests get a 401 rather than a redirect"""
+        self.client.logout()
+        response = self._list()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['error'], 'Authentication required.')
+
+    def test_resources_are_scoped_to_user(self):
+        """Test each resource only lists rows visible to the user"""
+        foreign = Task.objects.create(user=self.other, title='Foreign')
+        Category.objects.create(user=self.other, name='Elsewhere')
+        titles = [row['title'] for row in self._list().json()['results']]
+        self.assertEqual(titles, [f'Task {n}' for n in range(5)])
+        self.assertEqual(len(self._list('categories').json()['results']), 1)
+        self.assertEqual(len(self._list('notes').json()['results']), 1)
+        self.assertEqual(self._detail(foreign.pk).status_code, 404)
+        self.assertEqual(self._list('users').status_code, 404)
+
+        SharedTaskList.objects.create(
+            task=foreign, shared_with_user=self.user,
+            permission_level='view_only'
+        )
+        row = self._detail(foreign.pk).json()
+        self.assertEqual(row['access'], 'view_only')
+        self.assertEqual(len(self._list('shares').json()['results']), 1)
+
+    def test_field_selection(self):
+        """Test ?fields= limits the output and rejects unknown fields"""
+        rows = self._list(fields='title,priority').json()['results']
+        self.assertEqual(
+            rows[0], {'id': self.task.pk, 'title': 'Task 0',
+                      'priority': 'medium'}
+        )
+        response = self._list(fields='title,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_cursor_pagination(self):
+        """Test pages follow the next links without repeats"""
+        seen = []
+        url = reverse('api-list', args=['tasks']) + '?limit=2'
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [task.pk for task in self.tasks])
+        self.assertEqual(self._list(cursor='bogus').status_code, 400)
+        self.assertEqual(self._list(limit='0').status_code, 400)
+
+    def test_detail_conditional_get(self):
+        """Test matching validators return 304 until the task changes"""
+        response = self._detail(self.task.pk)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        response = self._detail(self.task.pk, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.task.title = 'Renamed'
+        self.task.save()
+        response = self._detail(self.task.pk, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_only_for_updated_at_versions(self):
+        """Test Last-Modified is sent only when updated_at is the version"""
+        # Access and category changes don't move a task's updated_at
+        self.assertNotIn('Last-Modified', self._detail(self.task.pk))
+        self.assertNotIn(
+            'Last-Modified', self._detail(self.category.pk, 'categories')
+        )
+
+        note = self.task.notes.get()
+        response = self._detail(note.pk, 'notes')
+        self.assertIn('Last-Modified', response)
+        response = self._detail(
+            note.pk, 'notes', if_modified_since=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_conditional_get_skips_payload(self):
+        """Test a 304 for a list runs only the version query"""
+        etag = self._list()['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse('api-list', args=['tasks']),
+                headers={'if-none-match': etag}
+            )
+        self.assertEqual(response.status_code, 304)
+        task_queries = [
+            query for query in ctx.captured_queries
+            if 'tasks_task' in query['sql']
+        ]
+        self.assertEqual(len(task_queries), 1)
+
+        # Deleting a row changes the page even though no updated_at moved
+        self.tasks[-1].delete()
+        response = self.client.get(
+            reverse('api-list', args=['tasks']),
+            headers={'if-none-match': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_counter_changes_change_category_etag(self):
+        """Test counters bumped without auto_now still change the ETag"""
+        url = reverse('api-detail', args=['categories', self.category.pk])
+        etag = self.client.get(url)['ETag']
+        self.task.is_completed = True
+        self.task.save()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pending_count'], 4)
+
+    def test_category_delete_changes_task_etag(self):
+        """Test clearing a task's category in bulk still changes its ETag"""
+        etag = self._detail(self.task.pk)['ETag']
+        self.client.post(reverse('category-delete', args=[self.category.pk]))
+        response = self._detail(self.task.pk, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['category'])
+
+    def test_only_safe_methods(self):
+        """Test the API is read-only"""
+        response = self.client.post(reverse('api-list', args=['tasks']))
+        self.assertEqual(response.status_code, 405)
+
+
+@mock.patch('tasks.sync.SYNC_OVERLAP', timedelta(0))
+class DeltaSyncTest(TestCase):
+    """Test cases for delta sync and tombstones"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.task = Task.objects.create(
+            user=self.user, title='Write report', category=self.category
+        )
+        self.note = TaskNote.objects.create(task=self.task, content='Draft')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _ids(self, data, kind):
+        return [row['id'] for row in data['changes'][kind]]
+
+    def test_first_sync_returns_everything(self):
+        """Test a sync without a token returns all rows and no deletions"""
+        other = User.objects.create_user(username='other', password='x')
+        Task.objects.create(user=other, title='Not mine')
+        data = changes_since(self.user)
+        self.assertEqual(self._ids(data, 'tasks'), [self.task.pk])
+        self.assertEqual(self._ids(data, 'categories'), [self.category.pk])
+        self.assertEqual(self._ids(data, 'notes'), [self.note.pk])
+        self.assertEqual(
+            data['deleted'], {'tasks': [], 'categories': [], 'notes': []}
+        )
+        self.assertFalse(data['more'])
+
+    def test_sync_returns_only_changes(self):
+        """Test a sync with a token returns rows changed since then"""
+        token = changes_since(self.user)['next']
+        data = changes_since(self.user, token)
+        self.assertEqual(self._ids(data, 'tasks'), [])
+
+        new_task = Task.objects.create(user=self.user, title='Call Bob')
+        self.category.name = 'Office'
+        self.category.save()
+        data = changes_since(self.user, token)
+        self.assertEqual(self._ids(data, 'tasks'), [new_task.pk])
+        self.assertEqual(self._ids(data, 'categories'), [self.category.pk])
+        self.assertEqual(self._ids(data, 'notes'), [])
+
+    def test_deletions_are_synced_from_tombstones(self):
+        """Test deleted tasks, categories and notes come back as ids"""
+        token = changes_since(self.user)['next']
+        other_note = TaskNote.objects.create(task=self.task, content='x')
+        note_pk = other_note.pk
+        other_note.delete()
+        task_pk, category_pk = self.task.pk, self.category.pk
+        self.task.delete()
+        self.category.delete()
+
+        data = changes_since(self.user, token)
+        self.assertEqual(data['deleted'], {
+            'tasks': [task_pk],
+            'categories': [category_pk],
+            # The first note went with its task, so only its task is listed
+            'notes': [note_pk],
+        })
+        data = changes_since(self.user, data['next'])
+        self.assertEqual(data['deleted']['tasks'], [])
+
+    def test_bulk_delete_writes_tombstones(self):
+        """Test bulk deletes record tombstones set-wise"""
+        token = changes_since(self.user)['next']
+        apply_bulk_action(self.user, 'delete', [self.task.pk])
+        data = changes_since(self.user, token)
+        self.assertEqual(data['deleted']['tasks'], [self.task.pk])
+        self.assertEqual(data['deleted']['notes'], [])
+
+    def test_deleting_user_leaves_no_tombstones(self):
+        """Test deleting a user doesn't write tombstones for their rows"""
+        self.user.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_limit_pages_through_changes(self):
+        """Test syncs cut off at the limit resume where they stopped"""
+        Task.objects.bulk_create([
+            Task(user=self.user, title=f'Task {n}') for n in range(5)
+        ])
+        seen, token, more = [], None, True
+        while more:
+            data = changes_since(self.user, token, limit=2)
+            seen += self._ids(data, 'tasks')
+            token, more = data['next'], data['more']
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_overlap_resends_recent_rows(self):
+        """Test rows inside the overlap window are sent again"""
+        with mock.patch('tasks.sync.SYNC_OVERLAP', timedelta(minutes=5)):
+            token = changes_since(self.user)['next']
+            data = changes_since(self.user, token)
+        self.assertEqual(self._ids(data, 'tasks'), [self.task.pk])
+
+    def test_regular_syncs_without_deletions_never_expire(self):
+        """Test positions advance even when a sync finds nothing new"""
+        start = timezone.now()
+        token = changes_since(self.user)['next']
+        for day in range(10, TOMBSTONE_DAYS + 40, 10):
+            later = start + timedelta(days=day)
+            with mock.patch('django.utils.timezone.now', return_value=later):
+                data = changes_since(self.user, token)
+            token = data['next']
+            self.assertEqual(self._ids(data, 'tasks'), [])
+        # The class runs without overlap, so positions reach the sync time
+        self.assertEqual(decode_token(token)['deleted'], (later, 0))
+
+    def test_scan_uses_user_updated_index(self):
+        """Test each sync is a range scan on (user, updated_at)"""
+        if connection.vendor != 'sqlite':
+            self.skipTest(f'No EXPLAIN check for {connection.vendor}')
+        position = (timezone.now(), 0)
+        plan = _since(
+            Task.objects.filter(user=self.user), 'updated_at', position
+        ).order_by('updated_at', 'pk').explain()
+        self.assertIn('task_user_updated_idx', plan)
+        self.assertNotRegex(plan, r'SCAN tasks_task\b')
+
+    def test_sync_endpoint(self):
+        """Test the endpoint returns JSON and rejects bad tokens"""
+        url = reverse('api-sync')
+        data = self.client.get(url).json()
+        self.assertEqual(data['version'], 'v1')
+        self.assertEqual(self._ids(data, 'tasks'), [self.task.pk])
+        response = self.client.get(url, {'since': data['next']})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, {'since': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        naive = base64.urlsafe_b64encode(
+            b'{"deleted":["2026-10-16T00:00:00",0]}'
+        ).decode()
+        response = self.client.get(url, {'since': naive})
+        self.assertEqual(response.status_code, 400)
+        old = timezone.now() - timedelta(days=365)
+        expired = encode_token({'deleted': (old, 0)})
+        response = self.client.get(url, {'since': expired})
+        self.assertEqual(response.status_code, 410)
+        with self.assertRaises(SyncExpired):
+            changes_since(self.user, expired)
+
+    def test_prune_tombstones_command(self):
+        """Test old tombstones are pruned"""
+        self.task.delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=365)
+        )
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Pruned 1 tombstones', out.getvalue())
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class TaskExportTest(TestCase):
+    """Test cases for streaming task exports"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        category = Category.objects.create(user=self.user, name='Work')
+        self.task = Task.objects.create(
+            user=self.user, title='Write, "quoted" report',
+            category=category, due_date=date(2025, 3, 1), priority='high'
+        )
+        TaskNote.objects.create(task=self.task, content='First')
+        TaskNote.objects.create(task=self.task, content='Second')
+        RecurringTask.objects.create(task=self.task, frequency='monthly')
+        other = User.objects.create_user(username='other', password='x')
+        Task.objects.create(user=other, title='Not mine')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _export(self, export_format):
+        response = self.client.get(
+            reverse('task-export'), {'format': export_format}
+        )
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """Test the CSV export has a header and the user's tasks only"""
+        response, body = self._export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(body.splitlines(keepends=True)))
+        # The anchor task plus its materialized occurrences
+        self.assertEqual({row['owner'] for row in rows}, {'testuser'})
+        row = next(row for row in rows if row['id'] == str(self.task.pk))
+        self.assertEqual(row['title'], 'Write, "quoted" report')
+        self.assertEqual(row['category'], 'Work')
+        self.assertEqual(row['priority'], 'high')
+        self.assertEqual(row['recurrence'], 'monthly')
+        self.assertEqual(row['notes'], 'First\nSecond')
+
+    def test_ndjson_export(self):
+        """Test the NDJSON export has one JSON document per line"""
+        response, body = self._export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        row = next(row for row in rows if row['id'] == self.task.pk)
+        self.assertEqual(row['notes'], ['First', 'Second'])
+        self.assertEqual(row['due_date'], '2025-03-01')
+
+    def test_invalid_format(self):
+        """Test unknown formats are rejected"""
+        response = self.client.get(reverse('task-export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_memory_does_not_grow_with_rows(self):
+        """Test peak memory is set by the chunk size, not the row count"""
+        def peak(count):
+            Task.objects.filter(title__startswith='Bulk').delete()
+            Task.objects.bulk_create([
+                Task(user=self.user, title=f'Bulk {n}') for n in range(count)
+            ])
+            tracemalloc.start()
+            try:
+                for _line in export_lines(
+                    Task.objects.filter(user=self.user), 'csv', chunk_size=100
+                ):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak(300), peak(3000)
+        self.assertLess(large, small * 2)
+
+    def test_export_command(self):
+        """Test the command streams one user's tasks to stdout or a file"""
+        out = StringIO()
+        call_command('export_tasks', '--user', 'testuser', '--format',
+                     'ndjson', stdout=out)
+        count = Task.objects.filter(user=self.user).count()
+        self.assertEqual(len(out.getvalue().splitlines()), count)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tasks.csv')
+            call_command('export_tasks', '--output', path, stdout=out)
+            with open(path, newline='', encoding='utf-8') as exported:
+                rows = list(csv.DictReader(exported))
+        self.assertEqual(len(rows), Task.objects.count())
+        self.assertIn(f'Exported {len(rows)} tasks', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('export_tasks', '--user', 'nobody', stdout=out)
+
+
+class TaskImportTest(TestCase):
+    """Test cases for CSV and JSON task imports"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.client.login(username='testuser', password='testpass123')
+
+    def _upload(self, name, content):
+        return self.client.post(reverse('task-import'), {
+            'file': SimpleUploadedFile(name, content.encode()),
+        }, follow=True)
+
+    def test_csv_import(self):
+        """Test a CSV upload creates tasks, categories and notes"""
+        Category.objects.create(user=self.user, name='Work')
+        response = self._upload('tasks.csv', (
+            'title,priority,is_completed,due_date,category,notes\r\n'
+            'Report,high,False,2025-03-01,Work,"First\nSecond"\r\n'
+            'Groceries,,true,,Home,\r\n'
+        ))
+        job = ImportJob.objects.get()
+        self.assertRedirects(
+            response, reverse('task-import-status', args=[job.pk])
+        )
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.imported_count, 2)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(bytes(job.data), b'')
+
+        report = Task.objects.get(title='Report')
+        self.assertEqual(report.priority, 'high')
+        self.assertEqual(report.due_date, date(2025, 3, 1))
+        self.assertEqual(report.category.name, 'Work')
+        self.assertEqual(
+            list(report.notes.order_by('pk').values_list(
+                'content', flat=True
+            )),
+            ['First', 'Second']
+        )
+        groceries = Task.objects.get(title='Groceries')
+        self.assertTrue(groceries.is_completed)
+        self.assertEqual(groceries.priority, 'medium')
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+        # Denormalized data skipped by bulk_create is kept in sync
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+        self.assertEqual(
+            TaskVisibility.objects.filter(user=self.user).count(), 2
+        )
+        self.assertContains(response, '2</span> of')
+
+    def test_json_array_and_ndjson(self):
+        """Test JSON arrays and one-object-per-line files both import"""
+        self._upload('tasks.json', json.dumps([
+            {'title': 'One', 'notes': ['A note']},
+            {'title': 'Two', 'recurrence': 'weekly',
+             'due_date': str(timezone.localdate())},
+        ]))
+        self._upload('tasks.ndjson', '{"title": "Three"}\n{"title": "Four"}\n')
+        self.assertEqual(
+            set(Task.objects.filter(series=None).values_list(
+                'title', flat=True
+            )),
+            {'One', 'Two', 'Three', 'Four'}
+        )
+        rule = RecurringTask.objects.get()
+        self.assertEqual(rule.task.title, 'Two')
+        # The rule's occurrences are materialized like any other rule's
+        self.assertTrue(Task.objects.filter(series=rule).exists())
+
+    def test_row_errors_are_reported(self):
+        """Test invalid rows are skipped and listed by row number"""
+        self._upload('tasks.csv', (
+            'title,priority,due_date\n'
+            'Good,low,\n'
+            ',urgent,\n'
+            'Bad date,,31/01/2025\n'
+        ))
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.row_count, 3)
+        self.assertEqual(job.imported_count, 1)
+        self.assertEqual(job.error_count, 2)
+        self.assertEqual([error['row'] for error in job.errors], [2, 3])
+        self.assertEqual(len(job.errors[0]['errors']), 2)
+        self.assertTrue(Task.objects.filter(title='Good').exists())
+
+    def test_invalid_json_fails_the_job(self):
+        """Test a malformed file fails the job but keeps earlier rows"""
+        self._upload('tasks.json', '[{"title": "Kept"}, {"title": ')
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertIn('Invalid JSON', job.message)
+        self.assertEqual(job.imported_count, 1)
+
+    def test_unsupported_file_is_rejected(self):
+        """Test uploads with an unknown extension are refused"""
+        response = self._upload('tasks.xml', '<tasks/>')
+        self.assertContains(response, 'Upload a .csv, .json or .ndjson file.')
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_categories_resolved_once_per_batch(self):
+        """Test a batch costs the same queries for 10 or 100 categories"""
+        def queries(count):
+            rows = [
+                clean_record(self.user, {
+                    'title': f'Task {n}', 'category': f'Category {count} {n}'
+                })
+                for n in range(count)
+            ]
+            with CaptureQueriesContext(connection) as captured:
+                import_batch(self.user, rows)
+            return len(captured)
+
+        self.assertEqual(queries(10), queries(100))
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 110)
+
+    def test_export_round_trip(self):
+        """Test an export can be imported again"""
+        category = Category.objects.create(user=self.user, name='Work')
+        task = Task.objects.create(
+            user=self.user, title='Write, "quoted" report', priority='high',
+            category=category, is_completed=True
+        )
+        TaskNote.objects.create(task=task, content='First')
+        body = b''.join(
+            self.client.get(
+                reverse('task-export'), {'format': 'csv'}
+            ).streaming_content
+        ).decode()
+        task.delete()
+
+        self._upload('export.csv', body)
+        imported = Task.objects.get()
+        self.assertEqual(imported.title, 'Write, "quoted" report')
+        self.assertEqual(imported.priority, 'high')
+        self.assertTrue(imported.is_completed)
+        self.assertEqual(imported.category, category)
+        self.assertEqual(imported.notes.get().content, 'First')
+
+    @mock.patch('tasks.views.INLINE_IMPORT_BYTES', 0)
+    def test_large_upload_runs_in_background(self):
+        """Test large uploads are queued and run by process_imports"""
+        lines = ''.join(f'{{"title": "Task {n}"}}\n' for n in range(25))
+        self._upload('tasks.ndjson', lines)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.PENDING)
+        self.assertFalse(Task.objects.exists())
+
+        status_url = reverse('task-import-status', args=[job.pk])
+        response = self.client.get(status_url)
+        self.assertContains(response, 'data-poll-url')
+
+        out = StringIO()
+        call_command('process_imports', stdout=out)
+        self.assertIn('Ran 1 imports', out.getvalue())
+        self.assertEqual(Task.objects.count(), 25)
+
+        data = self.client.get(status_url, {'format': 'json'}).json()
+        self.assertEqual(data['status'], ImportJob.DONE)
+        self.assertEqual(data['imported'], 25)
+        self.assertEqual(data['progress'], 100)
+
+    def test_inline_import_is_never_claimed(self):
+        """Test a job run during the request is not left for the worker"""
+        with mock.patch('tasks.views.run_import') as run:
+            self._upload('tasks.csv', 'title\nInline\n')
+        job = ImportJob.objects.get()
+        run.assert_called_once_with(job)
+        self.assertEqual(job.status, ImportJob.RUNNING)
+        self.assertIsNone(claim_import_job())
+
+    def test_unexpected_error_fails_only_that_job(self):
+        """Test a crashing job is failed and the worker moves on"""
+        jobs = [
+            ImportJob.objects.create(
+                user=self.user, file_name='tasks.ndjson', format='json',
+                data=b'{"title": "Task"}\n', size=18,
+            )
+            for _ in range(2)
+        ]
+        with mock.patch(
+            'tasks.importer.import_batch',
+            side_effect=[RuntimeError('boom'), None]
+        ), self.assertLogs('tasks.importer', 'ERROR'):
+            self.assertEqual(process_pending_imports(), 2)
+
+        failed, done = ImportJob.objects.order_by('pk')
+        self.assertEqual(failed.pk, jobs[0].pk)
+        self.assertEqual(failed.status, ImportJob.FAILED)
+        self.assertIn('unexpected error', failed.message)
+        self.assertEqual(bytes(failed.data), b'')
+        self.assertIsNotNone(failed.finished_at)
+        self.assertEqual(done.status, ImportJob.DONE)
+
+    def test_progress_saved_per_batch(self):
+        """Test progress is recorded after every batch"""
+        job = ImportJob.objects.create(
+            user=self.user, file_name='tasks.ndjson', format='json',
+            data=''.join(
+                f'{{"title": "Task {n}"}}\n' for n in range(5)
+            ).encode(),
+        )
+        job.size = len(job.data)
+        saved = []
+        with mock.patch.object(
+            ImportJob, 'save',
+            lambda job, **kwargs: saved.append(job.imported_count)
+        ):
+            run_import(job, batch_size=2)
+        self.assertEqual(saved, [2, 4, 5, 5])
+
+    def test_status_is_private(self):
+        """Test users can't see other users' imports"""
+        other = User.objects.create_user(username='other', password='x')
+        job = ImportJob.objects.create(
+            user=other, file_name='tasks.csv', format='csv'
+        )
+        response = self.client.get(
+            reverse('task-import-status', args=[job.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TASK_LIST_CACHE=True)
+class TaskListCacheTest(TestCase):
+    """Test cases for the per-user task list cache"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.task = Task.objects.create(
+            user=self.user, title='Cached task', category=self.category
+        )
+        self.client.login(username='testuser', password='testpass123')
+        reset_cache_stats()
+
+    def _list(self, **params):
+        return self.client.get(reverse('task-list'), params)
+
+    def test_repeat_request_is_served_from_cache(self):
+        """Test a repeated list request skips the list queries"""
+        with CaptureQueriesContext(connection) as miss:
+            self._list()
+        with CaptureQueriesContext(connection) as hit:
+            response = self._list()
+        self.assertContains(response, 'Cached task')
+        self.assertLess(len(hit), len(miss))
+        self.assertFalse(any(
+            'tasks_task' in query['sql'] for query in hit.captured_queries
+        ))
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_filters_are_cached_separately(self):
+        """Test each filter combination has its own entry"""
+        self._list()
+        response = self._list(status='completed')
+        self.assertNotContains(response, 'Cached task')
+        self.assertEqual(cache_stats()['misses'], 2)
+
+    def test_writes_invalidate(self):
+        """Test view writes and direct saves both bump the generation"""
+        self._list()
+        self.client.post(reverse('task-create'), {'title': 'New task'})
+        self.assertContains(self._list(), 'New task')
+
+        self.task.title = 'Renamed task'
+        self.task.save()
+        self.assertContains(self._list(), 'Renamed task')
+
+        self.category.name = 'Office'
+        self.category.save()
+        self.assertContains(self._list(), 'Office')
+
+        self.client.post(reverse('task-delete', args=[self.task.pk]))
+        self.assertNotContains(self._list(), 'Select Renamed task')
+
+    def test_note_changes_invalidate(self):
+        """Test notes reach cached search results"""
+        self.assertNotContains(self._list(search='slides'), 'Select ')
+        note = TaskNote.objects.create(task=self.task, content='Slides')
+        self.assertContains(self._list(search='slides'), 'Select ')
+        note.delete()
+        self.assertNotContains(self._list(search='slides'), 'Select ')
+
+    def test_admin_writes_invalidate(self):
+        """Test admin changes reach the cached list"""
+        self._list()
+        User.objects.create_superuser(
+            username='admin', password='adminpass123'
+        )
+        admin = Client()
+        admin.login(username='admin', password='adminpass123')
+        admin.post(reverse('admin:tasks_task_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [self.task.pk],
+            'post': 'yes',
+        })
+        self.assertFalse(Task.objects.filter(pk=self.task.pk).exists())
+        self.assertNotContains(self._list(), 'Cached task')
+
+    def test_bulk_writes_invalidate(self):
+        """Test bulk actions and category deletes reach the cached list"""
+        self._list()
+        apply_bulk_action(self.user, 'complete', [self.task.pk])
+        self.assertNotContains(self._list(status='pending'), 'Cached task')
+        self._list(status='completed')
+
+        self.client.post(
+            reverse('category-delete', args=[self.category.pk])
+        )
+        response = self._list(status='completed')
+        self.assertNotContains(response, 'bg-info">Work')
+
+    def test_owner_writes_invalidate_shared_lists(self):
+        """Test a sharee's cached list sees the owner's changes"""
+        other = User.objects.create_user(username='other', password='x')
+        UserProfile.objects.create(user=other)
+        SharedTaskList.objects.create(
+            task=self.task, shared_with_user=other,
+            permission_level='view_only'
+        )
+        sharee = Client()
+        sharee.login(username='other', password='x')
+        sharee.get(reverse('task-list'))
+        before = generation(other.pk)
+
+        self.task.title = 'Changed by owner'
+        self.task.save()
+        self.assertGreater(generation(other.pk), before)
+        self.assertContains(
+            sharee.get(reverse('task-list')), 'Changed by owner'
+        )
+
+    def test_stats_command(self):
+        """Test the command reports and resets the hit ratio"""
+        self._list()
+        self._list()
+        out = StringIO()
+        call_command('task_list_cache_stats', '--reset', stdout=out)
+        self.assertIn('1 hits, 1 misses (50.0% hit ratio)', out.getvalue())
+        self.assertEqual(cache_stats()['hits'], 0)
+
+    def test_stats_add_up_every_process(self):
+        """Test hits and misses recorded by other workers are reported"""
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(METRICS_DIR=directory):
+                worker = MetricsFile(os.path.join(directory, 'worker.db'))
+                worker.add(_key('planit_task_list_cache_hits_total', {}), 3)
+                worker.close()
+                self._list()
+                self.assertEqual(cache_stats()['hits'], 3)
+                self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_not_used_without_a_shared_cache(self):
+        """Test every request builds the list when the cache isn't shared"""
+        with self.settings(TASK_LIST_CACHE=False):
+            self._list()
+            with CaptureQueriesContext(connection) as ctx:
+                self._list()
+        self.assertTrue(any(
+            'tasks_task' in query['sql'] for query in ctx.captured_queries
+        ))
+        self.assertEqual(cache_stats()['misses'], 0)
+
+
+class TaskCardFragmentTest(TestCase):
+    """Test cases for cached task card fragments"""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.task = Task.objects.create(
+            user=self.user, title='Card <csrf-token> task',
+            category=self.category
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _cards(self, user=None):
+        tasks = list(
+            Task.objects.visible_to(user or self.user).for_list()
+        )
+        request = self.client.get(reverse('task-list')).wsgi_request
+        return tasks, render_task_cards(request, tasks)
+
+    def test_csrf_token_is_injected_after_lookup(self):
+        """Test cards carry a working token that is never cached"""
+        response = self.client.get(reverse('task-list'))
+        self.assertNotContains(response, str(CSRF_SLOT))
+        toggle_form = response.content.decode().split(
+            reverse('task-toggle', args=[self.task.pk])
+        )[1]
+        token = re.search(
+            r'csrfmiddlewaretoken" value="(\w+)"', toggle_form
+        )[1]
+        # The title is escaped, so it can't be mistaken for the slot
+        self.assertContains(response, 'Card &lt;csrf-token&gt; task')
+        cached = cache.get(card_key(response.context['tasks'][0]))
+        self.assertIn(str(CSRF_SLOT), cached)
+        self.assertNotIn(str(token), cached)
+
+        toggle = self.client.post(
+            reverse('task-toggle', args=[self.task.pk]),
+            {'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(toggle.status_code, 302)
+        self.task.refresh_from_db()
+        self.assertTrue(self.task.is_completed)
+
+    def test_cards_are_rendered_once(self):
+        """Test a cached card is not rendered again"""
+        self._cards()
+        with mock.patch('tasks.fragments.get_template') as get_template:
+            get_template.return_value.render.side_effect = AssertionError
+            _tasks, cards = self._cards()
+        self.assertIn('Card &lt;csrf-token&gt; task', cards[0])
+
+    def test_key_follows_what_the_card_shows(self):
+        """Test edits, renames and access levels change the key"""
+        tasks, _cards = self._cards()
+        key = card_key(tasks[0])
+
+        self.category.name = 'Office'
+        self.category.save()
+        tasks, cards = self._cards()
+        self.assertNotEqual(card_key(tasks[0]), key)
+        self.assertIn('Office', cards[0])
+
+        key = card_key(tasks[0])
+        self.task.refresh_from_db()
+        self.task.title = 'Edited'
+        self.task.save()
+        tasks, cards = self._cards()
+        self.assertNotEqual(card_key(tasks[0]), key)
+        self.assertIn('Edited', cards[0])
+
+        other = User.objects.create_user(username='other', password='x')
+        SharedTaskList.objects.create(
+            task=self.task, shared_with_user=other,
+            permission_level='view_only'
+        )
+        _tasks, cards = self._cards(other)
+        self.assertIn('(view only)', cards[0])
+        self.assertNotIn('Delete', cards[0])
+
+
+class ProfilingTest(TestCase):
+    """Test cases for the request profiling middleware"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        Task.objects.create(user=self.user, title='Profiled task')
+        flush()
+        clear_buffer()
+
+    def _profiled_client(self):
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_recorded(self):
+        """Test a sampled request gets Server-Timing and is aggregated"""
+        client = self._profiled_client()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('task-list'))
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn(f'sql;desc="{len(queries)} queries"', timing)
+        self.assertIn('template;dur=', timing)
+        client.get(reverse('task-list'))
+
+        flush()
+        rows = {row['view']: row for row in summarize(read_buffer())}
+        row = rows['task-list']
+        self.assertEqual(row['count'], 2)
+        self.assertGreater(row['avg_template_ms'], 0)
+        self.assertGreaterEqual(row['max_sql_count'], row['avg_sql_count'])
+        self.assertGreaterEqual(row['total_wall_ms'], row['max_wall_ms'])
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_skipped(self):
+        """Test requests outside the sample are left alone"""
+        response = self._profiled_client().get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+        flush()
+        self.assertEqual(read_buffer(), [])
+
+    def test_disabled_by_default(self):
+        """Test the middleware is unused unless enabled"""
+        response = self._profiled_client().get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_report_is_staff_only(self):
+        """Test only staff can view and clear the report"""
+        client = self._profiled_client()
+        response = client.get(reverse('profiling'))
+        self.assertEqual(response.status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        with override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0
+        ):
+            client = self._profiled_client()
+            client.get(reverse('task-list'))
+            response = client.get(reverse('profiling'))
+        self.assertContains(response, 'task-list')
+
+        response = client.post(reverse('profiling'), {'clear': ''})
+        self.assertRedirects(
+            response, reverse('profiling'), fetch_redirect_response=False
+        )
+        self.assertEqual(read_buffer(), [])
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+    def test_dump_profile_command(self):
+        """Test the dump_profile management command"""
+        self._profiled_client().get(reverse('task-list'))
+        flush()
+        out = StringIO()
+        call_command('dump_profile', '--json', stdout=out)
+        rows = json.loads(out.getvalue())
+        self.assertEqual([row['view'] for row in rows], ['task-list'])
+
+        out = StringIO()
+        call_command('dump_profile', '--clear', stdout=out)
+        self.assertIn('task-list: 1 requests', out.getvalue())
+        self.assertEqual(read_buffer(), [])
+
+
+class AsyncViewTest(TestCase):
+    """Test cases for the async read-only views"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        self.category = Category.objects.create(user=self.user, name='Work')
+        self.task = Task.objects.create(
+            user=self.user, title='Async task', category=self.category
+        )
+        self.other = User.objects.create_user(username='other', password='x')
+        self.hidden = Task.objects.create(user=self.other, title='Hidden')
+
+    async def _client(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        return client
+
+    async def test_task_list(self):
+        """Test the list page renders the tasks, stats and categories"""
+        client = await self._client()
+        response = await client.get(reverse('task-list'))
+        self.assertContains(response, 'Async task')
+        self.assertNotContains(response, 'Hidden')
+        self.assertEqual(response.context['total_tasks'], 1)
+        self.assertEqual(
+            [c.name for c in response.context['categories']], ['Work']
+        )
+
+        response = await client.get(
+            reverse('task-list'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertContains(response, 'Async task')
+
+    async def test_task_detail(self):
+        """Test the detail page of a visible and a hidden task"""
+        client = await self._client()
+        response = await client.get(
+            reverse('task-detail', args=[self.task.pk])
+        )
+        self.assertContains(response, 'Async task')
+        self.assertContains(response, 'Work')
+        response = await client.get(
+            reverse('task-detail', args=[self.hidden.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_category_list(self):
+        """Test the category page lists the user's categories"""
+        client = await self._client()
+        response = await client.get(reverse('category-list'))
+        self.assertContains(response, 'Work')
+
+    async def test_login_required(self):
+        """Test anonymous requests are sent to the login page"""
+        for url in (reverse('task-list'), reverse('category-list'),
+                    reverse('task-detail', args=[self.task.pk])):
+            response = await AsyncClient().get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(reverse('login'), response.url)
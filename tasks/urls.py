@@ -1,8 +1,12 @@
 from django.urls import path
 from .views import (
     task_list, task_detail, task_create, task_update, task_delete, task_toggle,
+    task_bulk, task_export, task_import, task_import_status, task_suggest,
+    task_agenda,
     category_list, category_create, category_update, category_delete
 )
+from .api import api_list, api_detail, api_sync
+from .profiling import profiling_report
 
 urlpatterns = [
     # Web interface URLs
@@ -12,6 +16,16 @@ urlpatterns = [
     path('tasks/<int:pk>/edit/', task_update, name='task-update'),
     path('tasks/<int:pk>/delete/', task_delete, name='task-delete'),
     path('tasks/<int:pk>/toggle/', task_toggle, name='task-toggle'),
+    path('tasks/bulk/', task_bulk, name='task-bulk'),
+    path('tasks/suggest/', task_suggest, name='task-suggest'),
+    path('tasks/agenda/', task_agenda, name='task-agenda'),
+    path('tasks/export/', task_export, name='task-export'),
+    path('tasks/import/', task_import, name='task-import'),
+    path(
+        'tasks/import/<int:pk>/',
+        task_import_status,
+        name='task-import-status'
+    ),
 
     # Category management URLs
     path('categories/', category_list, name='category-list'),
@@ -22,4 +36,16 @@ urlpatterns = [
         category_delete,
         name='category-delete'
     ),
+
+    # Staff diagnostics
+    path('profiling/', profiling_report, name='profiling'),
+
+    # JSON API, versioned by URL prefix
+    path('api/v1/sync/', api_sync, name='api-sync'),
+    path('api/v1/<str:resource>/', api_list, name='api-list'),
+    path(
+        'api/v1/<str:resource>/<int:pk>/',
+        api_detail,
+        name='api-detail'
+    ),
 ]
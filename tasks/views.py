@@ -1,23 +1,92 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import (
+    render, redirect, get_object_or_404, aget_object_or_404
+)
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import models
-from django.db.models import Case, When
-from .models import Task, Category
-
-
-# Template-based views for web interface
-@login_required
-def task_list(request):
-    """Display list of tasks with filtering"""
-    tasks = Task.objects.filter(user=request.user)
-    categories = Category.objects.filter(user=request.user)
-
-    # Get filter parameters
-    status_filter = request.GET.get('status', 'all')
-    priority_filter = request.GET.get('priority', '')
-    category_filter = request.GET.get('category', '')
-    search_query = request.GET.get('search', '')
+from django.core.exceptions import PermissionDenied
+import json
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Value
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from .models import Task, Category, ImportJob
+from .bulk import apply_bulk_action, InvalidBulkAction
+from .export import FORMATS as EXPORT_FORMATS, export_lines
+from .fragments import render_task_cards
+from .importer import (
+    INLINE_IMPORT_BYTES, MAX_IMPORT_BYTES, create_import_job, import_format,
+    run_import,
+)
+from .cache import acached_list, invalidate_category
+from .pagination import KeysetPage, KeysetPaginator, InvalidCursor
+from .stats import atask_stats, categories_with_counts
+from .search import get_search_backend
+from .suggest import suggest
+from .visibility import OWNER, EDIT_ACCESS
+
+TASKS_PER_PAGE = 25
+SUGGESTIONS_LIMIT = 8
+SUGGESTIONS_MAX = 20
+PRIORITIES = dict(Task.PRIORITY_CHOICES)
+AGENDA_DAYS = 7
+AGENDA_MAX_DAYS = 366 * 5
+# Ranges longer than this are streamed one day at a time
+AGENDA_STREAM_DAYS = 31
+AGENDA_CHUNK_SIZE = 2000
+
+
+def _priority_from(data):
+    """Return a valid priority from submitted data, defaulting to medium"""
+    priority = data.get('priority', 'medium')
+    return priority if priority in PRIORITIES else 'medium'
+
+
+def _editable_task(request, pk):
+    """Return a task the user owns or may edit through a share"""
+    task = get_object_or_404(Task.objects.visible_to(request.user), pk=pk)
+    if task.access not in EDIT_ACCESS:
+        raise PermissionDenied
+    return task
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _auser(request):
+    """Return the signed-in user in an async view.
+
+    The user is also set as request.user, so the sync code the view hands
+    off to (templates, context processors) doesn't look it up again.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def _arender(request, template_name, context):
+    # Templates may follow relations lazily, which the ORM only allows
+    # outside the event loop
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def _task_list_paginator(user, status_filter, priority_filter,
+                         category_filter, search_query):
+    """Return a paginator over the tasks matching the list filters"""
+    if search_query:
+        # The search index is scoped per owner, so search own tasks only
+        tasks = Task.objects.for_user(user).annotate(
+            access=Value(OWNER)
+        ).for_list()
+    else:
+        tasks = Task.objects.visible_to(user).for_list()
 
     # Apply filters
     if status_filter == 'completed':
@@ -26,56 +95,248 @@ def task_list(request):
         tasks = tasks.filter(is_completed=False)
 
     if priority_filter:
-        tasks = tasks.filter(priority=priority_filter)
+        if priority_filter in PRIORITIES:
+            tasks = tasks.filter(priority=priority_filter)
+        else:
+            tasks = tasks.none()
 
     if category_filter:
         tasks = tasks.filter(category_id=category_filter)
 
+    # Search results are ordered by relevance, everything else by
+    # priority (stored high=1 > medium > low) and then by due_date
+    order_keys = ('priority', 'due_date', 'id')
     if search_query:
-        tasks = tasks.filter(title__icontains=search_query)
-
-    # Calculate stats
-    total_tasks = Task.objects.filter(user=request.user).count()
-    pending_tasks = Task.objects.filter(
-        user=request.user, is_completed=False
-    ).count()
-    completed_tasks = Task.objects.filter(
-        user=request.user, is_completed=True
-    ).count()
-
-    # Order tasks by priority (high > medium > low) and then by due_date
-    priority_order = Case(
-        When(priority='high', then=1),
-        When(priority='medium', then=2),
-        When(priority='low', then=3),
-        default=2,
-        output_field=models.IntegerField(),
+        tasks = get_search_backend().filter(tasks, user, search_query)
+        order_keys = ('search_rank', 'id')
+
+    # Keyset pagination on the list ordering; never uses OFFSET
+    return KeysetPaginator(
+        tasks,
+        keys=order_keys,
+        per_page=TASKS_PER_PAGE
     )
 
-    tasks = tasks.annotate(priority_order=priority_order).order_by(
-        'priority_order',
-        'due_date'
+
+async def _apage(paginator, cursor):
+    try:
+        return await paginator.apage(cursor)
+    except InvalidCursor:
+        return await paginator.apage()
+
+
+async def _task_list_data(user, status_filter, priority_filter,
+                          category_filter, search_query, cursor):
+    """Query everything the task list page shows, concurrently"""
+    # Search backends may look things up while building the filter
+    paginator = await sync_to_async(_task_list_paginator)(
+        user, status_filter, priority_filter, category_filter, search_query
+    )
+    page, categories, stats = await asyncio.gather(
+        _apage(paginator, cursor),
+        _alist(Category.objects.filter(user=user)),
+        # Calculate stats in a single aggregate query
+        atask_stats(user),
+    )
+    return {
+        'tasks': page.object_list,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'categories': categories,
+        'stats': stats,
+    }
+
+
+# Template-based views for web interface
+# The read-only pages are async, so under ASGI they don't hold a thread
+# while waiting on the database.
+@login_required
+async def task_list(request):
+    """Display list of tasks with filtering"""
+    user = await _auser(request)
+    # Get filter parameters
+    status_filter = request.GET.get('status', 'all')
+    priority_filter = request.GET.get('priority', '')
+    category_filter = request.GET.get('category', '')
+    search_query = request.GET.get('search', '')
+    params = (
+        status_filter, priority_filter, category_filter, search_query,
+        request.GET.get('cursor'),
     )
 
+    data = await acached_list(
+        user.pk, params, lambda: _task_list_data(user, *params)
+    )
+    page = KeysetPage(
+        data['tasks'], data['next_cursor'], data['prev_cursor']
+    )
     context = {
-        'tasks': tasks,
-        'categories': categories,
+        'tasks': page.object_list,
+        'cards': await sync_to_async(render_task_cards)(
+            request, page.object_list
+        ),
+        'page': page,
+        'categories': data['categories'],
         'status': status_filter,
         'priority': priority_filter,
         'category': category_filter,
         'search': search_query,
-        'total_tasks': total_tasks,
-        'pending_tasks': pending_tasks,
-        'completed_tasks': completed_tasks,
+        **data['stats'],
+    }
+    return await _arender(request, 'tasks/task_list.html', context)
+
+
+@login_required
+def task_suggest(request):
+    """Return JSON title and category suggestions for a search prefix"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', SUGGESTIONS_LIMIT))
+    except ValueError:
+        limit = SUGGESTIONS_LIMIT
+    limit = max(1, min(limit, SUGGESTIONS_MAX))
+
+    results = []
+    for item in suggest(request.user.pk, query, limit) if query else []:
+        if item['type'] == 'task':
+            url = reverse('task-detail', args=[item['id']])
+        else:
+            url = f"{reverse('task-list')}?category={item['id']}"
+        results.append({**item, 'url': url})
+
+    return JsonResponse({'query': query, 'results': results})
+
+
+def _agenda_range(params):
+    """Return (start, end) from the query string, or None if invalid"""
+    try:
+        start = params.get('start')
+        start = date.fromisoformat(start) if start else timezone.localdate()
+        end = params.get('end')
+        end = (
+            date.fromisoformat(end) if end
+            else start + timedelta(days=AGENDA_DAYS - 1)
+        )
+    except ValueError:
+        return None
+    if end < start or (end - start).days >= AGENDA_MAX_DAYS:
+        return None
+    return start, end
+
+
+def _agenda_chunks(rows, user, start, end):
+    """Yield the agenda JSON document in pieces, one day per piece"""
+    yield '{"start": "%s", "end": "%s", "days": [' % (start, end)
+    # One reverse() per response rather than one per task
+    detail_url = reverse('task-detail', args=[0]).replace('/0/', '/%d/')
+    rows = rows.iterator(chunk_size=AGENDA_CHUNK_SIZE)
+    for position, (day, day_rows) in enumerate(
+        groupby(rows, key=itemgetter('due_date'))
+    ):
+        items = [{
+            'id': row['id'],
+            'title': row['title'],
+            'priority': row['priority'],
+            'is_completed': row['is_completed'],
+            'category': row['category_name'],
+            'shared': row['user_id'] != user.pk,
+            'url': detail_url % row['id'],
+        } for row in day_rows]
+        yield (', ' if position else '') + json.dumps(
+            {'date': day.isoformat(), 'tasks': items}
+        )
+    yield ']}'
+
+
+@login_required
+def task_agenda(request):
+    """Return JSON of owned and shared tasks due in a range, by day"""
+    date_range = _agenda_range(request.GET)
+    if date_range is None:
+        return JsonResponse(
+            {'error': 'Invalid date range; use ISO start and end dates.'},
+            status=400
+        )
+    start, end = date_range
+    rows = Task.objects.for_agenda(request.user, start, end)
+    chunks = _agenda_chunks(rows, request.user, start, end)
+
+    if (end - start).days + 1 > AGENDA_STREAM_DAYS:
+        return StreamingHttpResponse(chunks, content_type='application/json')
+    return HttpResponse(''.join(chunks), content_type='application/json')
+
+
+@login_required
+def task_export(request):
+    """Stream all of the user's tasks as CSV or NDJSON"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse(
+            {'error': 'Invalid format; use csv or ndjson.'}, status=400
+        )
+    response = StreamingHttpResponse(
+        export_lines(Task.objects.for_user(request.user), export_format),
+        content_type=EXPORT_FORMATS[export_format]
+    )
+    filename = f'planit-tasks-{timezone.localdate()}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def task_import(request):
+    """Upload a CSV or JSON file of tasks to import"""
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Choose a file to import.')
+        elif import_format(upload.name) is None:
+            messages.error(request, 'Upload a .csv, .json or .ndjson file.')
+        elif upload.size > MAX_IMPORT_BYTES:
+            limit = MAX_IMPORT_BYTES // (1024 * 1024)
+            messages.error(request, f'Files can be at most {limit} MB.')
+        else:
+            # Small files are imported right away; larger ones are left
+            # for the process_imports worker
+            inline = upload.size <= INLINE_IMPORT_BYTES
+            job = create_import_job(request.user, upload, inline=inline)
+            if inline:
+                run_import(job)
+            return redirect('task-import-status', pk=job.pk)
+
+    context = {
+        'jobs': ImportJob.objects.filter(user=request.user).defer('data')[:5],
+        'max_megabytes': MAX_IMPORT_BYTES // (1024 * 1024),
     }
-    return render(request, 'tasks/task_list.html', context)
+    return render(request, 'tasks/task_import.html', context)
 
 
 @login_required
-def task_detail(request, pk):
+def task_import_status(request, pk):
+    """Show the progress of an import; ?format=json for polling"""
+    job = get_object_or_404(
+        ImportJob.objects.defer('data'), pk=pk, user=request.user
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'rows': job.row_count,
+            'imported': job.imported_count,
+            'errors': job.error_count,
+            'message': job.message,
+        })
+    return render(request, 'tasks/task_import_status.html', {'job': job})
+
+
+@login_required
+async def task_detail(request, pk):
     """Display task details"""
-    task = get_object_or_404(Task, pk=pk, user=request.user)
-    return render(request, 'tasks/task_detail.html', {'task': task})
+    user = await _auser(request)
+    task = await aget_object_or_404(
+        Task.objects.visible_to(user).for_detail(), pk=pk
+    )
+    return await _arender(request, 'tasks/task_detail.html', {'task': task})
 
 
 @login_required
@@ -86,18 +347,20 @@ def task_create(request):
     if request.method == 'POST':
         title = request.POST.get('title')
         description = request.POST.get('description')
-        priority = request.POST.get('priority', 'medium')
+        priority = _priority_from(request.POST)
         due_date = request.POST.get('due_date') or None
         category_id = request.POST.get('category') or None
 
-        task = Task.objects.create(
-            user=request.user,
-            title=title,
-            description=description,
-            priority=priority,
-            due_date=due_date,
-            category_id=category_id
-        )
+        # Task counters are updated by signal inside the same transaction
+        with transaction.atomic():
+            task = Task.objects.create(
+                user=request.user,
+                title=title,
+                description=description,
+                priority=priority,
+                due_date=due_date,
+                category_id=category_id
+            )
 
         messages.success(request, f'Task "{task.title}" created successfully!')
         return redirect('task-list')
@@ -113,17 +376,23 @@ def task_create(request):
 @login_required
 def task_update(request, pk):
     """Update an existing task"""
-    task = get_object_or_404(Task, pk=pk, user=request.user)
-    categories = Category.objects.filter(user=request.user)
+    task = _editable_task(request, pk)
+    # Categories belong to the owner, so only the owner can change them
+    is_owner = task.access == OWNER
+    categories = (
+        Category.objects.filter(user=request.user) if is_owner else []
+    )
 
     if request.method == 'POST':
         task.title = request.POST.get('title')
         task.description = request.POST.get('description')
-        task.priority = request.POST.get('priority', 'medium')
+        task.priority = _priority_from(request.POST)
         task.due_date = request.POST.get('due_date') or None
-        task.category_id = request.POST.get('category') or None
+        if is_owner:
+            task.category_id = request.POST.get('category') or None
         task.is_completed = 'is_completed' in request.POST
-        task.save()
+        with transaction.atomic():
+            task.save()
 
         messages.success(request, f'Task "{task.title}" updated successfully!')
         return redirect('task-detail', pk=task.pk)
@@ -151,7 +420,8 @@ def task_delete(request, pk):
 
     if request.method == 'POST':
         title = task.title
-        task.delete()
+        with transaction.atomic():
+            task.delete()
         messages.success(request, f'Task "{title}" deleted successfully!')
         return redirect('task-list')
 
@@ -161,11 +431,12 @@ def task_delete(request, pk):
 @login_required
 def task_toggle(request, pk):
     """Toggle task completion status"""
-    task = get_object_or_404(Task, pk=pk, user=request.user)
+    task = _editable_task(request, pk)
 
     if request.method == 'POST':
         task.is_completed = not task.is_completed
-        task.save()
+        with transaction.atomic():
+            task.save()
 
         status_msg = 'completed' if task.is_completed else 'marked as pending'
         messages.success(request, f'Task "{task.title}" {status_msg}!')
@@ -174,15 +445,47 @@ def task_toggle(request, pk):
     return redirect(request.META.get('HTTP_REFERER', 'task-list'))
 
 
+@login_required
+def task_bulk(request):
+    """Apply one action to many selected tasks"""
+    if request.method != 'POST':
+        return redirect('task-list')
+
+    back = request.META.get('HTTP_REFERER', 'task-list')
+    action = request.POST.get('action', '')
+    try:
+        task_ids = [int(pk) for pk in request.POST.getlist('task_ids')]
+    except ValueError:
+        messages.error(request, 'Invalid task selection.')
+        return redirect(back)
+    try:
+        count = apply_bulk_action(
+            request.user, action, task_ids, request.POST.get(action)
+        )
+    except InvalidBulkAction as error:
+        messages.error(request, str(error))
+        return redirect(back)
+
+    done = {
+        'complete': 'marked as completed',
+        'pending': 'marked as pending',
+        'priority': 'reprioritized',
+        'category': 'recategorized',
+        'delete': 'deleted',
+    }[action]
+    noun = 'task' if count == 1 else 'tasks'
+    messages.success(request, f'{count} {noun} {done}!')
+    return redirect(back)
+
+
 # Category management views
 @login_required
-def category_list(request):
+async def category_list(request):
     """Display list of user's categories with task counts"""
-    categories = Category.objects.filter(user=request.user).annotate(
-        task_count=models.Count('tasks')
-    )
+    user = await _auser(request)
+    categories = await _alist(categories_with_counts(user))
     context = {'categories': categories}
-    return render(request, 'tasks/category_list.html', context)
+    return await _arender(request, 'tasks/category_list.html', context)
 
 
 @login_required
@@ -228,7 +531,8 @@ def category_update(request, pk):
             return redirect('category-update', pk=pk)
 
         category.name = name
-        category.save()
+        # Don't overwrite the denormalized task counters
+        category.save(update_fields=['name', 'updated_at'])
         messages.success(request, f'Category updated to "{name}"!')
         return redirect('category-list')
 
@@ -247,9 +551,14 @@ def category_delete(request, pk):
 
     if request.method == 'POST':
         category_name = category.name
-        # Move tasks without category before deleting
-        Task.objects.filter(category=category).update(category=None)
-        category.delete()
+        # Move tasks without category before deleting; the per-category
+        # counters go with the row and user totals are unchanged
+        with transaction.atomic():
+            # The update skips signals, so drop the cached lists that
+            # show the category first
+            invalidate_category(category)
+            Task.objects.filter(category=category).update(category=None)
+            category.delete()
         messages.success(
             request,
             f'Category "{category_name}" deleted. Associated tasks '
@@ -259,6 +568,6 @@ def category_delete(request, pk):
 
     context = {
         'category': category,
-        'task_count': category.tasks.count()
+        'task_count': category.task_count
     }
     return render(request, 'tasks/category_confirm_delete.html', context)
@@ -0,0 +1,61 @@
+"""Denormalized task visibility.
+
+``TaskVisibility`` holds a row for each task's owner plus one per
+``SharedTaskList`` entry, carrying the access level, so listing what a
+user can see is a single lookup on the (user, task) index. Rows are
+kept in sync by the Task and SharedTaskList signal handlers in
+``tasks.signals``. Bulk writers that skip signals call
+``grant_owners()`` or ``rebuild_visibility()``, and the whole table can
+be rebuilt with ``manage.py rebuild_task_visibility``.
+"""
+from django.db import connection as default_connection, transaction
+
+from .models import TaskVisibility
+
+OWNER = TaskVisibility.OWNER
+# Access levels that allow changing a task
+EDIT_ACCESS = (OWNER, 'editable')
+
+
+def grant(task_id, user_id, access):
+    """Give a user access to a task, replacing any previous level"""
+    TaskVisibility.objects.update_or_create(
+        task_id=task_id, user_id=user_id, defaults={'access': access}
+    )
+
+
+def revoke(task_id, user_id):
+    """Remove a user's access to a task"""
+    TaskVisibility.objects.filter(task_id=task_id, user_id=user_id).delete()
+
+
+def grant_owners(tasks, batch_size=1000):
+    """Add owner rows for (task id, user id) pairs of new tasks"""
+    TaskVisibility.objects.bulk_create(
+        (
+            TaskVisibility(task_id=task_id, user_id=user_id, access=OWNER)
+            for task_id, user_id in tasks
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_visibility(connection=None):
+    """Recreate every visibility row from tasks and shares"""
+    connection = connection or default_connection
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM tasks_taskvisibility')
+            cursor.execute(
+                'INSERT INTO tasks_taskvisibility (user_id, task_id, access) '
+                'SELECT user_id, id, %s FROM tasks_task',
+                [OWNER]
+            )
+            cursor.execute(
+                'INSERT INTO tasks_taskvisibility (user_id, task_id, access) '
+                'SELECT s.shared_with_user_id, s.task_id, s.permission_level '
+                'FROM tasks_sharedtasklist s '
+                'INNER JOIN tasks_task t ON t.id = s.task_id '
+                'WHERE s.shared_with_user_id <> t.user_id'
+            )
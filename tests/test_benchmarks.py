@@ -0,0 +1,403 @@
+"""Query-count, timing and memory regression benchmarks for every URL.
+
+Each URL in tasks/urls.py and planit/urls.py is requested as a user
+seeded with a given number of tasks, and the results are compared with
+tests/benchmark_baseline.json.
+
+Query counts are checked on every test run for the small datasets.
+Wall time and peak memory are only checked in full benchmark mode:
+
+    PLANIT_BENCHMARK=1 python manage.py test tests.test_benchmarks
+
+which also seeds the 100k-task dataset. Set PLANIT_BENCHMARK_UPDATE=1
+to rewrite the baseline from the current results instead of comparing.
+
+Batch recurrence expansion and task card rendering are benchmarked
+against fixed time budgets. Like wall time above, the budgets are only
+checked in full benchmark mode.
+"""
+import json
+import os
+import random
+import time
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from accounts.models import UserProfile
+from tasks.cache import invalidate_users
+from tasks.expansion import expand
+from tasks.fragments import card_key, render_task_cards
+from tasks.models import Task, ImportJob
+from tests.test_fixtures import (
+    create_test_user, create_test_category, create_bulk_tasks
+)
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+FULL_MODE = os.environ.get('PLANIT_BENCHMARK') == '1'
+UPDATE_MODE = os.environ.get('PLANIT_BENCHMARK_UPDATE') == '1'
+ENABLED_SIZES = (10, 1000, 100000) if FULL_MODE else (10, 1000)
+
+# Allowed slowdown before timing or memory counts as a regression, plus
+# absolute slack so tiny baselines don't fail on noise
+TOLERANCE = float(os.environ.get('PLANIT_BENCHMARK_TOLERANCE', '1.5'))
+TIME_SLACK_MS = 5.0
+MEMORY_SLACK_KB = 64.0
+TIMING_REPEATS = 3
+
+# Seconds allowed to expand 100k recurrence rules over a year
+EXPANSION_BUDGET = 1.0
+
+# Milliseconds allowed to render 1,000 task cards, uncached and cached
+CARD_COUNT = 1000
+CARD_RENDER_BUDGET_MS = 1000.0
+CACHED_CARD_BUDGET_MS = 100.0
+
+# Tasks selected for the bulk action case
+BULK_SELECTION = 500
+IMPORT_ROWS = 200
+
+# URL names that are not benchmarked, with the reason
+UNBENCHMARKED = {
+    'logout': 'ends the session the other cases rely on',
+    'profiling': 'staff-only diagnostics page',
+    'metrics': 'scraped by Prometheus rather than used by people',
+}
+
+
+def _task(test):
+    return test.task.pk
+
+
+def _fresh_task(test):
+    return Task.objects.create(user=test.user, title='Disposable').pk
+
+
+def _category(test):
+    return test.category.pk
+
+
+def _api_tasks(test):
+    return ('tasks',)
+
+
+def _api_task(test):
+    return ('tasks', test.task.pk)
+
+
+def _bulk_selection(test):
+    task_ids = list(Task.objects.filter(user=test.user).order_by(
+        'pk'
+    ).values_list('pk', flat=True)[:BULK_SELECTION])
+    return {'action': 'priority', 'priority': 'high', 'task_ids': task_ids}
+
+
+def _import_upload(test):
+    lines = ['title,priority,category']
+    lines += [f'Imported {n},high,Imported' for n in range(IMPORT_ROWS)]
+    return {'file': SimpleUploadedFile(
+        'tasks.csv', '\n'.join(lines).encode()
+    )}
+
+
+def _import_job(test):
+    return ImportJob.objects.create(
+        user=test.user, file_name='tasks.csv', format='csv',
+        status=ImportJob.DONE, errors=[{'row': 1, 'errors': ['bad']}]
+    ).pk
+
+
+# name -> (method, url name, args factory, POST data or data factory).
+# Args factories return one URL argument or a tuple of them.
+CASES = {
+    'task-list': ('get', 'task-list', None, None),
+    'task-list-filtered': ('get', 'task-list', None, None),
+    'task-list-search': ('get', 'task-list', None, None),
+    'task-list-cached': ('get', 'task-list', None, None),
+    'task-detail': ('get', 'task-detail', _task, None),
+    'task-create': ('get', 'task-create', None, None),
+    'task-create-post': (
+        'post', 'task-create', None,
+        {'title': 'Benchmark task', 'priority': 'high'}
+    ),
+    'task-update': ('get', 'task-update', _task, None),
+    'task-update-post': (
+        'post', 'task-update', _task,
+        {'title': 'Benchmark task', 'priority': 'low'}
+    ),
+    'task-delete': ('post', 'task-delete', _fresh_task, None),
+    'task-toggle': ('post', 'task-toggle', _task, None),
+    'task-bulk': ('post', 'task-bulk', None, _bulk_selection),
+    'task-suggest': ('get', 'task-suggest', None, None),
+    'task-agenda': ('get', 'task-agenda', None, None),
+    'task-agenda-year': ('get', 'task-agenda', None, None),
+    'task-export': ('get', 'task-export', None, None),
+    'task-export-ndjson': ('get', 'task-export', None, None),
+    'task-import': ('get', 'task-import', None, None),
+    'task-import-post': ('post', 'task-import', None, _import_upload),
+    'task-import-status': ('get', 'task-import-status', _import_job, None),
+    'api-list': ('get', 'api-list', _api_tasks, None),
+    'api-list-fields': ('get', 'api-list', _api_tasks, None),
+    'api-detail': ('get', 'api-detail', _api_task, None),
+    'api-sync': ('get', 'api-sync', None, None),
+    'category-list': ('get', 'category-list', None, None),
+    'category-create': ('get', 'category-create', None, None),
+    'category-update': ('get', 'category-update', _category, None),
+    'category-delete': ('get', 'category-delete', _category, None),
+    'admin:index': ('get', 'admin:index', None, None),
+    'about': ('get', 'about', None, None),
+    'login': ('get', 'login', None, None),
+    'signup': ('get', 'signup', None, None),
+}
+
+# Cases measured against a cold list cache, as after any write; the
+# task-list-cached case measures a repeat view served from the cache
+COLD_CACHE_CASES = {'task-list', 'task-list-filtered', 'task-list-search'}
+
+QUERY_STRINGS = {
+    'task-list-filtered': '?status=pending&priority=high',
+    'task-list-search': '?search=task',
+    'task-suggest': '?q=ta',
+    'api-list-fields': '?fields=title,due_date&limit=200',
+    'task-export-ndjson': '?format=ndjson',
+    # Seeded due dates fall within 30 days either side of today
+    'task-agenda-year': '?start={}&end={}'.format(
+        date.today() - timedelta(days=30), date.today() + timedelta(days=335)
+    ),
+}
+
+
+def _load_baseline():
+    if BASELINE_PATH.exists():
+        return json.loads(BASELINE_PATH.read_text())
+    return {}
+
+
+def _url_names(patterns, namespace=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = namespace
+            if pattern.namespace:
+                inner = f'{namespace}{pattern.namespace}:'
+            # Only the index of included third-party apps is benchmarked
+            if pattern.namespace:
+                yield f'{inner}index'
+                continue
+            yield from _url_names(pattern.url_patterns, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+class BenchmarkCoverageTest(TestCase):
+    """Test that every named URL has a benchmark case"""
+
+    def test_every_url_is_benchmarked(self):
+        covered = {case[1] for case in CASES.values()}
+        for name in set(_url_names(get_resolver().url_patterns)):
+            if name in UNBENCHMARKED:
+                continue
+            with self.subTest(url=name):
+                self.assertIn(name, covered)
+
+
+class ViewBenchmarkMixin:
+    """Measure every case for a user seeded with `size` tasks"""
+    size = None
+    results = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user()
+        UserProfile.objects.create(user=cls.user)
+        cls.category = create_test_category(cls.user, 'Work')
+        create_bulk_tasks(
+            cls.user, cls.size, categories=[cls.category, None]
+        )
+        cls.task = Task.objects.filter(user=cls.user).earliest('pk')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if UPDATE_MODE and cls.results:
+            baseline = _load_baseline()
+            baseline[str(cls.size)] = cls.results
+            BASELINE_PATH.write_text(
+                json.dumps(baseline, indent=2, sort_keys=True) + '\n'
+            )
+        super().tearDownClass()
+
+    def setUp(self):
+        # Measured as deployed with REDIS_URL, where the list cache is on
+        settings = override_settings(TASK_LIST_CACHE=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = Client()
+        self.client.login(username='testuser', password='testpass123')
+
+    def _prepare(self, case):
+        method, url_name, args, data = CASES[case]
+        url_args = args(self) if args else ()
+        if not isinstance(url_args, tuple):
+            url_args = (url_args,)
+        url = reverse(url_name, args=url_args)
+        if callable(data):
+            data = data(self)
+        if case in COLD_CACHE_CASES:
+            invalidate_users([self.user.pk])
+        return method, url + QUERY_STRINGS.get(case, ''), data
+
+    def _send(self, case, request):
+        method, url, data = request
+        response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400, f'{case} failed')
+        if response.streaming:
+            # Streamed bodies are only produced as they are consumed;
+            # drain without keeping them so memory reflects the view
+            for _chunk in response.streaming_content:
+                pass
+
+    def measure(self, case):
+        """Return (queries, best wall time in ms, peak memory in KB)"""
+        self._send(case, self._prepare(case))  # warm caches
+
+        request = self._prepare(case)
+        with CaptureQueriesContext(connection) as ctx:
+            self._send(case, request)
+        queries = len(ctx.captured_queries)
+
+        timings = []
+        for _ in range(TIMING_REPEATS):
+            request = self._prepare(case)
+            start = time.perf_counter()
+            self._send(case, request)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        request = self._prepare(case)
+        tracemalloc.start()
+        try:
+            self._send(case, request)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return queries, min(timings), peak / 1024
+
+    def test_views_against_baseline(self):
+        baseline = _load_baseline().get(str(self.size), {})
+        for case in CASES:
+            with self.subTest(case=case):
+                queries, wall_ms, peak_kb = self.measure(case)
+                self.results[case] = {
+                    'queries': queries,
+                    'time_ms': round(wall_ms, 2),
+                    'peak_kb': round(peak_kb, 1),
+                }
+                if UPDATE_MODE:
+                    continue
+
+                expected = baseline.get(case)
+                self.assertIsNotNone(
+                    expected,
+                    f'No baseline for {case} at {self.size} tasks; '
+                    'rerun with PLANIT_BENCHMARK_UPDATE=1'
+                )
+                self.assertLessEqual(
+                    queries, expected['queries'],
+                    f'{case} query count regressed'
+                )
+                if FULL_MODE:
+                    self.assertLessEqual(
+                        wall_ms,
+                        expected['time_ms'] * TOLERANCE + TIME_SLACK_MS,
+                        f'{case} wall time regressed'
+                    )
+                    self.assertLessEqual(
+                        peak_kb,
+                        expected['peak_kb'] * TOLERANCE + MEMORY_SLACK_KB,
+                        f'{case} peak memory regressed'
+                    )
+
+
+def _benchmark_case(size):
+    return unittest.skipUnless(
+        size in ENABLED_SIZES,
+        f'{size}-task benchmark runs with PLANIT_BENCHMARK=1'
+    )(type(
+        f'ViewBenchmark{size}Test',
+        (ViewBenchmarkMixin, TestCase),
+        {'size': size, '__doc__': f'Benchmarks with {size} seeded tasks'},
+    ))
+
+
+ViewBenchmark10Test = _benchmark_case(10)
+ViewBenchmark1000Test = _benchmark_case(1000)
+ViewBenchmark100000Test = _benchmark_case(100000)
+
+
+class RecurrenceExpansionBenchmarkTest(TestCase):
+    """Benchmark batch expansion of recurrence rules"""
+
+    def test_expand_100k_rules_over_a_year(self):
+        rng = random.Random(0)
+        frequencies = ['daily', 'weekly', 'monthly', 'yearly']
+        rules = []
+        for rule_id in range(100000):
+            anchor = date(2024, 1, 1) + timedelta(days=rng.randint(-800, 500))
+            end_date = None
+            if rng.random() < 0.5:
+                end_date = anchor + timedelta(days=rng.randint(0, 900))
+            rules.append((rule_id, anchor, rng.choice(frequencies), end_date))
+
+        timings = []
+        for _ in range(TIMING_REPEATS):
+            start = time.perf_counter()
+            expansion = expand(rules, date(2025, 1, 1), date(2025, 12, 31))
+            timings.append(time.perf_counter() - start)
+
+        self.assertEqual(len(expansion), 100000)
+        self.assertGreater(expansion.total, 1000000)
+        if FULL_MODE:
+            self.assertLess(min(timings), EXPANSION_BUDGET)
+
+
+class TaskCardRenderBenchmarkTest(TestCase):
+    """Benchmark rendering task cards with and without the fragment cache"""
+
+    def setUp(self):
+        user = create_test_user()
+        category = create_test_category(user, 'Work')
+        create_bulk_tasks(user, CARD_COUNT, categories=[category, None])
+        self.tasks = list(Task.objects.visible_to(user).for_list())
+        self.request = RequestFactory().get('/')
+
+    def render_ms(self):
+        start = time.perf_counter()
+        cards = render_task_cards(self.request, self.tasks)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.assertEqual(len(cards), CARD_COUNT)
+        return elapsed
+
+    def test_render_1000_cards(self):
+        cold = []
+        for _ in range(TIMING_REPEATS):
+            cache.delete_many([card_key(task) for task in self.tasks])
+            cold.append(self.render_ms())
+        warm = [self.render_ms() for _ in range(TIMING_REPEATS)]
+
+        self.assertLess(min(warm), min(cold))
+        if FULL_MODE:
+            self.assertLess(min(cold), CARD_RENDER_BUDGET_MS)
+            self.assertLess(min(warm), CACHED_CARD_BUDGET_MS)
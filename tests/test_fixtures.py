@@ -1,6 +1,9 @@
 """Test fixtures and utilities for creating test data"""
 from django.contrib.auth.models import User
-from tasks.models import Task, Category
+from tasks.models import Task, Category, TaskNote
+from tasks.counters import reconcile_counters
+from tasks.search import get_search_backend
+from tasks.visibility import rebuild_visibility
 from datetime import date, timedelta
 
 
@@ -51,6 +54,45 @@ def create_multiple_tasks(user, count=5, **kwargs):
     return tasks
 
 
+def create_bulk_tasks(user, count, batch_size=1000, categories=None,
+                      notes_every=10):
+    """Create many tasks with bulk_create in batches.
+
+    Priorities, completion, due dates and categories cycle
+    deterministically. bulk_create skips model signals, so the user's
+    counters, task visibility and the search index are rebuilt afterwards.
+    """
+    priorities = [value for value, _label in Task.PRIORITY_CHOICES]
+    categories = categories or [None]
+    today = date.today()
+
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, count)):
+            batch.append(Task(
+                user=user,
+                title=f'Task {i + 1}',
+                description=f'Generated task number {i + 1}',
+                priority=priorities[i % len(priorities)],
+                is_completed=i % 3 == 0,
+                due_date=(
+                    None if i % 5 == 0
+                    else today + timedelta(days=i % 60 - 30)
+                ),
+                category=categories[i % len(categories)],
+            ))
+        tasks = Task.objects.bulk_create(batch)
+        if notes_every:
+            TaskNote.objects.bulk_create(
+                TaskNote(task=task, content=f'Note for {task.title}')
+                for task in tasks[::notes_every]
+            )
+
+    reconcile_counters([user.pk])
+    rebuild_visibility()
+    get_search_backend().rebuild()
+
+
 def create_test_data_set(user):
     """Create a complete set of test data for a user"""
     # Create categories
@@ -0,0 +1,220 @@
+"""Tests for the Prometheus metrics endpoint"""
+import multiprocessing
+import os
+import re
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from accounts.models import UserProfile
+from planit.metrics import (
+    Counter, MetricsFile, read_samples, _key, _QueryCounter, count_connection
+)
+from tasks.cache import reset_cache_stats
+from tasks.models import Task
+
+WORKER_COUNTER = Counter(
+    'planit_test_worker_total', 'Increments made by forked test workers.'
+)
+
+
+def _increment_in_worker(directory):
+    with override_settings(METRICS_DIR=directory):
+        WORKER_COUNTER.inc(5, worker='child')
+
+
+class MetricsEndpointTest(TestCase):
+    """Test cases for /metrics and the values behind it"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            is_staff=True
+        )
+        UserProfile.objects.create(user=self.user)
+        self.client.login(username='testuser', password='testpass123')
+        reset_cache_stats()
+
+    def _metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def _value(self, text, sample):
+        match = re.search(rf'^{re.escape(sample)} (\S+)$', text, re.M)
+        self.assertIsNotNone(match, sample)
+        return float(match[1])
+
+    @override_settings(TASK_LIST_CACHE=True)
+    def test_requests_are_counted_per_route(self):
+        """Test the request counter and latency histogram"""
+        self.client.get(reverse('task-list'))
+        self.client.get(reverse('task-list'))
+        self.client.get(reverse('task-detail', args=[999999]))
+        text = self._metrics()
+
+        self.assertEqual(self._value(
+            text, 'planit_http_requests_total'
+            '{method="GET",route="task-list",status="200"}'
+        ), 2)
+        self.assertEqual(self._value(
+            text, 'planit_http_requests_total'
+            '{method="GET",route="task-detail",status="404"}'
+        ), 1)
+        self.assertEqual(self._value(
+            text, 'planit_http_request_duration_seconds_bucket'
+            '{route="task-list",le="+Inf"}'
+        ), 2)
+        self.assertEqual(self._value(
+            text, 'planit_http_request_duration_seconds_count'
+            '{route="task-list"}'
+        ), 2)
+        self.assertGreater(self._value(
+            text, 'planit_http_request_duration_seconds_sum'
+            '{route="task-list"}'
+        ), 0)
+        self.assertGreater(self._value(
+            text, 'planit_db_queries_total{alias="default"}'
+        ), 0)
+        # The second list request is served from the cache
+        self.assertEqual(self._value(
+            text, 'planit_task_list_cache_misses_total'
+        ), 1)
+        self.assertEqual(self._value(
+            text, 'planit_task_list_cache_hits_total'
+        ), 1)
+        self.assertIn(
+            '# TYPE planit_http_request_duration_seconds histogram', text
+        )
+
+    def test_query_counter_outlives_enclosing_wrappers(self):
+        """Test a connection opened inside execute_wrapper() stays counted"""
+        self.addCleanup(
+            setattr, connection, 'execute_wrappers',
+            connection.execute_wrappers
+        )
+        connection.execute_wrappers = []
+        with connection.execute_wrapper(
+            lambda execute, *args: execute(*args)
+        ):
+            # As if the first query in the block opened the connection
+            count_connection(sender=None, connection=connection)
+        self.assertEqual(
+            [type(wrapper) for wrapper in connection.execute_wrappers],
+            [_QueryCounter]
+        )
+
+    def test_buckets_are_cumulative(self):
+        """Test each bucket includes the observations below it"""
+        for _ in range(3):
+            self.client.get(reverse('task-list'))
+        text = self._metrics()
+        counts = [
+            float(count) for count in re.findall(
+                r'^planit_http_request_duration_seconds_bucket'
+                r'\{route="task-list",le="[^"]+"\} (\S+)$', text, re.M
+            )
+        ]
+        self.assertEqual(len(counts), 12)
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[-1], 3)
+
+    def test_task_writes_are_counted(self):
+        """Test creates, updates and deletes, single and bulk"""
+        self.client.post(reverse('task-create'), {
+            'title': 'Counted', 'priority': 'medium'
+        })
+        task = Task.objects.get(title='Counted')
+        self.client.post(reverse('task-toggle', args=[task.pk]))
+        Task.objects.create(user=self.user, title='Second')
+        self.client.post(reverse('task-bulk'), {
+            'action': 'delete',
+            'task_ids': list(Task.objects.values_list('pk', flat=True)),
+        })
+        text = self._metrics()
+        for action, count in (('created', 2), ('updated', 1),
+                              ('deleted', 2)):
+            self.assertEqual(self._value(
+                text, f'planit_task_writes_total{{action="{action}"}}'
+            ), count)
+
+    def test_processes_are_added_up(self):
+        """Test values written by other processes are summed"""
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(
+            target=_increment_in_worker, args=(self.directory,)
+        )
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        WORKER_COUNTER.inc(worker='child')
+
+        samples = read_samples(self.directory)
+        key = _key('planit_test_worker_total', {'worker': 'child'})
+        self.assertEqual(samples[key], 6)
+
+        # The exited worker's file was merged, and its values are kept
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ['.lock', f'{os.getpid()}.db', 'merged.db']
+        )
+        self.assertEqual(read_samples(self.directory)[key], 6)
+
+    def test_files_grow_and_reopen(self):
+        """Test a file larger than its first mapping keeps its values"""
+        path = f'{self.directory}/other.db'
+        metrics_file = MetricsFile(path)
+        keys = [_key('planit_test_total', {'n': n}) for n in range(3000)]
+        for key in keys:
+            metrics_file.add(key, 1.5)
+        metrics_file.close()
+
+        metrics_file = MetricsFile(path)
+        metrics_file.add(keys[-1], 1)
+        metrics_file.close()
+        samples = read_samples(self.directory)
+        self.assertEqual(samples[keys[0]], 1.5)
+        self.assertEqual(samples[keys[-1]], 2.5)
+
+    def test_access_is_restricted(self):
+        """Test only staff or a scraper with the token can read it"""
+        anonymous = Client()
+        self.assertEqual(anonymous.get(reverse('metrics')).status_code, 403)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code, 403
+        )
+
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            response = anonymous.get(
+                reverse('metrics'),
+                headers={'Authorization': 'Bearer scrape-secret'}
+            )
+            self.assertEqual(response.status_code, 200)
+            response = anonymous.get(
+                reverse('metrics'),
+                headers={'Authorization': 'Bearer wrong'}
+            )
+            self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are off"""
+        before = read_samples(self.directory)
+        self.client.get(reverse('task-list'))
+        self.assertEqual(read_samples(self.directory), before)